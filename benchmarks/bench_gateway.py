@@ -0,0 +1,109 @@
+# gateway throughput/tail latency: blocking stub in sync handlers (the old gateway) vs gateway.main (grpc.aio)
+# both run under uvicorn against benchmarks/fake_grpc.py.
+# usage: python -m benchmarks.bench_gateway [requests] [concurrency] [grpc_latency_ms]
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "server", "generated"))
+import weather_pb2, weather_pb2_grpc # type: ignore
+
+GRPC_PORT = 50061
+
+
+# -- baseline: the pre-aio gateway pattern, sync def + blocking channel --
+
+@asynccontextmanager
+async def _blocking_lifespan(app: FastAPI):
+    channel = grpc.insecure_channel(os.getenv("GRPC_ADDR", f"localhost:{GRPC_PORT}"))
+    app.state.grpc_stub = weather_pb2_grpc.WeatherServiceStub(channel)
+    yield
+    channel.close()
+
+blocking_app = FastAPI(lifespan=_blocking_lifespan)
+
+@blocking_app.get("/api/weather/current")
+def blocking_current(request: Request, city: str):
+    try:
+        s = request.app.state.grpc_stub.GetCurrentWeather(
+            weather_pb2.GetCurrentWeatherRequest(city=city),
+            metadata=(("x-api-key", "dev-secret"),), timeout=5.0,
+        ).snapshot
+    except grpc.RpcError as e:
+        raise HTTPException(status_code=502, detail=str(e.code()))
+    return {"city": s.city, "temperature_c": s.temperature_c, "description": s.description,
+            "humidity": s.humidity, "wind_speed": s.wind_speed, "timestamp_ms": s.timestamp_ms}
+
+
+# -- driver --
+
+async def _drive(url: str, total: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        for _ in range(100):
+            try:
+                await client.get(url, params={"city": "warmup"})
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.get(url, params={"city": f"city{i}"})
+                if r.status_code != 200:
+                    errors += 1
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    pick = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1)
+    return {"rps": round(total / elapsed, 1), "p50_ms": pick(0.50), "p99_ms": pick(0.99), "errors": errors}
+
+
+def _run(app_path: str, port: int, total: int, concurrency: int) -> dict:
+    env = {**os.environ, "GRPC_ADDR": f"localhost:{GRPC_PORT}", "SERVICE_API_KEY": "dev-secret"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env,
+    )
+    try:
+        return asyncio.run(_drive(f"http://127.0.0.1:{port}/api/weather/current", total, concurrency))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    latency_ms = sys.argv[3] if len(sys.argv) > 3 else "50"
+    fake = subprocess.Popen([sys.executable, "-m", "benchmarks.fake_grpc", str(GRPC_PORT), latency_ms], cwd=BASE_DIR)
+    try:
+        results = {
+            "blocking_sync_handlers": _run("benchmarks.bench_gateway:blocking_app", 8101, total, concurrency),
+            "grpc_aio_async_handlers": _run("gateway.main:app", 8102, total, concurrency),
+        }
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+    print(json.dumps({"requests": total, "concurrency": concurrency, "grpc_latency_ms": float(latency_ms),
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# gateway response encoding for a long history: the old route (dicts returned to FastAPI, validated against
+# response_model=list[WeatherHistoryPoint] and re-serialized) vs gateway.main's orjson path, both behind the
+# same in-process stub and TestClient, so only the encoding differs.
+# usage: python -m benchmarks.bench_gateway_json [points] [repeats]
+import json
+import sys
+import time
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from gateway.main import WeatherHistoryPoint, _snapshot_dict, app
+
+from server.generated import weather_pb2
+
+
+class _Stub:
+    def __init__(self, points: int):
+        self.resp = weather_pb2.GetWeatherHistoryResponse(resolution="raw", series=[
+            weather_pb2.WeatherSnapshot(city="Cluj-Napoca", temperature_c=12.5 + (i % 40) / 8,
+                                        description="few clouds", humidity=40 + i % 50, wind_speed=(i % 30) / 7,
+                                        timestamp_ms=1_700_000_000_000 + i * 600_000)
+            for i in range(points)
+        ])
+
+    async def GetWeatherHistory(self, req, metadata=None, timeout=None):
+        return self.resp
+
+
+@app.get("/bench/history/legacy", response_model=list[WeatherHistoryPoint])
+async def legacy_history(request: Request):
+    resp = await request.app.state.grpc_stub.GetWeatherHistory(None)
+    return [_snapshot_dict(s) for s in resp.series]
+
+
+def _best_ms(client, path: str, params: dict, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        r = client.get(path, params=params)
+        best = min(best, time.perf_counter() - t0)
+        assert r.status_code == 200, r.text
+    return round(best * 1000, 2)
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    # max_points > 0 bypasses the gateway history cache, every call encodes the full series
+    params = {"city": "Cluj-Napoca", "from_ms": 1, "to_ms": 2, "max_points": points}
+    with TestClient(app) as client:
+        app.state.grpc_stub = _Stub(points)
+        legacy = _best_ms(client, "/bench/history/legacy", {}, repeats)
+        fast = _best_ms(client, "/api/weather/history", params, repeats)
+        same = client.get("/bench/history/legacy").content == client.get("/api/weather/history", params=params).content
+    print(json.dumps({"points": points, "response_model_ms": legacy, "orjson_ms": fast,
+                      "speedup": round(legacy / fast, 1), "identical_bytes": same}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
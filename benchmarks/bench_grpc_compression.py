@@ -0,0 +1,86 @@
+# history payloads under each GRPC_COMPRESSION setting: compressed message size and call latency of
+# GetWeatherHistory (one WeatherSnapshot per point) and GetWeatherHistoryColumns, served by an in-process grpc
+# server built with the server's transport options. localhost hides bandwidth, so the result also adds the
+# transfer time of the compressed message over a link of the given Mbit/s.
+# usage: python -m benchmarks.bench_grpc_compression [points] [repeats] [link_mbit]
+import json
+import sys
+import time
+import zlib
+from concurrent import futures
+
+import grpc
+
+from benchmarks.bench_history_columns import _series
+from server.grpc_options import COMPRESSION, compression_options, message_size_options
+from server.weather_server import _columns, _snapshot
+
+from server.generated import weather_pb2, weather_pb2_grpc
+
+
+class _History(weather_pb2_grpc.WeatherServiceServicer):
+    def __init__(self, docs: list):
+        self.rows = weather_pb2.GetWeatherHistoryResponse(series=[_snapshot(d) for d in docs], resolution="raw")
+        self.columns = _columns("Cluj-Napoca", docs, "raw")
+
+    def GetWeatherHistory(self, request, context):
+        return self.rows
+
+    def GetWeatherHistoryColumns(self, request, context):
+        return self.columns
+
+
+def _compressed_bytes(wire: bytes, name: str) -> int:
+    # what grpc puts on the wire for the message: gzip or zlib (deflate) framing at the default level
+    if name == "gzip":
+        return len(zlib.compress(wire, wbits=31))
+    if name == "deflate":
+        return len(zlib.compress(wire))
+    return len(wire)
+
+
+def _call_ms(call, repeats: int) -> dict:
+    call(weather_pb2.GetWeatherHistoryRequest(city="Cluj-Napoca"))
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        call(weather_pb2.GetWeatherHistoryRequest(city="Cluj-Napoca"))
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2], 2), "best_ms": round(samples[0], 2)}
+
+
+def _run(service: _History, name: str, repeats: int, link_mbit: float) -> dict:
+    # the server picks the response compression, the client channel accepts every algorithm
+    options = compression_options(name) + message_size_options(-1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2), options=options)
+    weather_pb2_grpc.add_WeatherServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    result = {}
+    try:
+        with grpc.insecure_channel(f"127.0.0.1:{port}", options=message_size_options(-1)) as channel:
+            stub = weather_pb2_grpc.WeatherServiceStub(channel)
+            for label, message, call in (("rows", service.rows, stub.GetWeatherHistory),
+                                         ("columns", service.columns, stub.GetWeatherHistoryColumns)):
+                size = _compressed_bytes(message.SerializeToString(), name)
+                timing = _call_ms(call, repeats)
+                transfer_ms = size * 8 / (link_mbit * 1000)
+                result[label] = {"message_bytes": size, **timing,
+                                 f"p50_at_{link_mbit:g}mbit_ms": round(timing["p50_ms"] + transfer_ms, 2)}
+    finally:
+        server.stop(0)
+    return result
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    link_mbit = float(sys.argv[3]) if len(sys.argv) > 3 else 100
+    service = _History(_series(points))
+    results = {name: _run(service, name, repeats, link_mbit) for name in COMPRESSION}
+    print(json.dumps({"points": points, "link_mbit": link_mbit, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
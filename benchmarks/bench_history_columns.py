@@ -0,0 +1,75 @@
+# wire size and (de)serialization time of a long history series as GetWeatherHistoryResponse (one
+# WeatherSnapshot per point) vs WeatherHistoryColumns (packed arrays, delta timestamps, coded descriptions),
+# from the server's protobuf construction to the gateway's JSON body. in-process, no network.
+# usage: python -m benchmarks.bench_history_columns [points] [repeats]
+import json
+import random
+import sys
+import time
+
+from gateway.main import _columns_dict, _snapshot_dict
+from server.weather_server import _columns, _snapshot
+
+from server.generated import weather_pb2
+
+DESCRIPTIONS = ["clear sky", "few clouds", "scattered clouds", "broken clouds", "light rain", "overcast clouds"]
+
+
+def _series(points: int) -> list:
+    # one snapshot every 10 minutes with a little jitter, like stored OWM observations
+    rng = random.Random(1)
+    start = 1_700_000_000_000
+    return [
+        {"city": "Cluj-Napoca", "temperature_c": round(12 + 8 * rng.random(), 2), "description": rng.choice(DESCRIPTIONS),
+         "humidity": rng.randint(40, 95), "wind_speed": round(6 * rng.random(), 2),
+         "timestamp_ms": start + i * 600_000 + rng.randint(0, 999)}
+        for i in range(points)
+    ]
+
+
+def _best_ms(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+
+def _measure(build, message_type, to_json, repeats: int) -> dict:
+    message = build()
+    wire = message.SerializeToString()
+    parsed = message_type.FromString(wire)
+    body = json.dumps(to_json(parsed), separators=(",", ":"))
+    return {
+        "wire_bytes": len(wire),
+        "json_bytes": len(body),
+        "build_ms": _best_ms(build, repeats),
+        "serialize_ms": _best_ms(message.SerializeToString, repeats),
+        "parse_ms": _best_ms(lambda: message_type.FromString(wire), repeats),
+        "gateway_json_ms": _best_ms(lambda: json.dumps(to_json(parsed), separators=(",", ":")), repeats),
+    }
+
+
+def main():
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    docs = _series(points)
+    rows = _measure(
+        lambda: weather_pb2.GetWeatherHistoryResponse(series=[_snapshot(d) for d in docs], resolution="raw"),
+        weather_pb2.GetWeatherHistoryResponse,
+        lambda resp: [_snapshot_dict(s) for s in resp.series],
+        repeats,
+    )
+    columns = _measure(
+        lambda: _columns("Cluj-Napoca", docs, "raw"),
+        weather_pb2.WeatherHistoryColumns,
+        _columns_dict,
+        repeats,
+    )
+    ratio = {k: round(rows[k] / columns[k], 1) if columns[k] else None for k in rows}
+    print(json.dumps({"points": points, "rows": rows, "columns": columns, "rows_over_columns": ratio}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
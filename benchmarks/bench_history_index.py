@@ -0,0 +1,78 @@
+# seeds a throwaway collection with snapshots and times fetch_series with the old (city, timestamp_ms)
+# index vs the compound (city_key, timestamp_ms) index. needs a real MongoDB at MONGO_URI.
+# usage: python -m benchmarks.bench_history_index [snapshots] [queries]
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "weatherdb_bench")
+os.environ["COLLECTION"] = "snapshots_index_bench"
+
+from pymongo import ASCENDING
+
+from server.dao import WeatherDAO, INDEXES
+
+CITIES = [f"city{i}" for i in range(200)]
+HOUR_MS = 60 * 60 * 1000
+
+
+def _seed(dao: WeatherDAO, total: int, start_ms: int, step_ms: int) -> None:
+    dao.col.drop()
+    batch = []
+    for i in range(total):
+        city = CITIES[i % len(CITIES)]
+        batch.append({
+            "city": city.title(), "city_key": city,
+            "temperature_c": 20.0, "description": "clear sky", "humidity": 50, "wind_speed": 3.0,
+            "timestamp_ms": start_ms + (i // len(CITIES)) * step_ms,
+        })
+        if len(batch) == 10_000:
+            dao.col.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        dao.col.insert_many(batch, ordered=False)
+
+
+def _time_queries(dao: WeatherDAO, queries: int, start_ms: int, end_ms: int) -> dict:
+    latencies = []
+    for _ in range(queries):
+        to_ms = random.randint(start_ms + 24 * HOUR_MS, end_ms)
+        t0 = time.perf_counter()
+        dao.fetch_series(random.choice(CITIES), to_ms - 24 * HOUR_MS, to_ms)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "plan_uses_index": dao.check_query_plan(),
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    dao = WeatherDAO()
+    # one snapshot per city every 10 minutes
+    step_ms = 10 * 60 * 1000
+    start_ms = int(time.time() * 1000) - (total // len(CITIES)) * step_ms
+    end_ms = start_ms + (total // len(CITIES)) * step_ms
+
+    _seed(dao, total, start_ms, step_ms)
+    results = {}
+
+    dao.col.create_index([("city", ASCENDING), ("timestamp_ms", ASCENDING)])
+    results["old_city_index"] = _time_queries(dao, queries, start_ms, end_ms)
+
+    dao.ensure_indexes()
+    results["city_key_compound_index"] = _time_queries(dao, queries, start_ms, end_ms)
+
+    print(json.dumps({"snapshots": total, "queries": queries, "indexes": list(INDEXES), "results": results}, indent=2))
+    dao.col.drop()
+
+
+if __name__ == "__main__":
+    main()
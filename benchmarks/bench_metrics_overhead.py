@@ -0,0 +1,54 @@
+# per-call cost of the metrics layer: a no-op unary handler called directly vs through MetricsInterceptor,
+# and a no-op method called directly vs through the Timed proxy. in-process, no network.
+# usage: python -m benchmarks.bench_metrics_overhead [calls]
+import json
+import sys
+import time
+
+import grpc
+
+from server import metrics
+
+
+class _Details:
+    method = "/weather.v1.WeatherService/BenchNoop"
+
+
+class _Ctx:
+    def code(self):
+        return None
+
+
+class _Target:
+    def noop(self):
+        return None
+
+
+def _per_call_us(fn, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    noop = lambda request, context: None
+    handler = metrics.MetricsInterceptor().intercept_service(
+        lambda _: grpc.unary_unary_rpc_method_handler(noop), _Details())
+    ctx, target = _Ctx(), _Target()
+    timed = metrics.Timed(target, metrics.DAO_LATENCY)
+
+    results = {
+        "handler_direct_us": _per_call_us(lambda: noop(None, ctx), calls),
+        "handler_intercepted_us": _per_call_us(lambda: handler.unary_unary(None, ctx), calls),
+        "method_direct_us": _per_call_us(target.noop, calls),
+        "method_timed_us": _per_call_us(lambda: timed.noop(), calls),
+    }
+    results["interceptor_overhead_us"] = results["handler_intercepted_us"] - results["handler_direct_us"]
+    results["timed_overhead_us"] = results["method_timed_us"] - results["method_direct_us"]
+    print(json.dumps({"calls": calls, "results": {k: round(v, 3) for k, v in results.items()}}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# compares per-call requests.get (new TCP connection each time) with the pooled OpenWeatherMapClient
+# usage: python -m benchmarks.bench_owm_session [calls] [concurrency]
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent import futures
+
+os.environ.setdefault("OWM_API_KEY", "bench")
+
+import requests
+
+from benchmarks.fake_owm import FakeOWMServer
+from server.owm_client import OpenWeatherMapClient
+
+
+def _run(fn, calls: int, concurrency: int) -> dict:
+    latencies = []
+    def one(i):
+        t0 = time.perf_counter()
+        fn(f"city{i % 20}")
+        latencies.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(calls)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rps": round(calls / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    fake = FakeOWMServer().start()
+    try:
+        def no_pool(city):
+            r = requests.get(fake.url, params={"q": city, "appid": "bench", "units": "metric"})
+            r.raise_for_status()
+            return r.json()
+
+        client = OpenWeatherMapClient()
+        client.BASE_URL = fake.url
+
+        results = {}
+        for name, fn in (("requests.get", no_pool), ("pooled_session", client.get_current)):
+            before = fake.connections
+            results[name] = _run(fn, calls, concurrency)
+            results[name]["tcp_connections"] = fake.connections - before
+        print(json.dumps({"calls": calls, "concurrency": concurrency, "results": results}, indent=2))
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
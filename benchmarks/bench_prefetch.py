@@ -0,0 +1,106 @@
+# hot-city prefetch: a zipf-distributed GetCurrentWeather workload against WeatherService with a slow fake
+# OWM client and an in-memory DAO, once without and once with the prefetcher. time is compressed: the cache
+# ttl and the prefetch interval are seconds instead of minutes. in-process, no network, no MongoDB.
+# usage: python -m benchmarks.bench_prefetch [seconds] [owm_latency_ms]
+import json
+import random
+import statistics
+import sys
+import time
+
+from server.cache import TTLCache
+from server.prefetch import HotCities, PrefetchPlan, Prefetcher
+from server.weather_server import WeatherService
+from server.generated import weather_pb2
+
+CITIES = [f"city-{i}" for i in range(500)]
+CACHE_TTL_S = 1.0
+INTERVAL_S = 1.0
+
+
+class SlowOWM:
+    def __init__(self, latency_ms: float):
+        self.latency_s = latency_ms / 1000.0
+        self.calls = 0
+
+    def get_current(self, city):
+        self.calls += 1
+        time.sleep(self.latency_s)
+        return {"name": city, "main": {"temp": 10.0, "humidity": 50}, "weather": [{"description": "clear sky"}],
+                "wind": {"speed": 1.0}}
+
+    def parse(self, raw):
+        return {"city": raw["name"], "temperature_c": raw["main"]["temp"], "humidity": raw["main"]["humidity"],
+                "description": raw["weather"][0]["description"], "wind_speed": raw["wind"]["speed"]}
+
+
+class MemoryDAO:
+    def save_snapshot(self, snap):
+        return {**snap, "timestamp_ms": int(time.time() * 1000)}
+
+
+class _Ctx:
+    def abort(self, code, details):
+        raise RuntimeError(details)
+
+
+# zipf(1.1) popularity: the head of the list gets most of the traffic
+WEIGHTS = [1 / (rank ** 1.1) for rank in range(1, len(CITIES) + 1)]
+HOT = set(CITIES[:20])
+RATE_PER_S = 200
+
+
+def _run(seconds: float, latency_ms: float, prefetch: bool) -> dict:
+    owm = SlowOWM(latency_ms)
+    srv = WeatherService(owm=owm, dao=MemoryDAO())
+    srv.cache = TTLCache(CACHE_TTL_S, 10_000)
+    srv.prefetch = None
+    prefetcher = None
+    if prefetch:
+        srv.prefetch = PrefetchPlan(HotCities(half_life_s=10, max_keys=1000), top_k=20, min_score=2,
+                                    interval_s=INTERVAL_S, calls_per_min=6000)
+        prefetcher = Prefetcher(srv.prefetch, srv.refresh)
+        prefetcher.start()
+
+    # same seeded request sequence at a fixed rate for both runs
+    rng, latencies, hot_latencies = random.Random(7), [], []
+    start = time.perf_counter()
+    for i, city in enumerate(rng.choices(CITIES, WEIGHTS, k=int(seconds * RATE_PER_S))):
+        pause = start + i / RATE_PER_S - time.perf_counter()
+        if pause > 0:
+            time.sleep(pause)
+        t0 = time.perf_counter()
+        srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city=city), _Ctx())
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        latencies.append(elapsed_ms)
+        if city in HOT:
+            hot_latencies.append(elapsed_ms)
+    if prefetcher:
+        prefetcher.close()
+
+    stats = srv.cache.stats()
+    return {
+        "requests": len(latencies),
+        "owm_calls": owm.calls,
+        "cache_hit_ratio": round(stats["hit_ratio"], 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 3),
+        "hot_p50_ms": round(statistics.median(hot_latencies), 3),
+        "hot_p99_ms": round(statistics.quantiles(hot_latencies, n=100)[-1], 3),
+        # share of top-20 requests that waited on OWM
+        "hot_miss_ratio": round(sum(ms >= latency_ms / 2 for ms in hot_latencies) / len(hot_latencies), 4),
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    results = {
+        "no_prefetch": _run(seconds, latency_ms, prefetch=False),
+        "prefetch": _run(seconds, latency_ms, prefetch=True),
+    }
+    print(json.dumps({"seconds": seconds, "owm_latency_ms": latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
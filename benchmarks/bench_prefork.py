@@ -0,0 +1,101 @@
+# throughput of the single-process thread server vs SERVER_MODE=prefork with 1, 2, 4... workers, on a CPU-bound
+# call: GetWeatherHistory over a seeded range (BSON decoding + protobuf construction, no OWM involved).
+# load comes from several client processes with one connection each, so SO_REUSEPORT can spread them.
+# needs a real MongoDB at MONGO_URI. usage: python -m benchmarks.bench_prefork [seconds] [points] [clients]
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "server", "generated"))
+import weather_pb2, weather_pb2_grpc # type: ignore
+
+API_KEY = "bench-secret"
+PORT = 50073
+CITY = "Benchville"
+FROM_MS = 1_700_000_000_000
+
+
+def _seed(points: int) -> int:
+    from server.dao import WeatherDAO
+
+    dao = WeatherDAO()
+    dao.col.delete_many({"city_key": CITY.lower()})
+    dao.col.insert_many([
+        {"city": CITY, "city_key": CITY.lower(), "temperature_c": 10.0 + i % 7, "description": "few clouds",
+         "humidity": 60, "wind_speed": 3.2, "timestamp_ms": FROM_MS + i * 60_000}
+        for i in range(points)
+    ])
+    dao.close()
+    return FROM_MS + points * 60_000
+
+
+def _client(to_ms: int, seconds: float, concurrency: int, out) -> None:
+    async def run():
+        done = 0
+        # a local subchannel pool gives this process its own connection
+        async with grpc.aio.insecure_channel(f"localhost:{PORT}", options=[("grpc.use_local_subchannel_pool", 1)]) as ch:
+            await asyncio.wait_for(ch.channel_ready(), 30)
+            stub = weather_pb2_grpc.WeatherServiceStub(ch)
+            request = weather_pb2.GetWeatherHistoryRequest(city=CITY, from_ms=FROM_MS, to_ms=to_ms)
+            deadline = time.perf_counter() + seconds
+
+            async def loop():
+                nonlocal done
+                while time.perf_counter() < deadline:
+                    await stub.GetWeatherHistory(request, metadata=(("x-api-key", API_KEY),), timeout=30)
+                    done += 1
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return done
+    out.put(asyncio.run(run()))
+
+
+def _run(mode: str, workers: int, to_ms: int, seconds: float, clients: int) -> dict:
+    env = {
+        **os.environ,
+        "SERVER_MODE": mode,
+        "GRPC_WORKERS": str(workers),
+        "GRPC_PORT": str(PORT),
+        "SERVICE_API_KEY": API_KEY,
+        "METRICS_PORT": "0",
+    }
+    proc = subprocess.Popen([sys.executable, "-m", "server.weather_server"], cwd=BASE_DIR, env=env)
+    try:
+        time.sleep(2 + workers * 0.5)
+        out = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_client, args=(to_ms, seconds, 4, out)) for _ in range(clients)]
+        for p in procs:
+            p.start()
+        total = sum(out.get() for _ in procs)
+        for p in procs:
+            p.join()
+        return {"workers": workers, "rps": round(total / seconds, 1)}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    clients = int(sys.argv[3]) if len(sys.argv) > 3 else 2 * (os.cpu_count() or 1)
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "weatherdb_bench")
+    to_ms = _seed(points)
+
+    counts = sorted({n for n in (1, 2, 4, 8, os.cpu_count() or 1) if n <= (os.cpu_count() or 1)})
+    results = {"thread": _run("thread", 1, to_ms, seconds, clients)}
+    for n in counts:
+        results[f"prefork_{n}"] = _run("prefork", n, to_ms, seconds, clients)
+    print(json.dumps({"seconds": seconds, "points": points, "clients": clients, "cores": os.cpu_count(),
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
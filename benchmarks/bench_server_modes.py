@@ -0,0 +1,90 @@
+# load test: thread-pool server vs grpc.aio server, both against a slow fake OWM (cache disabled)
+# needs a real MongoDB at MONGO_URI. usage: python -m benchmarks.bench_server_modes [requests] [concurrency] [owm_latency_ms]
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import grpc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "server", "generated"))
+import weather_pb2, weather_pb2_grpc # type: ignore
+
+from benchmarks.fake_owm import FakeOWMServer
+
+API_KEY = "bench-secret"
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+async def _drive(addr: str, total: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+    async with grpc.aio.insecure_channel(addr) as channel:
+        await asyncio.wait_for(channel.channel_ready(), 30)
+        stub = weather_pb2_grpc.WeatherServiceStub(channel)
+
+        async def one(i):
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    await stub.GetCurrentWeather(
+                        weather_pb2.GetCurrentWeatherRequest(city=f"city{i}"),
+                        metadata=(("x-api-key", API_KEY),), timeout=30,
+                    )
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                except grpc.aio.AioRpcError:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50), 1) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 0.99), 1) if latencies else None,
+        "errors": errors,
+    }
+
+
+def _run_mode(mode: str, owm_url: str, port: int, total: int, concurrency: int) -> dict:
+    env = {
+        **os.environ,
+        "SERVER_MODE": mode,
+        "GRPC_PORT": str(port),
+        "OWM_API_KEY": "bench",
+        "OWM_BASE_URL": owm_url,
+        "SERVICE_API_KEY": API_KEY,
+        "CACHE_TTL_S": "0",
+        "DB_NAME": os.getenv("DB_NAME", "weatherdb_bench"),
+    }
+    proc = subprocess.Popen([sys.executable, "-m", "server.weather_server"], cwd=BASE_DIR, env=env)
+    try:
+        return asyncio.run(_drive(f"localhost:{port}", total, concurrency))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 200
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    fake = FakeOWMServer(latency_ms=latency_ms).start()
+    try:
+        results = {mode: _run_mode(mode, fake.url, 50071, total, concurrency) for mode in ("thread", "aio")}
+    finally:
+        fake.stop()
+    print(json.dumps({"requests": total, "concurrency": concurrency, "owm_latency_ms": latency_ms, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
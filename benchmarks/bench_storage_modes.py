@@ -0,0 +1,106 @@
+# seeds the same snapshots into a plain collection and a time-series collection and compares
+# on-disk size and fetch_series latency. needs a real MongoDB (5.0+) at MONGO_URI.
+# usage: python -m benchmarks.bench_storage_modes [snapshots] [queries]
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "weatherdb_bench")
+
+from pymongo import ASCENDING, MongoClient
+
+from server.dao import (
+    MONGO_URI, DB_NAME, INDEXES, TIMESERIES_INDEXES, TIMESERIES_OPTIONS, WeatherDAO, _to_datetime,
+)
+
+CITIES = [f"city{i}" for i in range(200)]
+DESCRIPTIONS = ["clear sky", "few clouds", "light rain", "overcast clouds"]
+HOUR_MS = 60 * 60 * 1000
+
+
+def _docs(total: int, start_ms: int, step_ms: int):
+    rnd = random.Random(1)
+    for i in range(total):
+        city = CITIES[i % len(CITIES)]
+        ts = start_ms + (i // len(CITIES)) * step_ms
+        yield {
+            "city": city.title(), "city_key": city,
+            "temperature_c": round(15 + rnd.uniform(-5, 5), 2), "description": rnd.choice(DESCRIPTIONS),
+            "humidity": rnd.randint(40, 90), "wind_speed": round(rnd.uniform(0, 10), 2),
+            "timestamp_ms": ts, "ts": _to_datetime(ts),
+        }
+
+
+def _seed(col, total: int, start_ms: int, step_ms: int) -> float:
+    t0 = time.perf_counter()
+    batch = []
+    for doc in _docs(total, start_ms, step_ms):
+        batch.append(doc)
+        if len(batch) == 10_000:
+            col.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        col.insert_many(batch, ordered=False)
+    return time.perf_counter() - t0
+
+
+def _time_queries(col, timeseries: bool, queries: int, start_ms: int, end_ms: int) -> dict:
+    latencies = []
+    for _ in range(queries):
+        to_ms = random.randint(start_ms + 24 * HOUR_MS, end_ms)
+        q = WeatherDAO._series_query(random.choice(CITIES), to_ms - 24 * HOUR_MS, to_ms, timeseries)
+        t0 = time.perf_counter()
+        list(col.find(q).sort("ts" if timeseries else "timestamp_ms", ASCENDING))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+    }
+
+
+def _sizes(db, name: str) -> dict:
+    stats = db.command("collStats", name)
+    return {"storage_mb": round(stats.get("storageSize", 0) / 2**20, 1),
+            "index_mb": round(stats.get("totalIndexSize", 0) / 2**20, 1)}
+
+
+def _run(db, name: str, timeseries: bool, total: int, queries: int, start_ms: int, step_ms: int) -> dict:
+    db.drop_collection(name)
+    if timeseries:
+        db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+    col = db[name]
+    for index_name, keys in (TIMESERIES_INDEXES if timeseries else INDEXES).items():
+        col.create_index(keys, name=index_name)
+    seed_s = _seed(col, total, start_ms, step_ms)
+    end_ms = start_ms + (total // len(CITIES)) * step_ms
+    result = {"seed_s": round(seed_s, 1), **_sizes(db, name),
+              **_time_queries(col, timeseries, queries, start_ms, end_ms)}
+    db.drop_collection(name)
+    return result
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    # one snapshot per city every 10 minutes
+    step_ms = 10 * 60 * 1000
+    start_ms = int(time.time() * 1000) - (total // len(CITIES)) * step_ms
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    try:
+        results = {
+            "plain": _run(db, "snapshots_storage_plain", False, total, queries, start_ms, step_ms),
+            "timeseries": _run(db, "snapshots_storage_ts", True, total, queries, start_ms, step_ms),
+        }
+    finally:
+        client.close()
+    print(json.dumps({"snapshots": total, "queries": queries, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
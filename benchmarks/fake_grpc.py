@@ -0,0 +1,48 @@
+# stand-in WeatherService (grpc.aio) answering with canned data after a fixed delay
+# usage: python -m benchmarks.fake_grpc [port] [latency_ms] [history_points]
+import asyncio
+import os
+import sys
+
+import grpc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "server", "generated"))
+import weather_pb2, weather_pb2_grpc # type: ignore
+
+
+def _snap(city: str, ts: int) -> "weather_pb2.WeatherSnapshot":
+    return weather_pb2.WeatherSnapshot(city=city, temperature_c=21.5, description="few clouds",
+                                       humidity=55, wind_speed=3.4, timestamp_ms=ts)
+
+
+class FakeWeatherService(weather_pb2_grpc.WeatherServiceServicer):
+    def __init__(self, latency_ms: float, history_points: int):
+        self.latency_s = latency_ms / 1000.0
+        self.history_points = history_points
+
+    async def GetCurrentWeather(self, request, context):
+        await asyncio.sleep(self.latency_s)
+        return weather_pb2.GetCurrentWeatherResponse(snapshot=_snap(request.city, 1_700_000_000_000))
+
+    async def GetWeatherHistory(self, request, context):
+        await asyncio.sleep(self.latency_s)
+        step = max(1, (request.to_ms - request.from_ms) // max(1, self.history_points))
+        return weather_pb2.GetWeatherHistoryResponse(
+            series=[_snap(request.city, request.from_ms + i * step) for i in range(self.history_points)]
+        )
+
+
+async def serve(port: int, latency_ms: float, history_points: int) -> None:
+    server = grpc.aio.server()
+    weather_pb2_grpc.add_WeatherServiceServicer_to_server(FakeWeatherService(latency_ms, history_points), server)
+    server.add_insecure_port(f"[::]:{port}")
+    await server.start()
+    await server.wait_for_termination()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 50061
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    points = int(sys.argv[3]) if len(sys.argv) > 3 else 288
+    asyncio.run(serve(port, latency_ms, points))
@@ -0,0 +1,93 @@
+# local stand-in for the OpenWeatherMap /weather endpoint (keep-alive, configurable latency/errors),
+# GET /stats returns the request and connection counts
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def _payload(city: str) -> dict:
+    return {
+        "name": city.strip().title(),
+        "dt": int(time.time()) // 600 * 600,
+        "main": {"temp": round(random.uniform(-5, 30), 2), "humidity": random.randint(30, 90)},
+        "weather": [{"description": random.choice(["clear sky", "few clouds", "light rain"])}],
+        "wind": {"speed": round(random.uniform(0, 12), 1)},
+    }
+
+
+class FakeOWMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.connections = 0
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                owner.connections += 1
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    return self._reply(200, {"requests": owner.requests, "connections": owner.connections})
+                owner.requests += 1
+                if owner.latency_ms:
+                    time.sleep(owner.latency_ms / 1000.0)
+                qs = parse_qs(urlparse(self.path).query)
+                city = (qs.get("q") or [""])[0]
+                if owner.error_rate and random.random() < owner.error_rate:
+                    status, body = 503, {"cod": 503, "message": "fake upstream error"}
+                elif city.strip().lower() == "nowhere":
+                    status, body = 404, {"cod": "404", "message": "city not found"}
+                else:
+                    status, body = 200, _payload(city or "Unknown")
+                self._reply(status, body)
+
+            def _reply(self, status, body):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/data/2.5/weather"
+
+    def start(self) -> "FakeOWMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    # usage: python -m benchmarks.fake_owm [port] [latency_ms] [error_rate]
+    args = sys.argv[1:]
+    srv = FakeOWMServer(port=int(args[0]) if args else 8089,
+                        latency_ms=float(args[1]) if len(args) > 1 else 0.0,
+                        error_rate=float(args[2]) if len(args) > 2 else 0.0).start()
+    print(f"fake OWM listening on {srv.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        srv.stop()
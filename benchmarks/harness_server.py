@@ -0,0 +1,71 @@
+# gRPC server process for benchmarks/load.py: seeds `history_hours` of snapshots (one per 10 minutes) for
+# `cities` cities into the chosen store, then runs weather_server.serve on it. memory and mongomock stores
+# run the thread server; with a real MongoDB any SERVER_MODE works.
+# usage: python -m benchmarks.harness_server memory|mongomock|mongo [server_mode] [cities] [history_hours]
+import sys
+import time
+
+from benchmarks.memory_store import MemoryStore
+
+SEED_STEP_MS = 600_000
+
+
+def city_name(i: int) -> str:
+    return f"City{i}"
+
+
+def _store(kind: str):
+    if kind == "memory":
+        return MemoryStore()
+    if kind == "mongomock":
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("--store mongomock needs the mongomock package")
+        from server import dao as dao_module
+        dao_module.MongoClient = mongomock.MongoClient
+    elif kind != "mongo":
+        raise SystemExit(f"unknown store {kind!r}, expected memory, mongomock or mongo")
+    from server.dao import WeatherDAO
+    return WeatherDAO()
+
+
+def _seed(store, cities: int, history_hours: float) -> int:
+    now_ms = int(time.time() * 1000)
+    stamps = range(now_ms - int(history_hours * 3_600_000), now_ms, SEED_STEP_MS)
+    snaps = [
+        ({"city": city_name(c), "temperature_c": 10.0 + (t // SEED_STEP_MS) % 9, "description": "few clouds",
+          "humidity": 60, "wind_speed": 3.2}, t)
+        for c in range(cities) for t in stamps
+    ]
+    if isinstance(store, MemoryStore):
+        for snap, t in snaps:
+            store.insert(snap, t)
+    else:
+        store.col.delete_many({"city_key": {"$in": [city_name(c).lower() for c in range(cities)]}})
+        if snaps:
+            store.col.insert_many([store._doc(snap, t) for snap, t in snaps])
+    return len(snaps)
+
+
+def main():
+    kind = sys.argv[1] if len(sys.argv) > 1 else "memory"
+    mode = sys.argv[2] if len(sys.argv) > 2 else "thread"
+    cities = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    history_hours = float(sys.argv[4]) if len(sys.argv) > 4 else 24
+    if kind != "mongo" and mode != "thread":
+        raise SystemExit(f"the {kind} store only works with the thread server")
+
+    from server.weather_server import WeatherService, serve
+    store = _store(kind)
+    seeded = _seed(store, cities, history_hours)
+    print(f"[harness] seeded {seeded} snapshots into the {kind} store")
+    if mode == "thread":
+        serve("thread", service=WeatherService(dao=store))
+    else:
+        store.close()
+        serve(mode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# reproducible load test: starts the fake OWM, the gRPC server (benchmarks/harness_server.py on a memory,
+# mongomock or real MongoDB store) and, for --target gateway, the gateway under uvicorn as subprocesses, then
+# drives a current / history / mixed workload at fixed concurrency. prints (or writes with --out) one JSON
+# document with throughput, p50/p95/p99 per operation, error counts and server/gateway memory, tagged with
+# the git commit; --compare old.json adds the change against an earlier run. server and gateway settings
+# (CACHE_TTL_S, PREFETCH, SERVER_MODE for --store mongo...) are passed through from the environment.
+# usage: python -m benchmarks.load --workload mixed --target gateway --duration 20 --out run.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import grpc
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "server", "generated"))
+import weather_pb2, weather_pb2_grpc # type: ignore
+
+from benchmarks.harness_server import city_name
+
+API_KEY = "bench-secret"
+STARTUP_TIMEOUT_S = 60
+
+
+def _args(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    p.add_argument("--workload", choices=("current", "history", "mixed"), default="mixed")
+    p.add_argument("--history-share", type=float, default=0.2, help="share of history calls in the mixed workload")
+    p.add_argument("--target", choices=("grpc", "gateway"), default="grpc")
+    p.add_argument("--store", choices=("memory", "mongomock", "mongo"), default="memory")
+    p.add_argument("--server-mode", default=os.getenv("SERVER_MODE", "thread"), help="only with --store mongo")
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--duration", type=float, default=10.0, help="measured seconds, after --warmup")
+    p.add_argument("--warmup", type=float, default=2.0)
+    p.add_argument("--cities", type=int, default=100)
+    p.add_argument("--zipf", type=float, default=1.1, help="popularity skew of the cities, 0 = uniform")
+    p.add_argument("--history-hours", type=float, default=24.0, help="seeded and requested history range")
+    p.add_argument("--owm-latency-ms", type=float, default=50.0)
+    p.add_argument("--owm-error-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="also write the JSON result to this file")
+    p.add_argument("--compare", help="earlier result JSON to diff against")
+    return p.parse_args(argv)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(args: list, env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *args], cwd=BASE_DIR, env={**os.environ, **env})
+
+
+def _memory_mb(pid: int) -> dict:
+    # current and peak resident set size from /proc (linux only)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    to_mb = lambda v: round(int(v.split()[0]) / 1024, 1)
+    return {"rss_mb": to_mb(fields["VmRSS"]), "peak_rss_mb": to_mb(fields["VmHWM"])}
+
+
+def _summary(latencies: list) -> dict:
+    if not latencies:
+        return {"count": 0}
+    latencies = sorted(latencies)
+    pick = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+    return {"count": len(latencies), "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(latencies[-1], 3)}
+
+
+class _Workload:
+    def __init__(self, args):
+        self.args = args
+        self.cities = [city_name(i) for i in range(args.cities)]
+        weights = [1 / (rank ** args.zipf) for rank in range(1, len(self.cities) + 1)]
+        self.cum_weights = [sum(weights[:i + 1]) for i in range(len(weights))]
+        self.history_share = {"current": 0.0, "history": 1.0, "mixed": args.history_share}[args.workload]
+
+    def next(self, rng: random.Random):
+        op = "history" if rng.random() < self.history_share else "current"
+        return op, rng.choices(self.cities, cum_weights=self.cum_weights)[0]
+
+    def history_range(self):
+        to_ms = int(time.time() * 1000)
+        return to_ms - int(self.args.history_hours * 3_600_000), to_ms
+
+
+class _GrpcClient:
+    def __init__(self, addr: str, workload: _Workload):
+        self.channel = grpc.aio.insecure_channel(addr)
+        self.stub = weather_pb2_grpc.WeatherServiceStub(self.channel)
+        self.workload = workload
+
+    async def ready(self):
+        await asyncio.wait_for(self.channel.channel_ready(), STARTUP_TIMEOUT_S)
+
+    async def call(self, op: str, city: str) -> str:
+        metadata = (("x-api-key", API_KEY),)
+        try:
+            if op == "current":
+                await self.stub.GetCurrentWeather(
+                    weather_pb2.GetCurrentWeatherRequest(city=city), metadata=metadata, timeout=30)
+            else:
+                from_ms, to_ms = self.workload.history_range()
+                await self.stub.GetWeatherHistory(
+                    weather_pb2.GetWeatherHistoryRequest(city=city, from_ms=from_ms, to_ms=to_ms),
+                    metadata=metadata, timeout=30)
+            return "OK"
+        except grpc.aio.AioRpcError as e:
+            return e.code().name
+
+    async def close(self):
+        await self.channel.close()
+
+
+class _GatewayClient:
+    def __init__(self, base_url: str, workload: _Workload, concurrency: int):
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self.client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30)
+        self.workload = workload
+
+    async def ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT_S
+        while True:
+            try:
+                await self.client.get("/api/weather/current", params={"city": city_name(0)})
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+    async def call(self, op: str, city: str) -> str:
+        try:
+            if op == "current":
+                r = await self.client.get("/api/weather/current", params={"city": city})
+            else:
+                from_ms, to_ms = self.workload.history_range()
+                r = await self.client.get("/api/weather/history",
+                                          params={"city": city, "from_ms": from_ms, "to_ms": to_ms})
+            return "OK" if r.status_code == 200 else str(r.status_code)
+        except httpx.TransportError as e:
+            return type(e).__name__
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def _drive(make_client, workload: _Workload, args) -> dict:
+    # grpc.aio channels belong to the loop they are created on
+    client = make_client()
+    await client.ready()
+    latencies = {"current": [], "history": []}
+    errors = Counter()
+    start = time.perf_counter()
+    measure_from, stop_at = start + args.warmup, start + args.warmup + args.duration
+
+    async def worker(i: int):
+        rng = random.Random(args.seed * 1000 + i)
+        while time.perf_counter() < stop_at:
+            op, city = workload.next(rng)
+            t0 = time.perf_counter()
+            status = await client.call(op, city)
+            if t0 < measure_from:
+                continue
+            latencies[op].append((time.perf_counter() - t0) * 1000)
+            if status != "OK":
+                errors[f"{op}:{status}"] += 1
+
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    await client.close()
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "requests": total,
+        "throughput_rps": round(total / args.duration, 1),
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "errors": dict(errors),
+        "latency": _summary(latencies["current"] + latencies["history"]),
+        "operations": {op: _summary(v) for op, v in latencies.items() if v},
+    }
+
+
+def _commit() -> dict:
+    def git(*cmd):
+        out = subprocess.run(["git", *cmd], cwd=BASE_DIR, capture_output=True, text=True)
+        return out.stdout.strip() if out.returncode == 0 else None
+    return {"sha": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def _compare(result: dict, baseline: dict) -> dict:
+    # relative change in percent, positive = higher than the baseline
+    def pct(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    new, old = result["results"], baseline["results"]
+    diff = {"baseline_commit": baseline.get("commit", {}).get("sha"),
+            # runs are only comparable with the same settings
+            "config_differs": sorted(k for k, v in result["config"].items() if baseline.get("config", {}).get(k) != v),
+            "throughput_rps_pct": pct(new["throughput_rps"], old["throughput_rps"])}
+    for section in ("latency", *(f"operations.{op}" for op in new["operations"])):
+        a, b = _lookup(new, section), _lookup(old, section)
+        if a and b:
+            diff[section] = {k: pct(a[k], b[k]) for k in ("p50_ms", "p95_ms", "p99_ms") if k in a and k in b}
+    return diff
+
+
+def _lookup(doc: dict, dotted: str):
+    for part in dotted.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+def main(argv=None):
+    args = _args(argv)
+    owm_port, grpc_port, http_port = _free_port(), _free_port(), _free_port()
+    env = {"GRPC_PORT": str(grpc_port), "SERVICE_API_KEY": API_KEY, "OWM_API_KEY": "bench",
+           "OWM_BASE_URL": f"http://127.0.0.1:{owm_port}/data/2.5/weather", "METRICS_PORT": "0"}
+    procs = {"owm": _spawn(["benchmarks.fake_owm", str(owm_port), str(args.owm_latency_ms), str(args.owm_error_rate)], {})}
+    procs["server"] = _spawn(["benchmarks.harness_server", args.store, args.server_mode, str(args.cities),
+                              str(args.history_hours)], env)
+    workload = _Workload(args)
+    try:
+        if args.target == "gateway":
+            procs["gateway"] = _spawn(["uvicorn", "gateway.main:app", "--port", str(http_port), "--log-level", "warning"],
+                                      {"GRPC_ADDR": f"localhost:{grpc_port}", "SERVICE_API_KEY": API_KEY})
+            make_client = lambda: _GatewayClient(f"http://127.0.0.1:{http_port}", workload, args.concurrency)
+        else:
+            make_client = lambda: _GrpcClient(f"localhost:{grpc_port}", workload)
+        results = asyncio.run(_drive(make_client, workload, args))
+        results["memory"] = {name: _memory_mb(procs[name].pid) for name in ("server", "gateway") if name in procs}
+        results["owm"] = httpx.get(f"http://127.0.0.1:{owm_port}/stats").json()
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.wait(timeout=30)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+    doc = {"commit": _commit(), "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+           "config": config, "results": results}
+    if args.compare:
+        with open(args.compare) as f:
+            doc["comparison"] = _compare(doc, json.load(f))
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
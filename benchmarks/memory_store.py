@@ -0,0 +1,53 @@
+# in-process stand-in for WeatherDAO (the calls WeatherService makes for current weather and raw history),
+# so load tests can run without MongoDB. snapshots are kept per city_key, sorted by timestamp_ms.
+import bisect
+import threading
+import time
+from typing import Iterator, List, Optional
+
+
+class MemoryStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._times = {}
+
+    def save_snapshot(self, snap: dict) -> dict:
+        return self.save_snapshots([snap])[0]
+
+    def save_snapshots(self, snaps: List[dict]) -> List[dict]:
+        now_ms = int(time.time() * 1000)
+        return [self.insert(snap, snap.get("timestamp_ms") or now_ms) for snap in snaps]
+
+    def insert(self, snap: dict, timestamp_ms: int) -> dict:
+        doc = {**snap, "timestamp_ms": timestamp_ms}
+        key = (snap.get("city") or "").strip().lower()
+        with self._lock:
+            times = self._times.setdefault(key, [])
+            i = bisect.bisect_right(times, timestamp_ms)
+            times.insert(i, timestamp_ms)
+            self._series.setdefault(key, []).insert(i, doc)
+        return doc
+
+    def fetch_series(self, city: str, from_ms: int, to_ms: int) -> List[dict]:
+        key = (city or "").strip().lower()
+        with self._lock:
+            times = self._times.get(key, [])
+            lo, hi = bisect.bisect_left(times, from_ms), bisect.bisect_left(times, to_ms)
+            return list(self._series.get(key, [])[lo:hi])
+
+    def iter_series(self, city: str, from_ms: int, to_ms: int, batch_size: int) -> Iterator[List[dict]]:
+        series = self.fetch_series(city, from_ms, to_ms)
+        for i in range(0, len(series), batch_size):
+            yield series[i:i + batch_size]
+
+    def latest_snapshot(self, city: str) -> Optional[dict]:
+        with self._lock:
+            series = self._series.get((city or "").strip().lower())
+            return series[-1] if series else None
+
+    def history_resolution(self, city: str, from_ms: int, to_ms: int, max_points: int) -> str:
+        return "raw"
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,119 @@
+# gateway-side history cache: ranges are split into aligned time buckets, past ("sealed") buckets are
+# cached for a long time, the open tail is always fetched fresh, and the pieces are stitched back together
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Tuple
+
+# rough per-point footprint of a cached snapshot dict, on top of its strings
+POINT_OVERHEAD_BYTES = 400
+
+Fetch = Callable[[int, int], Awaitable[List[dict]]]
+
+
+class HistoryCache:
+    def __init__(self, bucket_ms: int, ttl_s: float, max_bytes: int, seal_grace_ms: int,
+                 clock: Callable[[], float] = time.time):
+        self.bucket_ms = bucket_ms
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        # a bucket is sealed once it ended this long ago (late writes, write-behind, clock skew)
+        self.seal_grace_ms = seal_grace_ms
+        self._clock = clock
+        self._data: "OrderedDict[Tuple[str, int], Tuple[float, List[dict], int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tail_fetches = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    async def get_range(self, city: str, from_ms: int, to_ms: int, fetch: Fetch) -> List[dict]:
+        """Points in [from_ms, to_ms), sealed buckets from the cache, everything else via fetch(from, to)."""
+        key = (city or "").strip().lower()
+        now = self._clock()
+        sealed_before = int(now * 1000) - self.seal_grace_ms
+        start = from_ms - from_ms % self.bucket_ms
+
+        points, missing = [], []
+        bucket = start
+        while bucket < to_ms and bucket + self.bucket_ms <= sealed_before:
+            cached = self._lookup((key, bucket), now)
+            if cached is None:
+                self.misses += 1
+                missing.append(bucket)
+            else:
+                self.hits += 1
+                points.extend(cached)
+            bucket += self.bucket_ms
+        tail_start = bucket
+
+        # adjacent missing buckets share one fetch
+        for run_start, run_end in _runs(missing, self.bucket_ms):
+            fetched = await fetch(run_start, run_end)
+            for b in range(run_start, run_end, self.bucket_ms):
+                self._store((key, b), [p for p in fetched if b <= p["timestamp_ms"] < b + self.bucket_ms], now)
+            points.extend(fetched)
+
+        if tail_start < to_ms:
+            self.tail_fetches += 1
+            points.extend(await fetch(tail_start, to_ms))
+
+        points.sort(key=lambda p: p["timestamp_ms"])
+        return [p for p in points if from_ms <= p["timestamp_ms"] < to_ms]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "tail_fetches": self.tail_fetches,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def _lookup(self, key, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, points, size = entry
+        if expires_at <= now:
+            del self._data[key]
+            self.bytes -= size
+            return None
+        self._data.move_to_end(key)
+        return points
+
+    def _store(self, key, points: List[dict], now: float) -> None:
+        if not self.enabled:
+            return
+        size = _size(points)
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.bytes -= old[2]
+        self._data[key] = (now + self.ttl_s, points, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self._data:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+
+def _runs(buckets: List[int], bucket_ms: int) -> List[Tuple[int, int]]:
+    # [0, 1h, 2h, 5h] -> [(0, 3h), (5h, 6h)]
+    runs = []
+    for b in buckets:
+        if runs and runs[-1][1] == b:
+            runs[-1] = (runs[-1][0], b + bucket_ms)
+        else:
+            runs.append((b, b + bucket_ms))
+    return runs
+
+
+def _size(points: List[dict]) -> int:
+    return sum(POINT_OVERHEAD_BYTES + len(p["city"]) + len(p["description"]) for p in points)
@@ -0,0 +1,133 @@
+# HTTP caching for the gateway's JSON responses: a strong ETag over the encoded body (it carries every
+# snapshot's timestamp_ms, so the tag changes exactly when the data does), Last-Modified from the newest
+# timestamp_ms and Cache-Control max-age for as long as the data stays fresh server-side. the freshness map
+# remembers what was last sent per URL, so a conditional request inside that window is answered 304
+# without a gRPC call
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Mapping, NamedTuple, Optional, Set
+
+from fastapi import Response
+
+
+class Freshness(NamedTuple):
+    etag: str
+    last_modified_ms: int
+    expires_at: float
+
+    def headers(self, now: float) -> dict:
+        max_age = max(0, round(self.expires_at - now))
+        headers = {"ETag": self.etag, "Cache-Control": f"max-age={max_age}" if max_age else "no-cache"}
+        if self.last_modified_ms:
+            headers["Last-Modified"] = formatdate(self.last_modified_ms / 1000, usegmt=True)
+        return headers
+
+
+class FreshnessMap:
+    """URL -> Freshness of the last response sent for it, LRU capped at max_entries (0 disables).
+
+    Entries can be grouped (by city, under every name they were asked and answered for) and dropped together
+    when the gateway sees newer data for a group.
+    """
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: "OrderedDict[str, Freshness]" = OrderedDict()
+        self._groups_of: Dict[str, Set[str]] = {}
+        self._groups: Dict[str, Set[str]] = {}
+        # conditional requests answered without calling the server, and those that had to
+        self.hits = 0
+        self.revalidations = 0
+
+    def fresh(self, key: str) -> Optional[Freshness]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self._clock():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def put(self, key: str, body: bytes, last_modified_ms: int, max_age_s: float,
+            groups: Iterable[str] = ()) -> Freshness:
+        entry = Freshness(etag_of(body), last_modified_ms, self._clock() + max(0.0, max_age_s))
+        if self.max_entries > 0 and max_age_s > 0:
+            self._drop(key)
+            self._data[key] = entry
+            groups = {group for group in groups if group}
+            if groups:
+                self._groups_of[key] = groups
+                for group in groups:
+                    self._groups.setdefault(group, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._drop(next(iter(self._data)))
+        return entry
+
+    def invalidate(self, group: str) -> None:
+        for key in list(self._groups.get(group, ())):
+            self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        self._data.pop(key, None)
+        for group in self._groups_of.pop(key, ()):
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def respond(self, request_headers: Mapping[str, str], key: str) -> Optional[Response]:
+        """304 when the client already holds the fresh response for key, else None (call the server)."""
+        if not is_conditional(request_headers):
+            return None
+        entry = self.fresh(key)
+        if entry is not None and not_modified(request_headers, entry):
+            self.hits += 1
+            return not_modified_response(entry, self._clock())
+        self.revalidations += 1
+        return None
+
+    def send(self, request_headers: Mapping[str, str], key: str, body: bytes, last_modified_ms: int,
+             max_age_s: float, headers: dict = None, groups: Iterable[str] = ()) -> Response:
+        """The JSON response for a freshly fetched body with its caching headers, 304 if the client has it."""
+        entry = self.put(key, body, last_modified_ms, max_age_s, groups)
+        now = self._clock()
+        if is_conditional(request_headers) and not_modified(request_headers, entry):
+            return not_modified_response(entry, now)
+        return Response(body, media_type="application/json", headers={**(headers or {}), **entry.headers(now)})
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "max_entries": self.max_entries,
+                "not_modified_without_grpc": self.hits, "revalidations": self.revalidations}
+
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def is_conditional(headers: Mapping[str, str]) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def not_modified(headers: Mapping[str, str], entry: Freshness) -> bool:
+    # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2); weak comparison for If-None-Match
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or entry.etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and entry.last_modified_ms:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified has second resolution
+        return entry.last_modified_ms // 1000 <= since
+    return False
+
+
+def not_modified_response(entry: Freshness, now: float) -> Response:
+    return Response(status_code=304, headers=entry.headers(now))
@@ -1,7 +1,9 @@
-import os, sys, time
+import os, sys, time, asyncio, itertools
 import grpc
-from fastapi import FastAPI, HTTPException, Query, Request
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from contextlib import asynccontextmanager
@@ -14,33 +16,109 @@ import weather_pb2, weather_pb2_grpc # type: ignore
 from dotenv import load_dotenv
 load_dotenv()
 
+from gateway.history_cache import HistoryCache
+from gateway.http_cache import FreshnessMap
+from server.grpc_options import compression_options, keepalive_options, message_size_options
+from server import tracing
+from opentelemetry import propagate, trace
+
 SERVICE_API_KEY = os.getenv("SERVICE_API_KEY", "dev-secret")
 GRPC_ADDR = os.getenv("GRPC_ADDR", "localhost:50051")
+STREAM_TIMEOUT_S = float(os.getenv("STREAM_TIMEOUT_S", "60"))
+# channels (= connections) to GRPC_ADDR, used round-robin. a prefork server balances per connection,
+# so give it at least one per worker
+GRPC_CHANNELS = int(os.getenv("GRPC_CHANNELS", "1"))
+# channel transport: request compression (none | gzip | deflate, responses follow the server's GRPC_COMPRESSION),
+# keepalive pings every GRPC_KEEPALIVE_TIME_S (0 disables; keep it at or above the server's
+# GRPC_KEEPALIVE_MIN_CLIENT_PING_S) so idle connections behind load balancers are detected, max message size
+# in MB (-1 = unlimited; long raw histories can exceed grpc's default of 4)
+GRPC_COMPRESSION = os.getenv("GRPC_COMPRESSION", "none")
+GRPC_KEEPALIVE_TIME_S = float(os.getenv("GRPC_KEEPALIVE_TIME_S", "0"))
+GRPC_KEEPALIVE_TIMEOUT_S = float(os.getenv("GRPC_KEEPALIVE_TIMEOUT_S", "20"))
+GRPC_MAX_MESSAGE_MB = float(os.getenv("GRPC_MAX_MESSAGE_MB", "4"))
+
+# /api/weather/history cache: bucket width, ttl of sealed buckets, memory cap (0 disables)
+HISTORY_CACHE_BUCKET_S = int(os.getenv("HISTORY_CACHE_BUCKET_S", "3600"))
+HISTORY_CACHE_TTL_S = float(os.getenv("HISTORY_CACHE_TTL_S", "86400"))
+HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+HISTORY_CACHE_SEAL_GRACE_S = float(os.getenv("HISTORY_CACHE_SEAL_GRACE_S", "60"))
+
+# HTTP caching (ETag/Last-Modified/Cache-Control, 304): max-age of current weather (defaults to the server's
+# CACHE_TTL_S) and of history ranges that reach into the present; ranges that ended more than
+# HISTORY_CACHE_SEAL_GRACE_S ago keep HISTORY_CACHE_TTL_S. URLs remembered to answer 304 without gRPC (0 = none)
+HTTP_CURRENT_MAX_AGE_S = float(os.getenv("HTTP_CURRENT_MAX_AGE_S", os.getenv("CACHE_TTL_S", "300")))
+HTTP_HISTORY_MAX_AGE_S = float(os.getenv("HTTP_HISTORY_MAX_AGE_S", "60"))
+HTTP_FRESHNESS_MAX_ENTRIES = int(os.getenv("HTTP_FRESHNESS_MAX_ENTRIES", "10000"))
+
+# opentelemetry, same settings as the server: none | console | file | otlp
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+# grpc status -> http status, anything else is a 502
+HTTP_STATUS = {
+    "NOT_FOUND": 404,
+    "INVALID_ARGUMENT": 400,
+    "UNAUTHENTICATED": 401,
+    "PERMISSION_DENIED": 403,
+    "RESOURCE_EXHAUSTED": 429,
+    "UNAVAILABLE": 503,
+    "DEADLINE_EXCEEDED": 504,
+}
+
+
+def _channel_options() -> list:
+    # a local subchannel pool keeps channels to the same address from sharing one connection
+    options = [("grpc.use_local_subchannel_pool", 1)] if GRPC_CHANNELS > 1 else []
+    options += compression_options(GRPC_COMPRESSION)
+    options += message_size_options(GRPC_MAX_MESSAGE_MB)
+    options += keepalive_options(GRPC_KEEPALIVE_TIME_S, GRPC_KEEPALIVE_TIMEOUT_S)
+    return options
+
+
+class StubPool:
+    """Stub facade that sends each call over the next channel in turn."""
+
+    def __init__(self, stubs: list):
+        self._next = itertools.cycle(stubs)
+
+    def __getattr__(self, name):
+        return getattr(next(self._next), name)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # create a single grpc channel and stub for this process
-    channel = grpc.insecure_channel(GRPC_ADDR)
-    stub = weather_pb2_grpc.WeatherServiceStub(channel)
+    # grpc.aio channels and stubs for this process, every request multiplexes on them
+    options = _channel_options()
+    channels = [grpc.aio.insecure_channel(GRPC_ADDR, options=options) for _ in range(max(1, GRPC_CHANNELS))]
+    stubs = [weather_pb2_grpc.WeatherServiceStub(channel) for channel in channels]
 
     try:
-        grpc.channel_ready_future(channel).result(timeout=10)
+        await asyncio.wait_for(asyncio.gather(*(c.channel_ready() for c in channels)), timeout=10)
     except Exception:
         print("(gateway) grpc channel not ready yet, will retry on first request")
 
-    app.state.grpc_channel = channel
-    app.state.grpc_stub = stub
-    print("(gateway) grpc channel opened")
+    app.state.grpc_channels = channels
+    app.state.grpc_stub = stubs[0] if len(stubs) == 1 else StubPool(stubs)
+    app.state.tracer_provider = tracing.setup("weather-gateway", TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_FILE)
+    app.state.history_cache = HistoryCache(
+        HISTORY_CACHE_BUCKET_S * 1000, HISTORY_CACHE_TTL_S,
+        HISTORY_CACHE_MAX_BYTES, int(HISTORY_CACHE_SEAL_GRACE_S * 1000),
+    )
+    app.state.freshness = FreshnessMap(HTTP_FRESHNESS_MAX_ENTRIES)
+    print(f"(gateway) {len(channels)} grpc channel(s) opened")
 
     try: 
         yield
     finally:
         try:
-            app.state.grpc_channel.close()
-            print("(gateway) grpc channel closed")
+            for channel in app.state.grpc_channels:
+                await channel.close()
+            print("(gateway) grpc channels closed")
         except Exception:
             pass
+        if app.state.tracer_provider:
+            app.state.tracer_provider.shutdown()
 
 
 app = FastAPI(title="Weather Gateway", lifespan=lifespan)
@@ -54,6 +132,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # one SERVER span per request, continuing a traceparent sent by the caller if any
+    if not getattr(request.app.state, "tracer_provider", None):
+        return await call_next(request)
+    parent = propagate.extract(request.headers)
+    with tracing.tracer.start_as_current_span(
+        f"{request.method} {request.url.path}", context=parent, kind=trace.SpanKind.SERVER,
+    ) as span:
+        response = await call_next(request)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+
+def _metadata() -> tuple:
+    # api key plus the current trace context for the server side
+    return tracing.inject_metadata((("x-api-key", SERVICE_API_KEY),))
+
+
+def _http_error(e: grpc.RpcError) -> HTTPException:
+    code = e.code().name
+    return HTTPException(status_code=HTTP_STATUS.get(code, 502), detail=f"{code}: {e.details()}")
+
+
+def _snapshot_dict(s) -> dict:
+    return {
+        "city": s.city,
+        "temperature_c": s.temperature_c,
+        "description": s.description,
+        "humidity": s.humidity,
+        "wind_speed": s.wind_speed,
+        "timestamp_ms": s.timestamp_ms,
+    }
+
+
+def _columns_dict(c) -> dict:
+    # absolute timestamps back from the deltas, every other column as is
+    return {
+        "city": c.city,
+        "resolution": c.resolution or "raw",
+        "timestamp_ms": list(itertools.accumulate(c.timestamp_delta_ms)),
+        "temperature_c": list(c.temperature_c),
+        "humidity": list(c.humidity),
+        "wind_speed": list(c.wind_speed),
+        "descriptions": list(c.descriptions),
+        "description_code": list(c.description_code),
+    }
+
+
+def _json(payload, headers: dict = None, request: Request = None, last_modified_ms: int = 0,
+          max_age_s: float = 0, cities: tuple = ()) -> Response:
+    # plain dicts/lists straight to JSON bytes. the pydantic models below only document the schema in
+    # OpenAPI (responses=), validating and re-serializing thousands of history points was most of the
+    # gateway's CPU. same bytes as the response_model path (compact separators, utf-8, NaN/inf as null),
+    # except floats of 1e16 and up, which orjson writes as 1e16 instead of 1e+16 (same value)
+    # with request: ETag/Last-Modified/Cache-Control headers, 304 when the client already has this body
+    body = orjson.dumps(payload)
+    if request is None:
+        return Response(body, media_type="application/json", headers=headers)
+    freshness = request.app.state.freshness
+    return freshness.send(request.headers, _url_key(request), body, last_modified_ms, max_age_s, headers,
+                          [_city_group(city) for city in cities])
+
+
+def _not_modified(request: Request) -> Optional[Response]:
+    # 304 straight from the freshness map, before any gRPC call
+    return request.app.state.freshness.respond(request.headers, _url_key(request))
+
+
+def _url_key(request: Request) -> str:
+    return f"{request.url.path}?{request.url.query}"
+
+
+def _city_group(city: Optional[str]) -> str:
+    return (city or "").strip().lower()
+
+
+def _history_max_age(to_ms: Optional[int]) -> float:
+    # a range that ended before the seal grace no longer changes, one reaching into the present does
+    sealed_before_ms = int(time.time() * 1000) - int(HISTORY_CACHE_SEAL_GRACE_S * 1000)
+    return HISTORY_CACHE_TTL_S if to_ms is not None and to_ms <= sealed_before_ms else HTTP_HISTORY_MAX_AGE_S
+
+
+def _time_range(from_ms: Optional[int], to_ms: Optional[int]):
+    # calcuez ultimele 24h daca params lipsesc
+    now = int(time.time() * 1000)
+    if to_ms is None:
+        to_ms = now
+    if from_ms is None:
+        from_ms = to_ms - 24 * 60 * 60 * 1000 
+
+    if from_ms <= 0 or to_ms <= 0 or from_ms >= to_ms:
+        raise HTTPException(status_code=400, detail="Invalid time range")
+    return from_ms, to_ms
+
+
 class WeatherCurrentResponse(BaseModel):
     city: str
     temperature_c: float
@@ -61,6 +235,8 @@ class WeatherCurrentResponse(BaseModel):
     humidity: int
     wind_speed: float
     timestamp_ms: int
+    # OWM unavailable, this is the latest stored snapshot
+    stale: bool = False
 
 class WeatherHistoryPoint(BaseModel):
     city: str
@@ -70,93 +246,251 @@ class WeatherHistoryPoint(BaseModel):
     wind_speed: float
     timestamp_ms: int
 
+class WeatherHistoryColumns(BaseModel):
+    # point i: timestamp_ms[i], temperature_c[i], ..., descriptions[description_code[i]]
+    city: str
+    resolution: str
+    timestamp_ms: list[int]
+    temperature_c: list[float]
+    humidity: list[int]
+    wind_speed: list[float]
+    descriptions: list[str]
+    description_code: list[int]
 
-@app.get("/api/weather/current", response_model=WeatherCurrentResponse)
-def current(request: Request, city: str):
+class CityWeatherResult(BaseModel):
+    city: str
+    status: str
+    error: Optional[str] = None
+    snapshot: Optional[WeatherCurrentResponse] = None
+
+class AggregateStats(BaseModel):
+    min: float
+    max: float
+    avg: float
+
+class WeatherAggregatePoint(BaseModel):
+    bucket_start_ms: int
+    count: int
+    temperature_c: AggregateStats
+    humidity: AggregateStats
+    wind_speed: AggregateStats
+    description: str
+
+
+@app.get("/api/weather/current", response_class=Response, responses={200: {"model": WeatherCurrentResponse}})
+async def current(
+    request: Request,
+    city: Optional[str] = Query(None, description="City name, resolved through the server's geocode index"),
+    city_id: Optional[int] = Query(None, gt=0, description="OpenWeatherMap city id"),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+):
+    # exactly one of city, city_id or lat+lon; the server checks the combination
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="lat and lon go together")
+    coord = weather_pb2.Coordinates(lat=lat, lon=lon) if lat is not None else None
+    cached = _not_modified(request)
+    if cached is not None:
+        return cached
     try:
         stub = request.app.state.grpc_stub
-        resp = stub.GetCurrentWeather(
-            weather_pb2.GetCurrentWeatherRequest(city=city),
-            metadata=(("x-api-key", SERVICE_API_KEY),),
+        resp = await stub.GetCurrentWeather(
+            weather_pb2.GetCurrentWeatherRequest(city=city or "", city_id=city_id or 0, coord=coord),
+            metadata=_metadata(),
             timeout=5.0
         )
-        s = resp.snapshot
-        return {
-            "city": s.city,
-            "temperature_c": s.temperature_c,
-            "description": s.description,
-            "humidity": s.humidity,
-            "wind_speed": s.wind_speed,
-            "timestamp_ms": s.timestamp_ms,
-        }
+        # fresh for what is left of the max-age since the snapshot was taken; a stale snapshot is served
+        # while OWM is down and must not be kept by clients
+        age_s = max(0.0, time.time() - resp.snapshot.timestamp_ms / 1000)
+        max_age_s = 0 if resp.stale else HTTP_CURRENT_MAX_AGE_S - age_s
+        # grouped under the name the server resolved city/city_id/lat+lon to (history is stored under it)
+        # and the name asked for
+        cities = (resp.snapshot.city, city)
+        if not resp.stale:
+            # the server may just have stored a new snapshot: this city's history responses are outdated
+            for name in cities:
+                request.app.state.freshness.invalidate(_city_group(name))
+        return _json({**_snapshot_dict(resp.snapshot), "stale": resp.stale}, request=request,
+                     last_modified_ms=resp.snapshot.timestamp_ms, max_age_s=max_age_s, cities=cities)
     except grpc.RpcError as e:
-        code = e.code().name
-        detail = e.details()
-        status = 502
-        if code == "NOT_FOUND":
-            status = 404
-        elif code == "INVALID_ARGUMENT":
-            status = 400
-        elif code == "UNAUTHENTICATED":
-            status = 401
-        elif code == "PERMISSION_DENIED":
-            status = 403
-        elif code == "UNAVAILABLE":
-            status = 503
-        elif code == "DEADLINE_EXCEEDED":
-            status = 504
-        raise HTTPException(status_code=status, detail=f"{code}: {detail}")
-
-
-@app.get("/api/weather/history", response_model=list[WeatherHistoryPoint])
-def history(
+        raise _http_error(e)
+
+
+@app.get("/api/weather/current/batch", response_class=Response, responses={200: {"model": list[CityWeatherResult]}})
+async def current_batch(request: Request, city: list[str] = Query(..., description="Repeat for each city")):
+    try:
+        stub = request.app.state.grpc_stub
+        resp = await stub.GetCurrentWeatherBatch(
+            weather_pb2.GetCurrentWeatherBatchRequest(cities=city),
+            metadata=_metadata(),
+            timeout=10.0
+        )
+        return _json([
+            {
+                "city": r.city,
+                "status": r.status,
+                "error": r.error or None,
+                "snapshot": {**_snapshot_dict(r.snapshot), "stale": r.stale} if r.status == "OK" else None,
+            }
+            for r in resp.results
+        ])
+    except grpc.RpcError as e:
+        raise _http_error(e)
+
+
+@app.get("/api/weather/history", response_class=Response, responses={200: {"model": list[WeatherHistoryPoint]}})
+async def history(
     request: Request,
     city: str,
     from_ms: Optional[int] = Query(None, description="Start timestamp (ms). Defaults to now-24h"),
     to_ms: Optional[int]   = Query(None, description="End timestamp (ms). Defaults to now"),
+    max_points: int = Query(0, ge=0, description="Point budget, long ranges come from hourly/daily rollups. 0 = raw"),
 ):
-    # calcuez ultimele 24h daca params lipsesc
-    now = int(time.time() * 1000)
-    if to_ms is None:
-        to_ms = now
-    if from_ms is None:
-        from_ms = to_ms - 24 * 60 * 60 * 1000 
+    max_age_s = _history_max_age(to_ms)
+    from_ms, to_ms = _time_range(from_ms, to_ms)
+    cached = _not_modified(request)
+    if cached is not None:
+        return cached
+    stub = request.app.state.grpc_stub
 
-    if from_ms <= 0 or to_ms <= 0 or from_ms >= to_ms:
-        raise HTTPException(status_code=400, detail="Invalid time range")
+    def send(points: list, resolution: str) -> Response:
+        last_modified_ms = max((p["timestamp_ms"] for p in points), default=0)
+        # the points carry the name the server resolved city to
+        cities = (city, points[0]["city"]) if points else (city,)
+        return _json(points, {"X-History-Resolution": resolution}, request, last_modified_ms, max_age_s, cities)
 
+    async def fetch(f_ms: int, t_ms: int) -> list:
+        resp = await stub.GetWeatherHistory(
+            weather_pb2.GetWeatherHistoryRequest(city=city, from_ms=f_ms, to_ms=t_ms),
+            metadata=_metadata(),
+            timeout=5.0
+        )
+        return [_snapshot_dict(s) for s in resp.series]
+
+    try:
+        cache = request.app.state.history_cache
+        # raw ranges go through the bucket cache, rollup (max_points) responses are passed through
+        if max_points == 0 and cache.enabled:
+            return send(await cache.get_range(city, from_ms, to_ms, fetch), "raw")
+        resp = await stub.GetWeatherHistory(
+            weather_pb2.GetWeatherHistoryRequest(city=city, from_ms=from_ms, to_ms=to_ms, max_points=max_points),
+            metadata=_metadata(),
+            timeout=5.0
+        )
+        return send([_snapshot_dict(s) for s in resp.series], resp.resolution or "raw")
+    except grpc.RpcError as e:
+        raise _http_error(e)
+
+
+@app.get("/api/weather/history/columns", response_class=Response, responses={200: {"model": WeatherHistoryColumns}})
+async def history_columns(
+    request: Request,
+    city: str,
+    from_ms: Optional[int] = Query(None, description="Start timestamp (ms). Defaults to now-24h"),
+    to_ms: Optional[int]   = Query(None, description="End timestamp (ms). Defaults to now"),
+    max_points: int = Query(0, ge=0, description="Point budget, long ranges come from hourly/daily rollups. 0 = raw"),
+):
+    # same series as /api/weather/history as one array per field, for charts and bulk consumers
+    max_age_s = _history_max_age(to_ms)
+    from_ms, to_ms = _time_range(from_ms, to_ms)
+    cached = _not_modified(request)
+    if cached is not None:
+        return cached
+    try:
+        stub = request.app.state.grpc_stub
+        resp = await stub.GetWeatherHistoryColumns(
+            weather_pb2.GetWeatherHistoryRequest(city=city, from_ms=from_ms, to_ms=to_ms, max_points=max_points),
+            metadata=_metadata(),
+            timeout=5.0
+        )
+        columns = _columns_dict(resp)
+        return _json(columns, request=request, last_modified_ms=max(columns["timestamp_ms"], default=0),
+                     max_age_s=max_age_s, cities=(city, columns["city"]))
+    except grpc.RpcError as e:
+        raise _http_error(e)
+
+
+@app.get("/api/weather/history/cache")
+async def history_cache_stats(request: Request):
+    return request.app.state.history_cache.stats()
+
+
+@app.get("/api/http-cache")
+async def http_cache_stats(request: Request):
+    return request.app.state.freshness.stats()
+
+
+@app.get("/api/weather/history/stream")
+async def history_stream(
+    request: Request,
+    city: str,
+    from_ms: Optional[int] = Query(None, description="Start timestamp (ms). Defaults to now-24h"),
+    to_ms: Optional[int]   = Query(None, description="End timestamp (ms). Defaults to now"),
+    batch_size: int = Query(0, ge=0, description="Snapshots per gRPC chunk, 0 = server default"),
+):
+    from_ms, to_ms = _time_range(from_ms, to_ms)
+    # pull the first chunk here so early errors still map to a proper http status
+    try:
+        stub = request.app.state.grpc_stub
+        chunks = stub.StreamWeatherHistory(
+            weather_pb2.StreamWeatherHistoryRequest(city=city, from_ms=from_ms, to_ms=to_ms, batch_size=batch_size),
+            metadata=_metadata(),
+            timeout=STREAM_TIMEOUT_S
+        )
+        chunks = chunks.__aiter__()
+        first = await anext(chunks, None)
+    except grpc.RpcError as e:
+        raise _http_error(e)
+
+    async def ndjson():
+        chunk = first
+        try:
+            while chunk is not None:
+                for s in chunk.series:
+                    yield orjson.dumps(_snapshot_dict(s)) + b"\n"
+                chunk = await anext(chunks, None)
+        except grpc.RpcError as e:
+            # headers are already sent, report the failure as the last line
+            yield orjson.dumps({"error": f"{e.code().name}: {e.details()}"}) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+def _stats_dict(st) -> dict:
+    return {"min": st.min, "max": st.max, "avg": st.avg}
+
+
+@app.get("/api/weather/history/aggregates", response_class=Response,
+         responses={200: {"model": list[WeatherAggregatePoint]}})
+async def history_aggregates(
+    request: Request,
+    city: str,
+    bucket: str = Query("1h", description="Bucket width, e.g. 5m, 1h, 1d"),
+    from_ms: Optional[int] = Query(None, description="Start timestamp (ms). Defaults to now-24h"),
+    to_ms: Optional[int]   = Query(None, description="End timestamp (ms). Defaults to now"),
+):
+    max_age_s = _history_max_age(to_ms)
+    from_ms, to_ms = _time_range(from_ms, to_ms)
+    cached = _not_modified(request)
+    if cached is not None:
+        return cached
     try:
         stub = request.app.state.grpc_stub
-        resp = stub.GetWeatherHistory(
-            weather_pb2.GetWeatherHistoryRequest(city=city, from_ms=from_ms, to_ms=to_ms),
-            metadata=(("x-api-key", SERVICE_API_KEY),),
+        resp = await stub.GetWeatherAggregates(
+            weather_pb2.GetWeatherAggregatesRequest(city=city, from_ms=from_ms, to_ms=to_ms, bucket=bucket),
+            metadata=_metadata(),
             timeout=5.0
         )
-        return [
+        return _json([
             {
-                "city": s.city,
-                "temperature_c": s.temperature_c,
-                "description": s.description,
-                "humidity": s.humidity,
-                "wind_speed": s.wind_speed,
-                "timestamp_ms": s.timestamp_ms,
+                "bucket_start_ms": b.bucket_start_ms,
+                "count": b.count,
+                "temperature_c": _stats_dict(b.temperature_c),
+                "humidity": _stats_dict(b.humidity),
+                "wind_speed": _stats_dict(b.wind_speed),
+                "description": b.description,
             }
-            for s in resp.series
-        ]
+            for b in resp.buckets
+        ], request=request, max_age_s=max_age_s, cities=(city,))
     except grpc.RpcError as e:
-        code = e.code().name
-        detail = e.details()
-        status = 502
-        if code == "NOT_FOUND":
-            status = 404
-        elif code == "INVALID_ARGUMENT":
-            status = 400
-        elif code == "UNAUTHENTICATED":
-            status = 401
-        elif code == "PERMISSION_DENIED":
-            status = 403
-        elif code == "UNAVAILABLE":
-            status = 503
-        elif code == "DEADLINE_EXCEEDED":
-            status = 504
-        raise HTTPException(status_code=status, detail=f"{code}: {detail}")
\ No newline at end of file
+        raise _http_error(e)
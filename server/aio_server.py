@@ -0,0 +1,238 @@
+# asyncio flavour of WeatherService on grpc.aio (SERVER_MODE=aio)
+import asyncio
+import os
+import signal
+
+import grpc
+
+from .auth import AioApiKeyInterceptor
+from . import metrics, tracing
+from .owm_client import AsyncOpenWeatherMapClient, is_upstream_failure
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .config import (
+    GRPC_PORT, CACHE_TTL_S, CACHE_MAX_ENTRIES,
+    HISTORY_BATCH_SIZE, HISTORY_MAX_BATCH_SIZE,
+    BATCH_MAX_CITIES, BATCH_CONCURRENCY, GRPC_SHUTDOWN_GRACE_S,
+    METRICS_PORT, METRICS_ADDR, TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_FILE,
+    OWM_BREAKER_FAILURES, OWM_BREAKER_RESET_S, OWM_BREAKER_HALF_OPEN_CALLS,
+    PREFETCH_TOP_K, PREFETCH_INTERVAL_S,
+)
+from .cache import TTLCache
+from .dao import AsyncWeatherDAO
+from .geocode import Lookup, StoredNames, canonical_city, make_lookup
+from .prefetch import AsyncPrefetcher
+from .rate_limit import INTERACTIVE, BACKGROUND
+from .weather_server import (
+    _columns, _error_status, _geo_index, _parse, _prefetch_plan, _rate_limiter, _server_options, _snapshot,
+    current_lookup, parse_bucket,
+)
+
+import weather_pb2_grpc, weather_pb2 # type: ignore
+
+
+class AioWeatherService(weather_pb2_grpc.WeatherServiceServicer):
+
+    def __init__(self, owm=None, dao=None):
+        # owm/dao default to the real clients; benchmarks pass in-memory stand-ins
+        dao = dao or AsyncWeatherDAO()
+        self.limiter = _rate_limiter(getattr(dao, "db", None))
+        owm = owm or AsyncOpenWeatherMapClient(limiter=self.limiter)
+        self.owm = metrics.Timed(tracing.Traced(owm, "owm"), metrics.OWM_LATENCY)
+        self.dao = metrics.Timed(tracing.Traced(dao, "dao"), metrics.DAO_LATENCY)
+        self.cache = TTLCache(CACHE_TTL_S, CACHE_MAX_ENTRIES)
+        self.breaker = CircuitBreaker(OWM_BREAKER_FAILURES, OWM_BREAKER_RESET_S, OWM_BREAKER_HALF_OPEN_CALLS)
+        self.batch_limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+        self.prefetch = _prefetch_plan()
+        self.geo = _geo_index()
+        self.stored_names = StoredNames()
+
+    async def GetCurrentWeather(self, request, context):
+        try:
+            lookup = current_lookup(self.geo, request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        try:
+            data = await self._fetch(lookup)
+            saved = await self.dao.save_snapshot(data)
+            return weather_pb2.GetCurrentWeatherResponse(snapshot=_snapshot(saved))
+        except Exception as e:
+            stale = await self._stale(lookup, e)
+            if stale is not None:
+                return weather_pb2.GetCurrentWeatherResponse(snapshot=_snapshot(stale), stale=True)
+            await context.abort(*_error_status(e))
+
+    async def GetCurrentWeatherBatch(self, request, context):
+        cities = [(c or "").strip() for c in request.cities]
+        if not cities:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "At least one city is required.")
+        if len(cities) > BATCH_MAX_CITIES:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"At most {BATCH_MAX_CITIES} cities per batch.")
+
+        async def limited(lookup):
+            async with self.batch_limit:
+                return await self._fetch(lookup)
+
+        lookups = [make_lookup(self.geo, city) if city else None for city in cities]
+        # one fetch per distinct place, with the first spelling asked for
+        distinct = {}
+        for lookup in lookups:
+            if lookup:
+                distinct.setdefault(lookup.key, lookup)
+        outcomes = await asyncio.gather(*(limited(lookup) for lookup in distinct.values()), return_exceptions=True)
+        fetched = dict(zip(distinct, outcomes))
+
+        results, ok = [], {}
+        for city, lookup in zip(cities, lookups):
+            if not lookup:
+                results.append(weather_pb2.CityWeatherResult(
+                    city=city, status=grpc.StatusCode.INVALID_ARGUMENT.name, error="City name is required."))
+                continue
+            data = fetched[lookup.key]
+            if isinstance(data, Exception):
+                stale = await self._stale(lookup, data)
+                if stale is not None:
+                    results.append(weather_pb2.CityWeatherResult(
+                        city=city, status=grpc.StatusCode.OK.name, snapshot=_snapshot(stale), stale=True))
+                    continue
+                code, details = _error_status(data)
+                results.append(weather_pb2.CityWeatherResult(city=city, status=code.name, error=details))
+                continue
+            ok.setdefault(lookup.key, (data, []))[1].append(len(results))
+            results.append(weather_pb2.CityWeatherResult(city=city, status=grpc.StatusCode.OK.name))
+
+        try:
+            saved = await self.dao.save_snapshots([data for data, _ in ok.values()])
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, str(e))
+        for (_, indexes), doc in zip(ok.values(), saved):
+            for i in indexes:
+                results[i].snapshot.CopyFrom(_snapshot(doc))
+        return weather_pb2.GetCurrentWeatherBatchResponse(results=results)
+
+    async def _fetch(self, lookup: Lookup) -> dict:
+        if self.prefetch:
+            self.prefetch.hot.record(lookup, lookup.key)
+        raw = await self.cache.get_or_load_async(lookup.key, lambda: self._get_upstream(lookup))
+        data = _parse(self.owm, raw, lookup)
+        self.stored_names.remember(lookup, data["city"])
+        return data
+
+    async def _get_upstream(self, lookup: Lookup, priority: str = INTERACTIVE) -> dict:
+        if self.breaker.is_open():
+            raise CircuitOpenError("OWM circuit open")
+        if self.limiter:
+            await self.limiter.acquire_async(priority)
+        if not self.breaker.allow():
+            raise CircuitOpenError("OWM circuit open")
+        try:
+            raw = await self.owm.get_current(lookup.city, **lookup.owm_params())
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return raw
+
+    async def refresh(self, lookup: Lookup) -> None:
+        raw = await self._get_upstream(lookup, BACKGROUND)
+        self.cache.put(lookup.key, raw, self.prefetch.cache_ttl_s())
+        data = _parse(self.owm, raw, lookup)
+        self.stored_names.remember(lookup, data["city"])
+        await self.dao.save_snapshot(data)
+
+    async def _stale(self, lookup: Lookup, e: Exception):
+        if not (isinstance(e, CircuitOpenError) or is_upstream_failure(e)):
+            return None
+        city = self.stored_names.label(lookup)
+        try:
+            return await self.dao.latest_snapshot(city)
+        except Exception as dao_error:
+            print(f"[gRPC aio] WARNING: stale fallback for {city!r} failed: {dao_error}")
+            return None
+
+    async def GetWeatherHistory(self, request, context):
+        _, series, resolution = await self._history(request, context)
+        return weather_pb2.GetWeatherHistoryResponse(series=[_snapshot(doc) for doc in series], resolution=resolution)
+
+    async def GetWeatherHistoryColumns(self, request, context):
+        return _columns(*await self._history(request, context))
+
+    async def _history(self, request, context):
+        city = await self._validate_history(request, context)
+        if request.max_points < 0:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "max_points must be >= 0")
+        resolution = await self.dao.history_resolution(city, request.from_ms, request.to_ms, request.max_points)
+        if resolution == "raw":
+            series = await self.dao.fetch_series(city, request.from_ms, request.to_ms)
+        else:
+            series = await self.dao.fetch_rollups(city, request.from_ms, request.to_ms, resolution)
+        return city, series, resolution
+
+    async def StreamWeatherHistory(self, request, context):
+        city = await self._validate_history(request, context)
+        batch_size = request.batch_size if request.batch_size > 0 else HISTORY_BATCH_SIZE
+        batch_size = min(batch_size, HISTORY_MAX_BATCH_SIZE)
+        async for batch in self.dao.iter_series(city, request.from_ms, request.to_ms, batch_size):
+            yield weather_pb2.WeatherHistoryChunk(series=[_snapshot(doc) for doc in batch])
+
+    async def GetWeatherAggregates(self, request, context):
+        city = await self._validate_history(request, context)
+        bucket_ms = parse_bucket(request.bucket)
+        if bucket_ms is None:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid bucket, expected e.g. 5m, 1h, 1d")
+        buckets = await self.dao.aggregate_series(city, request.from_ms, request.to_ms, bucket_ms)
+        return weather_pb2.GetWeatherAggregatesResponse(
+            bucket_ms=bucket_ms,
+            buckets=[weather_pb2.WeatherAggregate(**b) for b in buckets],
+        )
+
+    async def _validate_history(self, request, context) -> str:
+        city = (request.city or "").strip()
+        if not city:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "City name is required.")
+        if request.from_ms <= 0 or request.to_ms <= 0 or request.from_ms >= request.to_ms:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid time range!")
+        return canonical_city(self.geo, city)
+
+    async def close(self) -> None:
+        await self.owm.close()
+        await self.dao.close()
+
+
+async def serve_aio(metrics_port: int = METRICS_PORT, reuse_port: bool = False, ready=None):
+    provider = tracing.setup("weather-server", TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_FILE)
+    interceptors = [metrics.AioMetricsInterceptor(), AioApiKeyInterceptor()]
+    if provider:
+        interceptors.insert(1, tracing.AioTracingInterceptor())
+    server = grpc.aio.server(interceptors=interceptors, options=_server_options(reuse_port))
+    service = AioWeatherService()
+    await service.dao.init()
+    metrics.watch_writer(service.dao.writer)
+    weather_pb2_grpc.add_WeatherServiceServicer_to_server(service, server)
+    metrics.start(service, metrics_port, METRICS_ADDR, reuse_port)
+    server.add_insecure_port(f"[::]:{GRPC_PORT}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"[gRPC aio] WeatherService listening on port {GRPC_PORT} (pid {os.getpid()})")
+    await server.start()
+    if ready is not None:
+        ready.set()
+    prefetcher = AsyncPrefetcher(service.prefetch, service.refresh) if service.prefetch else None
+    if prefetcher:
+        prefetcher.start()
+        print(f"[gRPC aio] prefetching top {PREFETCH_TOP_K} cities every {PREFETCH_INTERVAL_S:g}s")
+    await stop.wait()
+    print("[gRPC aio] shutting down")
+    if prefetcher:
+        await prefetcher.close()
+    await server.stop(GRPC_SHUTDOWN_GRACE_S)
+    await service.close()
+    if provider:
+        provider.shutdown()
@@ -10,5 +10,14 @@ class ApiKeyInterceptor(grpc.ServerInterceptor):
                 context.abort(grpc.StatusCode.UNAUTHENTICATED, 'Invalid x-api-key')
             return grpc.unary_unary_rpc_method_handler(deny)
         return continuation(handler_call_details)
-    
-    
\ No newline at end of file
+
+
+# same check for the grpc.aio server
+class AioApiKeyInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        metadata = dict(handler_call_details.invocation_metadata or [])
+        if metadata.get('x-api-key') != SERVICE_API_KEY:
+            async def deny(request, context):
+                await context.abort(grpc.StatusCode.UNAUTHENTICATED, 'Invalid x-api-key')
+            return grpc.unary_unary_rpc_method_handler(deny)
+        return await continuation(handler_call_details)
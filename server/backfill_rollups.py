@@ -0,0 +1,53 @@
+# rebuilds the hourly/daily rollup collections from raw snapshots with one $merge aggregation per resolution
+# buckets touched by the range are recomputed from scratch, so the tool is safe to re-run.
+# usage: python -m server.backfill_rollups [city] [from_ms] [to_ms]
+import sys
+import time
+
+from pymongo import MongoClient
+
+from .dao import MONGO_URI, DB_NAME, COLLECTION
+from .rollups import RESOLUTIONS, ROLLUP_INDEX, backfill_pipeline, bucket_start, rollup_collection
+
+DAY_MS = RESOLUTIONS["1d"]
+
+
+def raw_query(city: str = "", from_ms: int = 0, to_ms: int = 0) -> dict:
+    # widened to whole days so every affected hourly and daily bucket is rebuilt completely
+    query = {}
+    if city:
+        query["city_key"] = city.strip().lower()
+    if from_ms or to_ms:
+        query["timestamp_ms"] = {"$gte": bucket_start(from_ms, DAY_MS)}
+        if to_ms:
+            query["timestamp_ms"]["$lt"] = bucket_start(to_ms - 1, DAY_MS) + DAY_MS
+    return query
+
+
+def backfill(db, city: str = "", from_ms: int = 0, to_ms: int = 0) -> dict:
+    query = raw_query(city, from_ms, to_ms)
+    counts = {}
+    for resolution, bucket_ms in RESOLUTIONS.items():
+        target = rollup_collection(COLLECTION, resolution)
+        # $merge on (city_key, bucket_start_ms) needs the unique index in place
+        db[target].create_index(ROLLUP_INDEX, unique=True)
+        db[COLLECTION].aggregate(backfill_pipeline(query, bucket_ms, target), allowDiskUse=True)
+        counts[resolution] = db[target].count_documents({k: v for k, v in query.items() if k == "city_key"})
+    return counts
+
+
+def main():
+    city = sys.argv[1] if len(sys.argv) > 1 else ""
+    from_ms = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    to_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    client = MongoClient(MONGO_URI)
+    t0 = time.perf_counter()
+    try:
+        counts = backfill(client[DB_NAME], city, from_ms, to_ms)
+    finally:
+        client.close()
+    print(f"[backfill] done in {time.perf_counter() - t0:.1f}s, rollup buckets: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# builds the geocode index files (see geocode.py) from an OpenWeatherMap city list, e.g. the bulk
+# city.list.json from https://bulk.openweathermap.org/sample/, plus an optional aliases file with one
+# "alias<TAB>city id" per line. every city is reachable by its normalized name, the same without spaces and
+# "name country"; where two cities share a name the explicit alias wins, then the first city in the list.
+# usage: python -m server.build_geocode_index [city_list.json] [aliases.tsv] [out_dir]
+import json
+import os
+import sys
+import time
+
+from .geocode import ALIASES_FILE, CITIES_FILE, normalize
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_cities(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        cities = json.load(f)
+    return [c for c in cities if c.get("id") and normalize(c.get("name", ""))]
+
+
+def load_aliases(path: str) -> dict:
+    aliases = {}
+    if not path or not os.path.exists(path):
+        return aliases
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            alias, city_id = line.rsplit("\t", 1)
+            aliases[normalize(alias)] = int(city_id)
+    return aliases
+
+
+def build(cities: list, explicit: dict) -> tuple:
+    """(city rows sorted by id, {normalized alias: id})."""
+    rows = {}
+    for c in cities:
+        name = " ".join(c["name"].split())
+        coord = c.get("coord", {})
+        rows.setdefault(int(c["id"]), (name, c.get("country", ""), coord.get("lat", 0.0), coord.get("lon", 0.0)))
+
+    aliases = {}
+    for city_id, (name, country, _, _) in rows.items():
+        key = normalize(name)
+        for alias in (key, key.replace(" ", ""), f"{key} {normalize(country)}".strip()):
+            aliases.setdefault(alias, city_id)
+    unknown = sorted(alias for alias, city_id in explicit.items() if city_id not in rows)
+    if unknown:
+        raise ValueError(f"aliases point at ids missing from the city list: {unknown}")
+    aliases.update(explicit)
+    return sorted(rows.items()), aliases
+
+
+def write(out_dir: str, rows: list, aliases: dict) -> None:
+    # written to a temp name and renamed, servers mapping the old files keep reading them
+    os.makedirs(out_dir, exist_ok=True)
+    city_lines = [f"{city_id}\t{name}\t{country}\t{lat}\t{lon}\n" for city_id, (name, country, lat, lon) in rows]
+    # byte order, which is what the binary search compares
+    alias_lines = [f"{alias}\t{city_id}\n" for alias, city_id in sorted(aliases.items(), key=lambda a: a[0].encode())]
+    for filename, lines in ((CITIES_FILE, city_lines), (ALIASES_FILE, alias_lines)):
+        path = os.path.join(out_dir, filename)
+        with open(path + ".tmp", "w", encoding="utf-8", newline="\n") as f:
+            f.writelines(lines)
+        os.replace(path + ".tmp", path)
+
+
+def main():
+    cities_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DATA_DIR, "cities.json")
+    aliases_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(DATA_DIR, "aliases.tsv")
+    out_dir = sys.argv[3] if len(sys.argv) > 3 else DATA_DIR
+    t0 = time.perf_counter()
+    rows, aliases = build(load_cities(cities_path), load_aliases(aliases_path))
+    write(out_dir, rows, aliases)
+    print(f"[geocode] {len(rows)} cities, {len(aliases)} aliases written to {out_dir} "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
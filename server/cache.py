@@ -0,0 +1,140 @@
+# per-city TTL cache for upstream OWM payloads (LRU bounded, coalesces concurrent misses)
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+def city_key(city: str) -> str:
+    return (city or "").strip().lower()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, ttl_s: float, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._ainflight: Dict[str, "asyncio.Future"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key: str, value, ttl_s: float = None) -> None:
+        # ttl_s overrides the cache-wide ttl for this entry (the prefetcher keeps hot cities until its next refresh)
+        with self._lock:
+            self._store(key, value, ttl_s)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]):
+        """Return the cached value for key or load it; concurrent misses share one loader call."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            with self._lock:
+                self._store(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    async def get_or_load_async(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        """asyncio flavour of get_or_load, for the grpc.aio server (single event loop).
+
+        The load runs in its own task that every caller awaits through shield, so a cancelled caller
+        (leader included, e.g. a client that went away) never cancels the load the others wait for.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._ainflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                flight = self._ainflight[key] = asyncio.ensure_future(self._load_async(key, loader))
+                # mark retrieved so a failure nobody awaits anymore doesn't log "exception never retrieved"
+                flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return await asyncio.shield(flight)
+
+    async def _load_async(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        try:
+            value = await loader()
+            with self._lock:
+                self._store(key, value)
+            return value
+        finally:
+            self._ainflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0,
+            }
+
+    # -- helpers, caller holds the lock --
+
+    def _lookup(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key: str, value, ttl_s: float = None) -> None:
+        ttl_s = self.ttl_s if ttl_s is None else ttl_s
+        if ttl_s <= 0 or self.max_entries <= 0:
+            return
+        self._data[key] = (self._clock() + ttl_s, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,82 @@
+# circuit breaker for the upstream OWM calls: after `failure_threshold` consecutive failures the
+# circuit opens and calls fail fast; after `reset_timeout_s` a few probe calls decide whether it closes again
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout_s: float, half_open_max_calls: int = 1,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def is_open(self) -> bool:
+        """True while allow() would refuse; unlike allow() it never claims a half-open probe slot.
+        A refusal is counted in `rejected`."""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_max_calls):
+                self.rejected += 1
+                return True
+            return False
+
+    def allow(self) -> bool:
+        """True if a call may go upstream now; in half-open only `half_open_max_calls` probes get through."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._state = HALF_OPEN
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            # a failed probe re-opens right away
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opened += 1
+                    print(f"[owm] WARNING: circuit open after {self._failures} failure(s)")
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._probes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._current_state(), "failures": self._failures,
+                    "opened": self.opened, "rejected": self.rejected}
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout_s:
+            return HALF_OPEN
+        return self._state
@@ -6,3 +6,112 @@ load_dotenv()
 OWM_API_KEY = os.getenv("OWM_API_KEY", "")
 SERVICE_API_KEY = os.getenv("SERVICE_API_KEY", "")
 GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+
+# per-city cache for upstream OWM payloads (0 disables caching)
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+
+# grpc thread pool size, also used to size the OWM connection pool
+GRPC_MAX_WORKERS = int(os.getenv("GRPC_MAX_WORKERS", "10"))
+
+# upstream OWM http client
+OWM_BASE_URL = os.getenv("OWM_BASE_URL", "http://api.openweathermap.org/data/2.5/weather")
+OWM_CONNECT_TIMEOUT_S = float(os.getenv("OWM_CONNECT_TIMEOUT_S", "3.05"))
+OWM_READ_TIMEOUT_S = float(os.getenv("OWM_READ_TIMEOUT_S", "4"))
+OWM_MAX_RETRIES = int(os.getenv("OWM_MAX_RETRIES", "2"))
+OWM_RETRY_BACKOFF_S = float(os.getenv("OWM_RETRY_BACKOFF_S", "0.1"))
+# retries allowed per request (0.1 = at most ~10% extra load) + a small floor per second
+OWM_RETRY_BUDGET_RATIO = float(os.getenv("OWM_RETRY_BUDGET_RATIO", "0.1"))
+OWM_RETRY_BUDGET_MIN_PER_S = float(os.getenv("OWM_RETRY_BUDGET_MIN_PER_S", "1"))
+# aio mode is not bounded by a thread pool, so its connection pool is sized separately
+OWM_AIO_MAX_CONNECTIONS = int(os.getenv("OWM_AIO_MAX_CONNECTIONS", "100"))
+
+# snapshots per StreamWeatherHistory chunk (clients may ask for less, never more than the max)
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_MAX_BATCH_SIZE = int(os.getenv("HISTORY_MAX_BATCH_SIZE", "5000"))
+
+# GetCurrentWeatherBatch: max cities per call, parallel upstream fetches across all batches
+BATCH_MAX_CITIES = int(os.getenv("BATCH_MAX_CITIES", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# "thread" = grpc.server on a ThreadPoolExecutor, "aio" = grpc.aio server with async OWM/Mongo clients,
+# "prefork" = GRPC_WORKERS processes (0 = one per core) sharing GRPC_PORT via SO_REUSEPORT, each running a
+# PREFORK_WORKER_MODE server with its own mongo client and OWM session (see server/prefork.py)
+SERVER_MODE = os.getenv("SERVER_MODE", "thread")
+GRPC_WORKERS = int(os.getenv("GRPC_WORKERS", "0"))
+PREFORK_WORKER_MODE = os.getenv("PREFORK_WORKER_MODE", "thread")
+
+# write-behind persistence: snapshots are queued and flushed in bulk by a background thread
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_QUEUE_SIZE = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+WRITE_BEHIND_FLUSH_SIZE = int(os.getenv("WRITE_BEHIND_FLUSH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_INTERVAL_S = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL_S", "0.5"))
+# how long a request may wait for queue space before writing its snapshot inline
+WRITE_BEHIND_PUT_TIMEOUT_S = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT_S", "0.05"))
+
+# grpc transport: response compression (none | gzip | deflate), keepalive pings on idle connections every
+# GRPC_KEEPALIVE_TIME_S (0 disables) dropped after GRPC_KEEPALIVE_TIMEOUT_S without an ack, the shortest client
+# ping interval tolerated, max message size in MB both ways (-1 = unlimited, grpc's default is 4) and concurrent
+# streams per connection (0 = grpc default)
+GRPC_COMPRESSION = os.getenv("GRPC_COMPRESSION", "none")
+GRPC_KEEPALIVE_TIME_S = float(os.getenv("GRPC_KEEPALIVE_TIME_S", "0"))
+GRPC_KEEPALIVE_TIMEOUT_S = float(os.getenv("GRPC_KEEPALIVE_TIMEOUT_S", "20"))
+GRPC_KEEPALIVE_MIN_CLIENT_PING_S = float(os.getenv("GRPC_KEEPALIVE_MIN_CLIENT_PING_S", "10"))
+GRPC_MAX_MESSAGE_MB = float(os.getenv("GRPC_MAX_MESSAGE_MB", "4"))
+GRPC_MAX_CONCURRENT_STREAMS = int(os.getenv("GRPC_MAX_CONCURRENT_STREAMS", "0"))
+
+# seconds in-flight RPCs get to finish on SIGTERM/SIGINT
+GRPC_SHUTDOWN_GRACE_S = float(os.getenv("GRPC_SHUTDOWN_GRACE_S", "5"))
+
+# "always" stores every snapshot, "dedupe" skips repeats of the latest observation per city
+# (same OWM `dt`, or identical values within DEDUPE_WINDOW_S) and counts them as hits instead
+PERSIST_POLICY = os.getenv("PERSIST_POLICY", "always")
+DEDUPE_WINDOW_S = float(os.getenv("DEDUPE_WINDOW_S", "600"))
+
+# "plain" collection, or "timeseries" (created as a mongo time-series collection, see server/migrate_timeseries.py)
+STORAGE_MODE = os.getenv("STORAGE_MODE", "plain")
+# time-series retention, 0 keeps snapshots forever
+SNAPSHOT_TTL_S = int(os.getenv("SNAPSHOT_TTL_S", "0"))
+
+# hourly/daily rollup collections maintained on every write, used for long history ranges (max_points)
+ROLLUPS = os.getenv("ROLLUPS", "0") == "1"
+
+# prometheus /metrics endpoint of the gRPC server, 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9095"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
+
+# opentelemetry: none | console | file | otlp (OTEL_EXPORTER_OTLP_* env), sampled share of new traces
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+# OWM circuit breaker: consecutive upstream failures before opening, seconds until half-open probes
+OWM_BREAKER_FAILURES = int(os.getenv("OWM_BREAKER_FAILURES", "5"))
+OWM_BREAKER_RESET_S = float(os.getenv("OWM_BREAKER_RESET_S", "30"))
+OWM_BREAKER_HALF_OPEN_CALLS = int(os.getenv("OWM_BREAKER_HALF_OPEN_CALLS", "1"))
+
+# background refresh of the hottest cities (PREFETCH=1): top-K by decaying request count, refreshed every
+# PREFETCH_INTERVAL_S (OWM updates roughly every 10 minutes), spending at most PREFETCH_MAX_CALLS_PER_MIN OWM calls
+PREFETCH = os.getenv("PREFETCH", "0") == "1"
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "20"))
+PREFETCH_INTERVAL_S = float(os.getenv("PREFETCH_INTERVAL_S", "600"))
+PREFETCH_MAX_CALLS_PER_MIN = float(os.getenv("PREFETCH_MAX_CALLS_PER_MIN", "30"))
+PREFETCH_HALF_LIFE_S = float(os.getenv("PREFETCH_HALF_LIFE_S", "3600"))
+PREFETCH_MIN_SCORE = float(os.getenv("PREFETCH_MIN_SCORE", "2"))
+PREFETCH_MAX_TRACKED = int(os.getenv("PREFETCH_MAX_TRACKED", "10000"))
+
+# OWM call budget: token bucket refilled at OWM_RATE_LIMIT_PER_MIN (0 disables) holding up to OWM_RATE_LIMIT_BURST
+# calls, "local" per replica or "mongo" (one document in RATE_LIMIT_COLLECTION shared by every replica).
+# interactive calls queue up to OWM_RATE_LIMIT_MAX_WAIT_S before RESOURCE_EXHAUSTED, background refreshes
+# never queue and leave OWM_RATE_LIMIT_BACKGROUND_RESERVE tokens for interactive calls
+OWM_RATE_LIMIT_PER_MIN = float(os.getenv("OWM_RATE_LIMIT_PER_MIN", "0"))
+OWM_RATE_LIMIT_BURST = float(os.getenv("OWM_RATE_LIMIT_BURST", "10"))
+OWM_RATE_LIMIT_BACKEND = os.getenv("OWM_RATE_LIMIT_BACKEND", "local")
+OWM_RATE_LIMIT_MAX_WAIT_S = float(os.getenv("OWM_RATE_LIMIT_MAX_WAIT_S", "1"))
+OWM_RATE_LIMIT_BACKGROUND_RESERVE = float(os.getenv("OWM_RATE_LIMIT_BACKGROUND_RESERVE", "5"))
+RATE_LIMIT_COLLECTION = os.getenv("RATE_LIMIT_COLLECTION", "rate_limits")
+
+# local geocode index (GEOCODE=1): city names and aliases resolve to one OWM city id before any upstream call,
+# so every spelling shares a cache entry and a history; GEOCODE_DIR holds the files of build_geocode_index
+GEOCODE = os.getenv("GEOCODE", "0") == "1"
+GEOCODE_DIR = os.getenv("GEOCODE_DIR", os.path.join(os.path.dirname(__file__), "data"))
@@ -1,26 +1,487 @@
+import threading
 import time
-from typing import List
-from pymongo import MongoClient, ASCENDING
-from .config import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import AsyncMongoClient, MongoClient, ASCENDING, DESCENDING
+from .config import (
+    os, WRITE_BEHIND, WRITE_BEHIND_QUEUE_SIZE, WRITE_BEHIND_FLUSH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL_S, WRITE_BEHIND_PUT_TIMEOUT_S,
+    PERSIST_POLICY, DEDUPE_WINDOW_S, STORAGE_MODE, SNAPSHOT_TTL_S, ROLLUPS,
+)
+from .rollups import (
+    RESOLUTIONS, ROLLUP_INDEX, rollup_collection, rollup_updates, rollup_query, rollup_point, pick_resolution,
+)
+from .write_behind import AsyncWriteBehindWriter, WriteBehindWriter
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017")
 DB_NAME = os.getenv("DB_NAME", "weatherdb")
 COLLECTION = os.getenv("COLLECTION", "snapshots")
 
+# indexes the collection should have, by name; anything in STALE_INDEXES is dropped on startup
+INDEXES = {
+    "city_key_1_timestamp_ms_1": [("city_key", ASCENDING), ("timestamp_ms", ASCENDING)],
+}
+STALE_INDEXES = ["city_1_timestamp_ms_1"]
+
+# STORAGE_MODE=timeseries: snapshots live in a mongo time-series collection bucketed per city
+TIMESERIES_OPTIONS = {"timeField": "ts", "metaField": "city_key", "granularity": "minutes"}
+TIMESERIES_INDEXES = {
+    "city_key_1_ts_1": [("city_key", ASCENDING), ("ts", ASCENDING)],
+}
+
+# fields that must match for two snapshots without an OWM `dt` to count as the same observation
+OBSERVATION_FIELDS = ("temperature_c", "description", "humidity", "wind_speed")
+LATEST_MAX_CITIES = 10_000
+
+
+class LatestObservations:
+    """Last stored snapshot per city_key, used by the "dedupe" persistence policy."""
+
+    def __init__(self, window_ms: int, max_entries: int = LATEST_MAX_CITIES):
+        self.window_ms = window_ms
+        self.max_entries = max_entries
+        self._docs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._docs
+
+    def seed(self, key: str, doc: dict) -> None:
+        with self._lock:
+            self._docs.setdefault(key, doc)
+
+    def merge_or_put(self, key: str, snap: dict, now_ms: int, new_doc: dict) -> Optional[dict]:
+        # returns the stored doc (hit counted) when snap repeats it, else remembers new_doc and returns None
+        with self._lock:
+            latest = self._docs.get(key)
+            if latest is not None and self._same(latest, snap, now_ms):
+                latest["hits"] = latest.get("hits", 1) + 1
+                latest["last_requested_ms"] = now_ms
+                self._docs.move_to_end(key)
+                return latest
+            self._docs[key] = new_doc
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+            return None
+
+    def _same(self, latest: dict, snap: dict, now_ms: int) -> bool:
+        # OWM's `dt` identifies an observation; without it, identical values inside the window
+        if snap.get("observed_ms") and latest.get("observed_ms"):
+            return snap["observed_ms"] == latest["observed_ms"]
+        if now_ms - latest["timestamp_ms"] > self.window_ms:
+            return False
+        return all(snap.get(f) == latest.get(f) for f in OBSERVATION_FIELDS)
+
+
 class WeatherDAO:
     def __init__(self):
         self.client = MongoClient(MONGO_URI)
-        self.col = self.client[DB_NAME][COLLECTION]
-        self.col.create_index([("city", ASCENDING), ("timestamp_ms", ASCENDING)])
+        self.db = self.client[DB_NAME]
+        self.col = self.db[COLLECTION]
+        # resolution -> rollup collection, empty unless ROLLUPS=1
+        self.rollups = {r: self.db[rollup_collection(COLLECTION, r)] for r in RESOLUTIONS} if ROLLUPS else {}
+        self.timeseries = self.ensure_collection()
+        self.ensure_indexes()
+        self.check_query_plan()
+        self.latest = LatestObservations(int(DEDUPE_WINDOW_S * 1000))
+        self.writer = None
+        if WRITE_BEHIND:
+            self.writer = WriteBehindWriter(
+                self.col, WRITE_BEHIND_QUEUE_SIZE, WRITE_BEHIND_FLUSH_SIZE,
+                WRITE_BEHIND_FLUSH_INTERVAL_S, WRITE_BEHIND_PUT_TIMEOUT_S,
+            )
+
+    def ensure_collection(self) -> bool:
+        # True when snapshots are (now) stored in a time-series collection
+        if STORAGE_MODE != "timeseries":
+            return False
+        info = next(iter(self.db.list_collections(filter={"name": COLLECTION})), None)
+        if info is None:
+            self.db.create_collection(COLLECTION, **_timeseries_options())
+            print(f"[dao] created time-series collection {COLLECTION}")
+            return True
+        if info.get("type") != "timeseries":
+            print(f"[dao] WARNING: {COLLECTION} is a plain collection, run `python -m server.migrate_timeseries`")
+            return False
+        ttl = _ttl_change(info)
+        if ttl is not None:
+            self.db.command("collMod", COLLECTION, expireAfterSeconds=ttl)
+        return True
+
+    def ensure_indexes(self) -> None:
+        existing = set(self.col.index_information())
+        for name in STALE_INDEXES:
+            if name in existing:
+                self.col.drop_index(name)
+                print(f"[dao] dropped stale index {name}")
+        for name, keys in (TIMESERIES_INDEXES if self.timeseries else INDEXES).items():
+            if name not in existing:
+                self.col.create_index(keys, name=name)
+        for rollup in self.rollups.values():
+            rollup.create_index(ROLLUP_INDEX, unique=True)
+
+    def check_query_plan(self) -> bool:
+        # fetch_series must be served by an index scan, not a collection scan
+        try:
+            plan = self._series_cursor("", 0, 1).explain()
+        except Exception as e:
+            print(f"[dao] WARNING: could not explain fetch_series query: {e}")
+            return False
+        return _uses_index(plan)
 
     def save_snapshot(self, snap: dict) -> dict:
-        doc = {**snap, 
-               "city_key": (snap.get("city") or "").strip().lower(),
-               "timestamp_ms": int(time.time() * 1000)}
-        self.col.insert_one(doc)
+        # timestamp_ms is fixed here, so the returned doc matches what gets persisted later on
+        doc, is_new = self._prepare(snap, int(time.time() * 1000))
+        if is_new:
+            self._insert([doc])
         return doc
-    
+
+    def save_snapshots(self, snaps: List[dict]) -> List[dict]:
+        # one round trip for a whole batch
+        now_ms = int(time.time() * 1000)
+        prepared = [self._prepare(snap, now_ms) for snap in snaps]
+        self._insert([doc for doc, is_new in prepared if is_new])
+        return [doc for doc, _ in prepared]
+
+    def _prepare(self, snap: dict, now_ms: int) -> Tuple[dict, bool]:
+        doc = self._doc(snap, now_ms)
+        if PERSIST_POLICY != "dedupe":
+            return doc, True
+        key = doc["city_key"]
+        if key not in self.latest:
+            stored = self.col.find_one({"city_key": key}, sort=[("timestamp_ms", DESCENDING)])
+            if stored:
+                self.latest.seed(key, stored)
+        doc.update({"_id": ObjectId(), "hits": 1})
+        latest = self.latest.merge_or_put(key, snap, now_ms, doc)
+        if latest is None:
+            return doc, True
+        # a doc still queued by write-behind matches nothing here; its in-memory hits were bumped instead
+        self.col.update_one({"_id": latest["_id"]}, {"$inc": {"hits": 1}, "$set": {"last_requested_ms": now_ms}})
+        return latest, False
+
+    def _insert(self, docs: List[dict]) -> None:
+        if not docs:
+            return
+        if self.writer:
+            for doc in docs:
+                self.writer.submit(doc)
+        elif len(docs) == 1:
+            self.col.insert_one(docs[0])
+        else:
+            self.col.insert_many(docs, ordered=False)
+        for resolution, updates in rollup_updates(docs).items() if self.rollups else ():
+            self.rollups[resolution].bulk_write(updates, ordered=False)
+
+    def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+        self.client.close()
+
+    @staticmethod
+    def _doc(snap: dict, timestamp_ms: int) -> dict:
+        return {**snap,
+               "city_key": (snap.get("city") or "").strip().lower(),
+               "timestamp_ms": timestamp_ms,
+               # BSON date twin of timestamp_ms, the timeField of the time-series layout
+               "ts": _to_datetime(timestamp_ms)}
+
     def fetch_series(self, city: str, from_ms: int, to_ms: int) -> List[dict]:
-        q = { "city_key": (city or "").strip().lower(),
+        return list(self._series_cursor(city, from_ms, to_ms))
+
+    def latest_snapshot(self, city: str) -> Optional[dict]:
+        # most recent stored snapshot for the city, the stale fallback while OWM is down
+        return self.col.find_one({"city_key": (city or "").strip().lower()},
+                                 sort=[("ts" if self.timeseries else "timestamp_ms", DESCENDING)])
+
+    def history_resolution(self, city: str, from_ms: int, to_ms: int, max_points: int) -> str:
+        # "raw" unless rollups exist and the raw range holds more than max_points snapshots
+        if not self.rollups or max_points <= 0:
+            return "raw"
+        query = self._series_query(city, from_ms, to_ms, self.timeseries)
+        raw_points = self.col.count_documents(query, limit=max_points + 1)
+        return pick_resolution(raw_points, from_ms, to_ms, max_points)
+
+    def fetch_rollups(self, city: str, from_ms: int, to_ms: int, resolution: str) -> List[dict]:
+        cursor = self.rollups[resolution].find(rollup_query(city, from_ms, to_ms, resolution))
+        return [rollup_point(doc) for doc in cursor.sort("bucket_start_ms", ASCENDING)]
+
+    def iter_series(self, city: str, from_ms: int, to_ms: int, batch_size: int) -> Iterator[List[dict]]:
+        # yields lists of at most batch_size docs, one cursor batch at a time
+        batch = []
+        for doc in self._series_cursor(city, from_ms, to_ms).batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def aggregate_series(self, city: str, from_ms: int, to_ms: int, bucket_ms: int) -> List[dict]:
+        query = self._series_query(city, from_ms, to_ms, self.timeseries)
+        return list(self.col.aggregate(_aggregate_pipeline(query, bucket_ms)))
+
+    @staticmethod
+    def _series_query(city: str, from_ms: int, to_ms: int, timeseries: bool = False) -> dict:
+        if timeseries:
+            # range on the timeField lets mongo skip whole buckets
+            return {"city_key": (city or "").strip().lower(),
+                    "ts": {"$gte": _to_datetime(from_ms), "$lt": _to_datetime(to_ms)}}
+        return { "city_key": (city or "").strip().lower(),
             "timestamp_ms": {"$gte": from_ms, "$lt": to_ms},}
-        return list(self.col.find(q).sort("timestamp_ms", ASCENDING))
\ No newline at end of file
+
+    def _series_cursor(self, city: str, from_ms: int, to_ms: int):
+        q = self._series_query(city, from_ms, to_ms, self.timeseries)
+        return self.col.find(q).sort("ts" if self.timeseries else "timestamp_ms", ASCENDING)
+
+
+class AsyncWeatherDAO:
+    """asyncio twin of WeatherDAO on pymongo's AsyncMongoClient, used by the grpc.aio server."""
+
+    def __init__(self):
+        self.client = AsyncMongoClient(MONGO_URI)
+        self.db = self.client[DB_NAME]
+        self.col = self.db[COLLECTION]
+        self.rollups = {r: self.db[rollup_collection(COLLECTION, r)] for r in RESOLUTIONS} if ROLLUPS else {}
+        self.timeseries = False
+        self.latest = LatestObservations(int(DEDUPE_WINDOW_S * 1000))
+        self.writer = None
+
+    async def init(self) -> None:
+        self.timeseries = await self.ensure_collection()
+        await self.ensure_indexes()
+        await self.check_query_plan()
+        if WRITE_BEHIND:
+            # its flush task runs on the server's event loop, so it starts here rather than in __init__
+            self.writer = AsyncWriteBehindWriter(
+                self.col, WRITE_BEHIND_QUEUE_SIZE, WRITE_BEHIND_FLUSH_SIZE,
+                WRITE_BEHIND_FLUSH_INTERVAL_S, WRITE_BEHIND_PUT_TIMEOUT_S,
+            )
+            self.writer.start()
+
+    async def ensure_collection(self) -> bool:
+        if STORAGE_MODE != "timeseries":
+            return False
+        cursor = await self.db.list_collections(filter={"name": COLLECTION})
+        infos = await cursor.to_list()
+        if not infos:
+            await self.db.create_collection(COLLECTION, **_timeseries_options())
+            print(f"[dao] created time-series collection {COLLECTION}")
+            return True
+        if infos[0].get("type") != "timeseries":
+            print(f"[dao] WARNING: {COLLECTION} is a plain collection, run `python -m server.migrate_timeseries`")
+            return False
+        ttl = _ttl_change(infos[0])
+        if ttl is not None:
+            await self.db.command("collMod", COLLECTION, expireAfterSeconds=ttl)
+        return True
+
+    async def ensure_indexes(self) -> None:
+        existing = set(await self.col.index_information())
+        for name in STALE_INDEXES:
+            if name in existing:
+                await self.col.drop_index(name)
+                print(f"[dao] dropped stale index {name}")
+        for name, keys in (TIMESERIES_INDEXES if self.timeseries else INDEXES).items():
+            if name not in existing:
+                await self.col.create_index(keys, name=name)
+        for rollup in self.rollups.values():
+            await rollup.create_index(ROLLUP_INDEX, unique=True)
+
+    async def check_query_plan(self) -> bool:
+        try:
+            plan = await self._series_cursor("", 0, 1).explain()
+        except Exception as e:
+            print(f"[dao] WARNING: could not explain fetch_series query: {e}")
+            return False
+        return _uses_index(plan)
+
+    async def save_snapshot(self, snap: dict) -> dict:
+        doc, is_new = await self._prepare(snap, int(time.time() * 1000))
+        if is_new:
+            await self._insert([doc])
+        return doc
+
+    async def save_snapshots(self, snaps: List[dict]) -> List[dict]:
+        now_ms = int(time.time() * 1000)
+        prepared = [await self._prepare(snap, now_ms) for snap in snaps]
+        await self._insert([doc for doc, is_new in prepared if is_new])
+        return [doc for doc, _ in prepared]
+
+    async def _insert(self, docs: List[dict]) -> None:
+        if not docs:
+            return
+        if self.writer:
+            for doc in docs:
+                await self.writer.submit(doc)
+        elif len(docs) == 1:
+            await self.col.insert_one(docs[0])
+        else:
+            await self.col.insert_many(docs, ordered=False)
+        for resolution, updates in rollup_updates(docs).items() if self.rollups else ():
+            await self.rollups[resolution].bulk_write(updates, ordered=False)
+
+    async def _prepare(self, snap: dict, now_ms: int) -> Tuple[dict, bool]:
+        doc = WeatherDAO._doc(snap, now_ms)
+        if PERSIST_POLICY != "dedupe":
+            return doc, True
+        key = doc["city_key"]
+        if key not in self.latest:
+            stored = await self.col.find_one({"city_key": key}, sort=[("timestamp_ms", DESCENDING)])
+            if stored:
+                self.latest.seed(key, stored)
+        doc.update({"_id": ObjectId(), "hits": 1})
+        latest = self.latest.merge_or_put(key, snap, now_ms, doc)
+        if latest is None:
+            return doc, True
+        await self.col.update_one({"_id": latest["_id"]}, {"$inc": {"hits": 1}, "$set": {"last_requested_ms": now_ms}})
+        return latest, False
+
+    async def fetch_series(self, city: str, from_ms: int, to_ms: int) -> List[dict]:
+        return await self._series_cursor(city, from_ms, to_ms).to_list()
+
+    async def latest_snapshot(self, city: str) -> Optional[dict]:
+        return await self.col.find_one({"city_key": (city or "").strip().lower()},
+                                       sort=[("ts" if self.timeseries else "timestamp_ms", DESCENDING)])
+
+    async def history_resolution(self, city: str, from_ms: int, to_ms: int, max_points: int) -> str:
+        if not self.rollups or max_points <= 0:
+            return "raw"
+        query = WeatherDAO._series_query(city, from_ms, to_ms, self.timeseries)
+        raw_points = await self.col.count_documents(query, limit=max_points + 1)
+        return pick_resolution(raw_points, from_ms, to_ms, max_points)
+
+    async def fetch_rollups(self, city: str, from_ms: int, to_ms: int, resolution: str) -> List[dict]:
+        cursor = self.rollups[resolution].find(rollup_query(city, from_ms, to_ms, resolution))
+        return [rollup_point(doc) for doc in await cursor.sort("bucket_start_ms", ASCENDING).to_list()]
+
+    async def iter_series(self, city: str, from_ms: int, to_ms: int, batch_size: int) -> AsyncIterator[List[dict]]:
+        batch = []
+        async for doc in self._series_cursor(city, from_ms, to_ms).batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def aggregate_series(self, city: str, from_ms: int, to_ms: int, bucket_ms: int) -> List[dict]:
+        pipeline = _aggregate_pipeline(WeatherDAO._series_query(city, from_ms, to_ms, self.timeseries), bucket_ms)
+        cursor = await self.col.aggregate(pipeline)
+        return await cursor.to_list()
+
+    def _series_cursor(self, city: str, from_ms: int, to_ms: int):
+        q = WeatherDAO._series_query(city, from_ms, to_ms, self.timeseries)
+        return self.col.find(q).sort("ts" if self.timeseries else "timestamp_ms", ASCENDING)
+
+    async def close(self) -> None:
+        if self.writer:
+            await self.writer.close()
+        await self.client.close()
+
+
+def _to_datetime(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def _timeseries_options() -> dict:
+    opts = {"timeseries": TIMESERIES_OPTIONS}
+    if SNAPSHOT_TTL_S > 0:
+        opts["expireAfterSeconds"] = SNAPSHOT_TTL_S
+    return opts
+
+
+def _ttl_change(info: dict):
+    # new expireAfterSeconds for an existing time-series collection, None if already right
+    current = info.get("options", {}).get("expireAfterSeconds")
+    wanted = SNAPSHOT_TTL_S if SNAPSHOT_TTL_S > 0 else None
+    if current == wanted:
+        return None
+    return wanted if wanted is not None else "off"
+
+
+def _aggregate_pipeline(query: dict, bucket_ms: int) -> List[dict]:
+    # downsampling runs inside mongo: group per (bucket, description) first so the
+    # dominant description falls out of a sort, then fold those into one doc per bucket
+    bucket_start = {"$subtract": ["$timestamp_ms", {"$mod": ["$timestamp_ms", bucket_ms]}]}
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": {"bucket": bucket_start, "description": "$description"},
+            "count": {"$sum": 1},
+            **_partial_stats("temperature_c"),
+            **_partial_stats("humidity"),
+            **_partial_stats("wind_speed"),
+        }},
+        {"$sort": {"count": -1, "_id.description": 1}},
+        {"$group": {
+            "_id": "$_id.bucket",
+            "description": {"$first": "$_id.description"},
+            "count": {"$sum": "$count"},
+            **_merged_stats("temperature_c"),
+            **_merged_stats("humidity"),
+            **_merged_stats("wind_speed"),
+        }},
+        {"$sort": {"_id": ASCENDING}},
+        {"$project": {
+            "_id": 0,
+            "bucket_start_ms": "$_id",
+            "count": 1,
+            "description": 1,
+            "temperature_c": _final_stats("temperature_c"),
+            "humidity": _final_stats("humidity"),
+            "wind_speed": _final_stats("wind_speed"),
+        }},
+    ]
+
+
+def _partial_stats(field: str) -> dict:
+    return {
+        f"{field}_min": {"$min": f"${field}"},
+        f"{field}_max": {"$max": f"${field}"},
+        f"{field}_sum": {"$sum": f"${field}"},
+    }
+
+
+def _merged_stats(field: str) -> dict:
+    return {
+        f"{field}_min": {"$min": f"${field}_min"},
+        f"{field}_max": {"$max": f"${field}_max"},
+        f"{field}_sum": {"$sum": f"${field}_sum"},
+    }
+
+
+def _final_stats(field: str) -> dict:
+    return {
+        "min": f"${field}_min",
+        "max": f"${field}_max",
+        "avg": {"$divide": [f"${field}_sum", "$count"]},
+    }
+
+
+def _uses_index(plan: dict) -> bool:
+    # time-series finds explain as an aggregation whose first stage is the bucket $cursor
+    if "stages" in plan:
+        plan = plan["stages"][0].get("$cursor", {})
+    stages = _plan_stages(plan.get("queryPlanner", {}).get("winningPlan", {}))
+    if not any(stage.endswith("IXSCAN") for stage in stages):
+        print(f"[dao] WARNING: fetch_series is not using an index (plan stages: {sorted(stages)})")
+        return False
+    return True
+
+
+def _plan_stages(plan: dict) -> set:
+    stages = set()
+    if plan.get("stage"):
+        stages.add(plan["stage"])
+    # classic plans nest via inputStage(s), slot-based ones via queryPlan
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages |= _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages |= _plan_stages(child)
+    return stages
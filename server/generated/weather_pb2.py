@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rweather.proto\x12\nweather.v1\"(\n\x18GetCurrentWeatherRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\"\x87\x01\n\x0fWeatherSnapshot\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x15\n\rtemperature_c\x18\x02 \x01(\x01\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x10\n\x08humidity\x18\x04 \x01(\x05\x12\x12\n\nwind_speed\x18\x05 \x01(\x01\x12\x14\n\x0ctimestamp_ms\x18\x06 \x01(\x03\"J\n\x19GetCurrentWeatherResponse\x12-\n\x08snapshot\x18\x01 \x01(\x0b\x32\x1b.weather.v1.WeatherSnapshot\"H\n\x18GetWeatherHistoryRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07\x66rom_ms\x18\x02 \x01(\x03\x12\r\n\x05to_ms\x18\x03 \x01(\x03\"H\n\x19GetWeatherHistoryResponse\x12+\n\x06series\x18\x01 \x03(\x0b\x32\x1b.weather.v1.WeatherSnapshot2\xd8\x01\n\x0eWeatherService\x12\x62\n\x11GetCurrentWeather\x12$.weather.v1.GetCurrentWeatherRequest\x1a%.weather.v1.GetCurrentWeatherResponse\"\x00\x12\x62\n\x11GetWeatherHistory\x12$.weather.v1.GetWeatherHistoryRequest\x1a%.weather.v1.GetWeatherHistoryResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rweather.proto\x12\nweather.v1\"a\n\x18GetCurrentWeatherRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07\x63ity_id\x18\x02 \x01(\x03\x12&\n\x05\x63oord\x18\x03 \x01(\x0b\x32\x17.weather.v1.Coordinates\"\'\n\x0b\x43oordinates\x12\x0b\n\x03lat\x18\x01 \x01(\x01\x12\x0b\n\x03lon\x18\x02 \x01(\x01\"\x87\x01\n\x0fWeatherSnapshot\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x15\n\rtemperature_c\x18\x02 \x01(\x01\x12\x13\n\x0b\x64\x65scription\x18\x03 \x01(\t\x12\x10\n\x08humidity\x18\x04 \x01(\x05\x12\x12\n\nwind_speed\x18\x05 \x01(\x01\x12\x14\n\x0ctimestamp_ms\x18\x06 \x01(\x03\"Y\n\x19GetCurrentWeatherResponse\x12-\n\x08snapshot\x18\x01 \x01(\x0b\x32\x1b.weather.v1.WeatherSnapshot\x12\r\n\x05stale\x18\x02 \x01(\x08\"/\n\x1dGetCurrentWeatherBatchRequest\x12\x0e\n\x06\x63ities\x18\x01 \x03(\t\"~\n\x11\x43ityWeatherResult\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12-\n\x08snapshot\x18\x04 \x01(\x0b\x32\x1b.weather.v1.WeatherSnapshot\x12\r\n\x05stale\x18\x05 \x01(\x08\"P\n\x1eGetCurrentWeatherBatchResponse\x12.\n\x07results\x18\x01 \x03(\x0b\x32\x1d.weather.v1.CityWeatherResult\"\\\n\x18GetWeatherHistoryRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07\x66rom_ms\x18\x02 \x01(\x03\x12\r\n\x05to_ms\x18\x03 \x01(\x03\x12\x12\n\nmax_points\x18\x04 \x01(\x05\"\\\n\x19GetWeatherHistoryResponse\x12+\n\x06series\x18\x01 \x03(\x0b\x32\x1b.weather.v1.WeatherSnapshot\x12\x12\n\nresolution\x18\x02 \x01(\t\"\xc2\x01\n\x15WeatherHistoryColumns\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x12\n\nresolution\x18\x02 \x01(\t\x12\x1a\n\x12timestamp_delta_ms\x18\x03 \x03(\x12\x12\x15\n\rtemperature_c\x18\x04 \x03(\x01\x12\x10\n\x08humidity\x18\x05 \x03(\x05\x12\x12\n\nwind_speed\x18\x06 \x03(\x01\x12\x14\n\x0c\x64\x65scriptions\x18\x07 \x03(\t\x12\x18\n\x10\x64\x65scription_code\x18\x08 \x03(\r\"_\n\x1bStreamWeatherHistoryRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07\x66rom_ms\x18\x02 \x01(\x03\x12\r\n\x05to_ms\x18\x03 \x01(\x03\x12\x12\n\nbatch_size\x18\x04 \x01(\x05\"B\n\x13WeatherHistoryChunk\x12+\n\x06series\x18\x01 \x03(\x0b\x32\x1b.weather.v1.WeatherSnapshot\"[\n\x1bGetWeatherAggregatesRequest\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07\x66rom_ms\x18\x02 \x01(\x03\x12\r\n\x05to_ms\x18\x03 \x01(\x03\x12\x0e\n\x06\x62ucket\x18\x04 \x01(\t\"7\n\x0e\x41ggregateStats\x12\x0b\n\x03min\x18\x01 \x01(\x01\x12\x0b\n\x03max\x18\x02 \x01(\x01\x12\x0b\n\x03\x61vg\x18\x03 \x01(\x01\"\xe0\x01\n\x10WeatherAggregate\x12\x17\n\x0f\x62ucket_start_ms\x18\x01 \x01(\x03\x12\r\n\x05\x63ount\x18\x02 \x01(\x03\x12\x31\n\rtemperature_c\x18\x03 \x01(\x0b\x32\x1a.weather.v1.AggregateStats\x12,\n\x08humidity\x18\x04 \x01(\x0b\x32\x1a.weather.v1.AggregateStats\x12.\n\nwind_speed\x18\x05 \x01(\x0b\x32\x1a.weather.v1.AggregateStats\x12\x13\n\x0b\x64\x65scription\x18\x06 \x01(\t\"`\n\x1cGetWeatherAggregatesResponse\x12\x11\n\tbucket_ms\x18\x01 \x01(\x03\x12-\n\x07\x62uckets\x18\x02 \x03(\x0b\x32\x1c.weather.v1.WeatherAggregate2\x85\x05\n\x0eWeatherService\x12\x62\n\x11GetCurrentWeather\x12$.weather.v1.GetCurrentWeatherRequest\x1a%.weather.v1.GetCurrentWeatherResponse\"\x00\x12q\n\x16GetCurrentWeatherBatch\x12).weather.v1.GetCurrentWeatherBatchRequest\x1a*.weather.v1.GetCurrentWeatherBatchResponse\"\x00\x12\x62\n\x11GetWeatherHistory\x12$.weather.v1.GetWeatherHistoryRequest\x1a%.weather.v1.GetWeatherHistoryResponse\"\x00\x12\x65\n\x18GetWeatherHistoryColumns\x12$.weather.v1.GetWeatherHistoryRequest\x1a!.weather.v1.WeatherHistoryColumns\"\x00\x12\x64\n\x14StreamWeatherHistory\x12\'.weather.v1.StreamWeatherHistoryRequest\x1a\x1f.weather.v1.WeatherHistoryChunk\"\x00\x30\x01\x12k\n\x14GetWeatherAggregates\x12\'.weather.v1.GetWeatherAggregatesRequest\x1a(.weather.v1.GetWeatherAggregatesResponse\"\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,15 +32,37 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'weather_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_GETCURRENTWEATHERREQUEST']._serialized_start=29
-  _globals['_GETCURRENTWEATHERREQUEST']._serialized_end=69
-  _globals['_WEATHERSNAPSHOT']._serialized_start=72
-  _globals['_WEATHERSNAPSHOT']._serialized_end=207
-  _globals['_GETCURRENTWEATHERRESPONSE']._serialized_start=209
-  _globals['_GETCURRENTWEATHERRESPONSE']._serialized_end=283
-  _globals['_GETWEATHERHISTORYREQUEST']._serialized_start=285
-  _globals['_GETWEATHERHISTORYREQUEST']._serialized_end=357
-  _globals['_GETWEATHERHISTORYRESPONSE']._serialized_start=359
-  _globals['_GETWEATHERHISTORYRESPONSE']._serialized_end=431
-  _globals['_WEATHERSERVICE']._serialized_start=434
-  _globals['_WEATHERSERVICE']._serialized_end=650
+  _globals['_GETCURRENTWEATHERREQUEST']._serialized_end=126
+  _globals['_COORDINATES']._serialized_start=128
+  _globals['_COORDINATES']._serialized_end=167
+  _globals['_WEATHERSNAPSHOT']._serialized_start=170
+  _globals['_WEATHERSNAPSHOT']._serialized_end=305
+  _globals['_GETCURRENTWEATHERRESPONSE']._serialized_start=307
+  _globals['_GETCURRENTWEATHERRESPONSE']._serialized_end=396
+  _globals['_GETCURRENTWEATHERBATCHREQUEST']._serialized_start=398
+  _globals['_GETCURRENTWEATHERBATCHREQUEST']._serialized_end=445
+  _globals['_CITYWEATHERRESULT']._serialized_start=447
+  _globals['_CITYWEATHERRESULT']._serialized_end=573
+  _globals['_GETCURRENTWEATHERBATCHRESPONSE']._serialized_start=575
+  _globals['_GETCURRENTWEATHERBATCHRESPONSE']._serialized_end=655
+  _globals['_GETWEATHERHISTORYREQUEST']._serialized_start=657
+  _globals['_GETWEATHERHISTORYREQUEST']._serialized_end=749
+  _globals['_GETWEATHERHISTORYRESPONSE']._serialized_start=751
+  _globals['_GETWEATHERHISTORYRESPONSE']._serialized_end=843
+  _globals['_WEATHERHISTORYCOLUMNS']._serialized_start=846
+  _globals['_WEATHERHISTORYCOLUMNS']._serialized_end=1040
+  _globals['_STREAMWEATHERHISTORYREQUEST']._serialized_start=1042
+  _globals['_STREAMWEATHERHISTORYREQUEST']._serialized_end=1137
+  _globals['_WEATHERHISTORYCHUNK']._serialized_start=1139
+  _globals['_WEATHERHISTORYCHUNK']._serialized_end=1205
+  _globals['_GETWEATHERAGGREGATESREQUEST']._serialized_start=1207
+  _globals['_GETWEATHERAGGREGATESREQUEST']._serialized_end=1298
+  _globals['_AGGREGATESTATS']._serialized_start=1300
+  _globals['_AGGREGATESTATS']._serialized_end=1355
+  _globals['_WEATHERAGGREGATE']._serialized_start=1358
+  _globals['_WEATHERAGGREGATE']._serialized_end=1582
+  _globals['_GETWEATHERAGGREGATESRESPONSE']._serialized_start=1584
+  _globals['_GETWEATHERAGGREGATESRESPONSE']._serialized_end=1680
+  _globals['_WEATHERSERVICE']._serialized_start=1683
+  _globals['_WEATHERSERVICE']._serialized_end=2328
 # @@protoc_insertion_point(module_scope)
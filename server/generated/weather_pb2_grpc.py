@@ -39,18 +39,45 @@ class WeatherServiceStub(object):
                 request_serializer=weather__pb2.GetCurrentWeatherRequest.SerializeToString,
                 response_deserializer=weather__pb2.GetCurrentWeatherResponse.FromString,
                 _registered_method=True)
+        self.GetCurrentWeatherBatch = channel.unary_unary(
+                '/weather.v1.WeatherService/GetCurrentWeatherBatch',
+                request_serializer=weather__pb2.GetCurrentWeatherBatchRequest.SerializeToString,
+                response_deserializer=weather__pb2.GetCurrentWeatherBatchResponse.FromString,
+                _registered_method=True)
         self.GetWeatherHistory = channel.unary_unary(
                 '/weather.v1.WeatherService/GetWeatherHistory',
                 request_serializer=weather__pb2.GetWeatherHistoryRequest.SerializeToString,
                 response_deserializer=weather__pb2.GetWeatherHistoryResponse.FromString,
                 _registered_method=True)
+        self.GetWeatherHistoryColumns = channel.unary_unary(
+                '/weather.v1.WeatherService/GetWeatherHistoryColumns',
+                request_serializer=weather__pb2.GetWeatherHistoryRequest.SerializeToString,
+                response_deserializer=weather__pb2.WeatherHistoryColumns.FromString,
+                _registered_method=True)
+        self.StreamWeatherHistory = channel.unary_stream(
+                '/weather.v1.WeatherService/StreamWeatherHistory',
+                request_serializer=weather__pb2.StreamWeatherHistoryRequest.SerializeToString,
+                response_deserializer=weather__pb2.WeatherHistoryChunk.FromString,
+                _registered_method=True)
+        self.GetWeatherAggregates = channel.unary_unary(
+                '/weather.v1.WeatherService/GetWeatherAggregates',
+                request_serializer=weather__pb2.GetWeatherAggregatesRequest.SerializeToString,
+                response_deserializer=weather__pb2.GetWeatherAggregatesResponse.FromString,
+                _registered_method=True)
 
 
 class WeatherServiceServicer(object):
     """Missing associated documentation comment in .proto file."""
 
     def GetCurrentWeather(self, request, context):
-        """return current weather for a city
+        """return current weather for a city, by name, OWM city id or coordinates
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetCurrentWeatherBatch(self, request, context):
+        """current weather for several cities, per-city errors don't fail the batch
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -62,6 +89,27 @@ class WeatherServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetWeatherHistoryColumns(self, request, context):
+        """same series as GetWeatherHistory, as parallel arrays instead of one message per point
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamWeatherHistory(self, request, context):
+        """same range as GetWeatherHistory, streamed in batches read from the db cursor
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetWeatherAggregates(self, request, context):
+        """history downsampled into fixed-width buckets (min/max/avg per bucket)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_WeatherServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -70,11 +118,31 @@ def add_WeatherServiceServicer_to_server(servicer, server):
                     request_deserializer=weather__pb2.GetCurrentWeatherRequest.FromString,
                     response_serializer=weather__pb2.GetCurrentWeatherResponse.SerializeToString,
             ),
+            'GetCurrentWeatherBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetCurrentWeatherBatch,
+                    request_deserializer=weather__pb2.GetCurrentWeatherBatchRequest.FromString,
+                    response_serializer=weather__pb2.GetCurrentWeatherBatchResponse.SerializeToString,
+            ),
             'GetWeatherHistory': grpc.unary_unary_rpc_method_handler(
                     servicer.GetWeatherHistory,
                     request_deserializer=weather__pb2.GetWeatherHistoryRequest.FromString,
                     response_serializer=weather__pb2.GetWeatherHistoryResponse.SerializeToString,
             ),
+            'GetWeatherHistoryColumns': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetWeatherHistoryColumns,
+                    request_deserializer=weather__pb2.GetWeatherHistoryRequest.FromString,
+                    response_serializer=weather__pb2.WeatherHistoryColumns.SerializeToString,
+            ),
+            'StreamWeatherHistory': grpc.unary_stream_rpc_method_handler(
+                    servicer.StreamWeatherHistory,
+                    request_deserializer=weather__pb2.StreamWeatherHistoryRequest.FromString,
+                    response_serializer=weather__pb2.WeatherHistoryChunk.SerializeToString,
+            ),
+            'GetWeatherAggregates': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetWeatherAggregates,
+                    request_deserializer=weather__pb2.GetWeatherAggregatesRequest.FromString,
+                    response_serializer=weather__pb2.GetWeatherAggregatesResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'weather.v1.WeatherService', rpc_method_handlers)
@@ -113,6 +181,33 @@ class WeatherService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GetCurrentWeatherBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/weather.v1.WeatherService/GetCurrentWeatherBatch',
+            weather__pb2.GetCurrentWeatherBatchRequest.SerializeToString,
+            weather__pb2.GetCurrentWeatherBatchResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def GetWeatherHistory(request,
             target,
@@ -139,3 +234,84 @@ class WeatherService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetWeatherHistoryColumns(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/weather.v1.WeatherService/GetWeatherHistoryColumns',
+            weather__pb2.GetWeatherHistoryRequest.SerializeToString,
+            weather__pb2.WeatherHistoryColumns.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamWeatherHistory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/weather.v1.WeatherService/StreamWeatherHistory',
+            weather__pb2.StreamWeatherHistoryRequest.SerializeToString,
+            weather__pb2.WeatherHistoryChunk.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetWeatherAggregates(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/weather.v1.WeatherService/GetWeatherAggregates',
+            weather__pb2.GetWeatherAggregatesRequest.SerializeToString,
+            weather__pb2.GetWeatherAggregatesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,178 @@
+# local geocode index: resolves city names and aliases ("Cluj", "cluj napoca ", "Klausenburg") to one OWM
+# city id before anything goes upstream, so every spelling shares a cache entry and a history city_key.
+# the index is two sorted tab-separated files, memory-mapped and binary-searched in place (O(log n), no load
+# step at startup), built by `python -m server.build_geocode_index`:
+#   cities.tsv        id, name, country, lat, lon        sorted by id
+#   city_aliases.tsv  normalized alias, id               sorted by alias (bytes)
+import mmap
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, NamedTuple, Optional
+
+from .cache import city_key
+
+CITIES_FILE = "cities.tsv"
+ALIASES_FILE = "city_aliases.tsv"
+
+# coordinates are rounded to this many decimals for the cache key (2 = about 1 km)
+COORD_DECIMALS = 2
+STORED_NAMES_MAX = 10_000
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    """"Cluj-Napoca", " cluj  napoca", "Iași" -> "cluj napoca", "cluj napoca", "iasi"."""
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return _NON_ALNUM.sub(" ", ascii_only).strip()
+
+
+class Place(NamedTuple):
+    id: int
+    name: str
+    country: str
+    lat: float
+    lon: float
+
+
+class Lookup(NamedTuple):
+    """One current-weather request: how to ask OWM and the cache key it shares with equivalent requests."""
+    key: str
+    city: str = ""
+    city_id: int = 0
+    lat: float = None
+    lon: float = None
+    # canonical place name from the index, stored as the snapshot's city so history is not fragmented
+    name: str = ""
+
+    def owm_params(self) -> dict:
+        # keyword arguments for OpenWeatherMapClient.get_current on top of the free-text city
+        if self.city_id:
+            return {"city_id": self.city_id}
+        if self.lat is not None:
+            return {"lat": self.lat, "lon": self.lon}
+        return {}
+
+    @property
+    def label(self) -> str:
+        return self.name or self.city or self.key
+
+
+class StoredNames:
+    """Lookup key -> city name OWM returned for it, the name its snapshots are stored under.
+
+    Lookups the index cannot name (a city id without an index, coordinates, unknown spellings) only learn it from
+    a successful fetch; the stale fallback needs it to find the last snapshot while OWM is down.
+    """
+
+    def __init__(self, max_entries: int = STORED_NAMES_MAX):
+        self.max_entries = max_entries
+        self._names: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, lookup: Lookup, city: str) -> None:
+        if lookup.name or not city:
+            return
+        with self._lock:
+            self._names[lookup.key] = city
+            self._names.move_to_end(lookup.key)
+            while len(self._names) > self.max_entries:
+                self._names.popitem(last=False)
+
+    def label(self, lookup: Lookup) -> str:
+        if lookup.name:
+            return lookup.name
+        with self._lock:
+            stored = self._names.get(lookup.key)
+        return stored or lookup.label
+
+
+class _SortedFile:
+    """Tab-separated lines sorted by their first field, searched in place through mmap."""
+
+    def __init__(self, path: str, parse_key: Callable[[bytes], object]):
+        self.parse_key = parse_key
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        lines, pos = 0, self._mm.find(b"\n")
+        while pos != -1:
+            lines, pos = lines + 1, self._mm.find(b"\n", pos + 1)
+        return lines
+
+    def find(self, key) -> Optional[list]:
+        """Fields of the line whose first field equals key, or None."""
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        # lo and hi are always line starts
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = max(mm.rfind(b"\n", lo, mid) + 1, lo)
+            end = mm.find(b"\n", start, hi)
+            end = hi if end == -1 else end
+            fields = mm[start:end].split(b"\t")
+            line_key = self.parse_key(fields[0])
+            if line_key == key:
+                return [field.decode() for field in fields]
+            if line_key < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+
+class GeoIndex:
+    def __init__(self, directory: str, cache_size: int = 4096):
+        self._cities = _SortedFile(os.path.join(directory, CITIES_FILE), int)
+        self._aliases = _SortedFile(os.path.join(directory, ALIASES_FILE), bytes)
+        # repeated spellings skip the search entirely
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def by_id(self, city_id: int) -> Optional[Place]:
+        fields = self._cities.find(int(city_id))
+        if fields is None:
+            return None
+        id_, name, country, lat, lon = fields
+        return Place(int(id_), name, country, float(lat), float(lon))
+
+    def _resolve(self, name: str) -> Optional[Place]:
+        # "Paris,FR" / "paris fr" hit the name+country alias, anything else the plain name and its aliases
+        key = normalize(name)
+        if not key:
+            return None
+        fields = self._aliases.find(key.encode())
+        if fields is None and " " in key:
+            fields = self._aliases.find(key.replace(" ", "").encode())
+        return self.by_id(int(fields[1])) if fields else None
+
+
+def make_lookup(index: Optional[GeoIndex], city: str = "", city_id: int = 0, coord=None) -> Lookup:
+    """Lookup for a request by city id, coordinates (anything with .lat/.lon) or free-text name."""
+    if city_id:
+        place = index.by_id(city_id) if index else None
+        return Lookup(f"id:{city_id}", city=place.name if place else "", city_id=city_id,
+                      name=place.name if place else "")
+    if coord is not None:
+        # + 0.0 folds -0.0 into 0.0, so both sides of the equator/meridian round to one key
+        lat, lon = round(coord.lat, COORD_DECIMALS) + 0.0, round(coord.lon, COORD_DECIMALS) + 0.0
+        return Lookup(f"coord:{lat:.{COORD_DECIMALS}f},{lon:.{COORD_DECIMALS}f}", lat=lat, lon=lon)
+    place = index.resolve(city) if index else None
+    if place is not None:
+        return Lookup(f"id:{place.id}", city=city, city_id=place.id, name=place.name)
+    return Lookup(city_key(city), city=city)
+
+
+def canonical_city(index: Optional[GeoIndex], city: str) -> str:
+    # history queries by name: the canonical name snapshots were stored under, or the name as given
+    place = index.resolve(city) if index else None
+    return place.name if place else city
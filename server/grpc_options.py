@@ -0,0 +1,41 @@
+# grpc transport settings shared by the server (weather_server._server_options) and the gateway's channels:
+# compression names, message size caps and keepalive channel args. no server imports, the gateway uses it too
+import grpc
+
+COMPRESSION = {"none": grpc.Compression.NoCompression, "gzip": grpc.Compression.Gzip,
+               "deflate": grpc.Compression.Deflate}
+
+
+def compression(name: str) -> grpc.Compression:
+    try:
+        return COMPRESSION[name.strip().lower()]
+    except KeyError:
+        raise ValueError(f"unknown grpc compression {name!r}, expected one of {', '.join(COMPRESSION)}") from None
+
+
+def compression_options(name: str) -> list:
+    # the channel arg grpc.server(compression=...) and insecure_channel(compression=...) set: the default
+    # algorithm for outgoing messages. peers advertise what they accept, every grpc peer accepts gzip and deflate
+    algorithm = compression(name)
+    if algorithm == grpc.Compression.NoCompression:
+        return []
+    return [("grpc.default_compression_algorithm", int(algorithm))]
+
+
+def message_size_options(max_mb: float) -> list:
+    # max_mb < 0 = unlimited
+    size = -1 if max_mb < 0 else int(max_mb * 1024 * 1024)
+    return [("grpc.max_send_message_length", size), ("grpc.max_receive_message_length", size)]
+
+
+def keepalive_options(time_s: float, timeout_s: float) -> list:
+    # ping every time_s, also on connections without calls, and drop the connection after timeout_s without an
+    # ack; time_s <= 0 disables pings
+    if time_s <= 0:
+        return []
+    return [
+        ("grpc.keepalive_time_ms", int(time_s * 1000)),
+        ("grpc.keepalive_timeout_ms", int(timeout_s * 1000)),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+    ]
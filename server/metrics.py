@@ -0,0 +1,267 @@
+# prometheus metrics for the gRPC server: per-method counts/codes/latency from an interceptor,
+# OWM and DAO timings, thread-pool queue depth, cache, prefetch and write-behind stats. served on METRICS_PORT.
+import asyncio
+import inspect
+import socket
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import grpc
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, make_wsgi_app, start_http_server
+from prometheus_client.exposition import ThreadingWSGIServer
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# sub-millisecond cache hits up to multi-second upstream retries
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RPC_HANDLED = Counter("weather_grpc_handled_total", "RPCs completed, by method and status code", ["method", "code"])
+RPC_LATENCY = Histogram("weather_grpc_handling_seconds", "RPC handling time, by method", ["method"],
+                        buckets=LATENCY_BUCKETS)
+OWM_LATENCY = Histogram("weather_owm_seconds", "OpenWeatherMap client calls, by operation", ["operation"],
+                        buckets=LATENCY_BUCKETS)
+DAO_LATENCY = Histogram("weather_dao_seconds", "WeatherDAO calls, by operation", ["operation"],
+                        buckets=LATENCY_BUCKETS)
+WRITE_BEHIND_FLUSH_LATENCY = Histogram("weather_write_behind_flush_seconds", "Write-behind insert_many flushes",
+                                       buckets=LATENCY_BUCKETS)
+POOL_QUEUE_DEPTH = Gauge("weather_pool_queue_depth", "Tasks waiting for a worker thread, by pool", ["pool"])
+
+
+class Timed:
+    """Proxy that times every public method call of obj into histogram, labelled by method name.
+
+    Generators and async generators are timed until exhausted, coroutines until awaited.
+    """
+
+    def __init__(self, obj, histogram: Histogram):
+        self._obj = obj
+        self._histogram = histogram
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        observe = self._histogram.labels(name).observe
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = attr(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return _timed_gen(result, t0, observe)
+            if inspect.isasyncgen(result):
+                return _timed_agen(result, t0, observe)
+            if inspect.iscoroutine(result):
+                return _timed_coro(result, t0, observe)
+            observe(time.perf_counter() - t0)
+            return result
+        # cached on the proxy, so __getattr__ only runs on first use
+        self.__dict__[name] = timed
+        return timed
+
+
+def _timed_gen(gen, t0, observe):
+    try:
+        yield from gen
+    finally:
+        observe(time.perf_counter() - t0)
+
+
+async def _timed_agen(agen, t0, observe):
+    try:
+        async for item in agen:
+            yield item
+    finally:
+        observe(time.perf_counter() - t0)
+
+
+async def _timed_coro(coro, t0, observe):
+    try:
+        return await coro
+    finally:
+        observe(time.perf_counter() - t0)
+
+
+def _method_name(handler_call_details) -> str:
+    # "/weather.v1.WeatherService/GetCurrentWeather" -> "GetCurrentWeather"
+    return (handler_call_details.method or "").rsplit("/", 1)[-1]
+
+
+def _code(context, error: Exception = None) -> str:
+    # abort() sets the code before raising; anything else that escapes a handler is UNKNOWN
+    code = context.code() if hasattr(context, "code") else None
+    if code is None:
+        return grpc.StatusCode.UNKNOWN.name if error is not None else grpc.StatusCode.OK.name
+    return code.name if isinstance(code, grpc.StatusCode) else str(code)
+
+
+def _rebuild(handler, **behaviours):
+    if handler.unary_unary:
+        factory, behaviour = grpc.unary_unary_rpc_method_handler, behaviours["unary_unary"]
+    elif handler.unary_stream:
+        factory, behaviour = grpc.unary_stream_rpc_method_handler, behaviours["unary_stream"]
+    else:
+        return handler
+    return factory(behaviour, request_deserializer=handler.request_deserializer,
+                   response_serializer=handler.response_serializer)
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    # goes first in the chain so rejected calls (e.g. UNAUTHENTICATED) are counted too
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        latency, handled = RPC_LATENCY.labels(method), RPC_HANDLED
+
+        def unary_unary(request, context):
+            t0, error = time.perf_counter(), None
+            try:
+                return handler.unary_unary(request, context)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                latency.observe(time.perf_counter() - t0)
+                handled.labels(method, _code(context, error)).inc()
+
+        def unary_stream(request, context):
+            t0, error = time.perf_counter(), None
+            try:
+                yield from handler.unary_stream(request, context)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                latency.observe(time.perf_counter() - t0)
+                handled.labels(method, _code(context, error)).inc()
+
+        return _rebuild(handler, unary_unary=unary_unary, unary_stream=unary_stream)
+
+
+class AioMetricsInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details)
+        latency, handled = RPC_LATENCY.labels(method), RPC_HANDLED
+
+        async def unary_unary(request, context):
+            t0, error = time.perf_counter(), None
+            try:
+                return await handler.unary_unary(request, context)
+            except (Exception, asyncio.CancelledError) as e:
+                error = e
+                raise
+            finally:
+                latency.observe(time.perf_counter() - t0)
+                handled.labels(method, _code(context, error)).inc()
+
+        async def unary_stream(request, context):
+            t0, error = time.perf_counter(), None
+            try:
+                async for response in handler.unary_stream(request, context):
+                    yield response
+            except (Exception, asyncio.CancelledError) as e:
+                error = e
+                raise
+            finally:
+                latency.observe(time.perf_counter() - t0)
+                handled.labels(method, _code(context, error)).inc()
+
+        return _rebuild(handler, unary_unary=unary_unary, unary_stream=unary_stream)
+
+
+class ServiceCollector:
+    """Reads cache, breaker, rate limit, prefetch and write-behind stats from a running service at scrape time."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def collect(self):
+        cache = self.service.cache.stats()
+        yield GaugeMetricFamily("weather_cache_entries", "OWM payloads in the TTL cache", value=cache["size"])
+        yield GaugeMetricFamily("weather_cache_hit_ratio", "TTL cache hit ratio since start", value=cache["hit_ratio"])
+        for name in ("hits", "misses", "coalesced", "evictions"):
+            yield CounterMetricFamily(f"weather_cache_{name}", f"TTL cache {name}", value=cache[name])
+
+        breaker = getattr(self.service, "breaker", None)
+        if breaker is not None:
+            stats = breaker.stats()
+            states = GaugeMetricFamily("weather_owm_circuit_state", "OWM circuit breaker state (1 = current)",
+                                       labels=["state"])
+            for state in ("closed", "half_open", "open"):
+                states.add_metric([state], 1 if stats["state"] == state else 0)
+            yield states
+            yield CounterMetricFamily("weather_owm_circuit_opened", "Times the OWM circuit opened", value=stats["opened"])
+            yield CounterMetricFamily("weather_owm_circuit_rejected", "Calls failed fast by the open circuit",
+                                      value=stats["rejected"])
+
+        limiter = getattr(self.service, "limiter", None)
+        if limiter is not None:
+            stats = limiter.stats()
+            for name, doc in (("granted", "OWM call tokens granted"), ("waited", "Granted OWM calls that queued first"),
+                              ("shed", "OWM calls shed with RESOURCE_EXHAUSTED")):
+                yield CounterMetricFamily(f"weather_owm_rate_limit_{name}", doc, value=stats[name])
+
+        prefetch = getattr(self.service, "prefetch", None)
+        if prefetch is not None:
+            stats = prefetch.stats()
+            yield GaugeMetricFamily("weather_prefetch_tracked_cities", "Cities with a decaying request count",
+                                    value=stats["tracked"])
+            for name in ("cycles", "refreshed", "failed"):
+                yield CounterMetricFamily(f"weather_prefetch_{name}", f"Hot-city prefetch {name}", value=stats[name])
+
+        writer = getattr(self.service.dao, "writer", None)
+        if writer is not None:
+            stats = writer.stats()
+            yield GaugeMetricFamily("weather_write_behind_queue_depth", "Snapshots waiting to be flushed",
+                                    value=stats["queue_depth"])
+            for name in ("flushes", "flushed_docs", "failed_docs", "sync_writes"):
+                yield CounterMetricFamily(f"weather_write_behind_{name}", f"Write-behind {name}", value=stats[name])
+
+
+def watch_pool(name: str, pool) -> None:
+    # ThreadPoolExecutor keeps pending work in a private queue, read at scrape time
+    POOL_QUEUE_DEPTH.labels(name).set_function(lambda: pool._work_queue.qsize())
+
+
+class _ReusePortServer(ThreadingWSGIServer):
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_reuse_port_server(port: int, addr: str) -> None:
+    family = socket.AF_INET6 if ":" in addr else socket.AF_INET
+    server_class = type("_ReusePortServer", (_ReusePortServer,), {"address_family": family})
+    httpd = make_server(addr, port, make_wsgi_app(REGISTRY), server_class, handler_class=_QuietHandler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+
+
+def watch_writer(writer) -> None:
+    # writer: the DAO's write-behind writer, None when WRITE_BEHIND is off
+    if writer is not None:
+        writer.observe_flush = WRITE_BEHIND_FLUSH_LATENCY.observe
+
+
+def start(service, port: int, addr: str = "0.0.0.0", reuse_port: bool = False) -> None:
+    """Registers service-level collectors and serves /metrics on port (0 = disabled).
+
+    reuse_port: bind with SO_REUSEPORT, so a prefork replacement worker can serve the port while the worker it
+    replaces is still draining.
+    """
+    if port <= 0:
+        return
+    REGISTRY.register(ServiceCollector(service))
+    if reuse_port:
+        _start_reuse_port_server(port, addr)
+    else:
+        start_http_server(port, addr)
+    print(f"[metrics] serving /metrics on {addr}:{port}")
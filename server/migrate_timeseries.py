@@ -0,0 +1,69 @@
+# one-off migration of a plain snapshots collection into the time-series layout (STORAGE_MODE=timeseries)
+# renames COLLECTION to {COLLECTION}_legacy, creates the time-series collection and copies every doc over.
+# the legacy collection is left in place, drop it once the new one checks out.
+# usage: python -m server.migrate_timeseries [batch_size]
+import sys
+import time
+
+from pymongo import MongoClient
+
+from .dao import MONGO_URI, DB_NAME, COLLECTION, TIMESERIES_INDEXES, _timeseries_options, _to_datetime
+
+COPY_BATCH_SIZE = 5000
+
+
+def _timeseries_doc(doc: dict) -> dict:
+    # docs written before the ts field existed get it (and city_key) derived here
+    out = dict(doc)
+    out.setdefault("city_key", (doc.get("city") or "").strip().lower())
+    if "ts" not in out:
+        out["ts"] = _to_datetime(doc["timestamp_ms"])
+    return out
+
+
+def migrate(db, batch_size: int = COPY_BATCH_SIZE) -> int:
+    legacy_name = f"{COLLECTION}_legacy"
+    info = next(iter(db.list_collections(filter={"name": COLLECTION})), None)
+    if info is not None and info.get("type") == "timeseries":
+        print(f"[migrate] {COLLECTION} is already a time-series collection")
+        return 0
+    if legacy_name in db.list_collection_names():
+        raise RuntimeError(f"{legacy_name} already exists, finish or drop the previous migration first")
+    if info is not None:
+        db[COLLECTION].rename(legacy_name)
+    db.create_collection(COLLECTION, **_timeseries_options())
+    target = db[COLLECTION]
+    for name, keys in TIMESERIES_INDEXES.items():
+        target.create_index(keys, name=name)
+    if info is None:
+        return 0
+
+    copied, batch = 0, []
+    # natural order, time-series inserts do not need to be sorted
+    for doc in db[legacy_name].find({}, batch_size=batch_size):
+        batch.append(_timeseries_doc(doc))
+        if len(batch) >= batch_size:
+            target.insert_many(batch, ordered=False)
+            copied += len(batch)
+            batch = []
+            print(f"[migrate] copied {copied} snapshot(s)")
+    if batch:
+        target.insert_many(batch, ordered=False)
+        copied += len(batch)
+    return copied
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else COPY_BATCH_SIZE
+    client = MongoClient(MONGO_URI)
+    t0 = time.perf_counter()
+    try:
+        copied = migrate(client[DB_NAME], batch_size)
+    finally:
+        client.close()
+    print(f"[migrate] done: {copied} snapshot(s) in {time.perf_counter() - t0:.1f}s, "
+          f"old data kept in {COLLECTION}_legacy")
+
+
+if __name__ == "__main__":
+    main()
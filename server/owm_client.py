@@ -1,22 +1,115 @@
 # http client for OpenWeatherMap API + parsing response
+import random
+import threading
+import time
+import asyncio
+
+import httpx
 import requests
-from .config import OWM_API_KEY
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    OWM_API_KEY, OWM_BASE_URL, GRPC_MAX_WORKERS,
+    OWM_CONNECT_TIMEOUT_S, OWM_READ_TIMEOUT_S,
+    OWM_MAX_RETRIES, OWM_RETRY_BACKOFF_S,
+    OWM_RETRY_BUDGET_RATIO, OWM_RETRY_BUDGET_MIN_PER_S, OWM_AIO_MAX_CONNECTIONS,
+)
+from .rate_limit import BACKGROUND
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# raised for non-2xx upstream responses by the sync and async clients, both carry .response.status_code
+HTTP_ERRORS = (requests.HTTPError, httpx.HTTPStatusError)
+
+
+def is_upstream_failure(e: Exception) -> bool:
+    # OWM itself is unhealthy (5xx/429, timeout, connection error); 401/404 etc. are answers, not outages
+    if isinstance(e, HTTP_ERRORS):
+        return e.response.status_code in RETRYABLE_STATUS
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+class RetryBudget:
+    """Token bucket shared by all calls: each request deposits `ratio` tokens,
+    plus `min_per_s` tokens per second, and every retry spends one."""
+
+    def __init__(self, ratio: float, min_per_s: float, capacity: float = 10.0, clock=time.monotonic):
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.min_per_s)
+            self._last = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def make_session(pool_size: int = GRPC_MAX_WORKERS) -> requests.Session:
+    # one keep-alive pool, sized so every grpc worker thread can hold a connection
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
 class OpenWeatherMapClient:
-    BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
-
-    def get_current(self, city: str) -> dict:
-        if not OWM_API_KEY:
-            raise RuntimeError("OWM_API_KEY is not set in the environment variables.")
-        params = {
-            "q": city,
-            "appid": OWM_API_KEY,
-            "units": "metric"
-        }
-        response = requests.get(self.BASE_URL, params=params)
+    BASE_URL = OWM_BASE_URL
+
+    def __init__(self, session: requests.Session = None, budget: RetryBudget = None, limiter=None):
+        self.session = session or make_session()
+        self.budget = budget or RetryBudget(OWM_RETRY_BUDGET_RATIO, OWM_RETRY_BUDGET_MIN_PER_S)
+        # the service's OWM call budget (RateLimiter): the caller pays for the first attempt, every retry
+        # takes its own token like a background call (no queueing, reserve left) or is not made
+        self.limiter = limiter
+        self.timeout = (OWM_CONNECT_TIMEOUT_S, OWM_READ_TIMEOUT_S)
+        self.max_retries = OWM_MAX_RETRIES
+        self.backoff_s = OWM_RETRY_BACKOFF_S
+        self._sleep = time.sleep
+
+    def get_current(self, city: str = "", city_id: int = 0, lat: float = None, lon: float = None) -> dict:
+        # by name (q=), OWM city id (id=) or coordinates (lat=&lon=)
+        response = self._get(_params(city, city_id, lat, lon))
         response.raise_for_status()
         return response.json()
-    
+
+    def _get(self, params: dict) -> requests.Response:
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(self.BASE_URL, params=params, timeout=self.timeout)
+            except requests.ConnectionError:
+                if not self._can_retry(attempt):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or not self._can_retry(attempt):
+                    return response
+                response.close()
+            # full jitter, so replicas don't retry in lockstep
+            self._sleep(random.uniform(0, self.backoff_s * (2 ** attempt)))
+            attempt += 1
+
+    def _can_retry(self, attempt: int) -> bool:
+        if attempt >= self.max_retries or not self.budget.try_spend():
+            return False
+        return self.limiter is None or self.limiter.try_acquire(BACKGROUND)
+
+    def close(self) -> None:
+        self.session.close()
+
     @staticmethod
     def parse(payload: dict) -> dict:
         return{
@@ -25,4 +118,68 @@ class OpenWeatherMapClient:
             "description": payload["weather"][0]["description"],
             "humidity": int(payload["main"]["humidity"]),
             "wind_speed": float(payload.get("wind", {}).get("speed", 0.0)),
+            # when OWM took the observation (its `dt`, seconds), 0 if missing
+            "observed_ms": int(payload.get("dt", 0)) * 1000,
         }
+
+
+class AsyncOpenWeatherMapClient:
+    """asyncio twin of OpenWeatherMapClient (httpx), used by the grpc.aio server."""
+    BASE_URL = OWM_BASE_URL
+
+    def __init__(self, client: httpx.AsyncClient = None, budget: RetryBudget = None, limiter=None):
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(OWM_READ_TIMEOUT_S, connect=OWM_CONNECT_TIMEOUT_S),
+            limits=httpx.Limits(max_connections=OWM_AIO_MAX_CONNECTIONS, max_keepalive_connections=OWM_AIO_MAX_CONNECTIONS),
+        )
+        self.budget = budget or RetryBudget(OWM_RETRY_BUDGET_RATIO, OWM_RETRY_BUDGET_MIN_PER_S)
+        self.limiter = limiter
+        self.max_retries = OWM_MAX_RETRIES
+        self.backoff_s = OWM_RETRY_BACKOFF_S
+        self._sleep = asyncio.sleep
+
+    async def get_current(self, city: str = "", city_id: int = 0, lat: float = None, lon: float = None) -> dict:
+        response = await self._get(_params(city, city_id, lat, lon))
+        response.raise_for_status()
+        return response.json()
+
+    async def _get(self, params: dict) -> httpx.Response:
+        self.budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.get(self.BASE_URL, params=params)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if not await self._can_retry(attempt):
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS or not await self._can_retry(attempt):
+                    return response
+            await self._sleep(random.uniform(0, self.backoff_s * (2 ** attempt)))
+            attempt += 1
+
+    async def _can_retry(self, attempt: int) -> bool:
+        if attempt >= self.max_retries or not self.budget.try_spend():
+            return False
+        return self.limiter is None or await self.limiter.try_acquire_async(BACKGROUND)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    parse = staticmethod(OpenWeatherMapClient.parse)
+
+
+def _params(city: str, city_id: int = 0, lat: float = None, lon: float = None) -> dict:
+    if not OWM_API_KEY:
+        raise RuntimeError("OWM_API_KEY is not set in the environment variables.")
+    if city_id:
+        where = {"id": city_id}
+    elif lat is not None and lon is not None:
+        where = {"lat": lat, "lon": lon}
+    else:
+        where = {"q": city}
+    return {
+        **where,
+        "appid": OWM_API_KEY,
+        "units": "metric"
+    }
@@ -0,0 +1,167 @@
+# background refresh of hot cities (PREFETCH=1): request frequency per city_key is tracked with
+# exponentially decaying counters, and the top cities are re-fetched from OWM into the cache and the
+# DAO once per OWM update interval, paced to stay inside an upstream calls-per-minute budget
+import asyncio
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from .cache import city_key
+
+
+class HotCities:
+    """Decaying request counter per city_key; a request counts 1, halving every half_life_s."""
+
+    def __init__(self, half_life_s: float, max_keys: int, clock: Callable[[], float] = time.monotonic):
+        self.decay = math.log(2) / half_life_s
+        self.max_keys = max_keys
+        self._clock = clock
+        self._lock = threading.Lock()
+        # cache key -> [score, last update, what to refresh it with]
+        self._scores: Dict[str, list] = {}
+
+    def record(self, city, key: str = None) -> None:
+        # city is handed back by top() as is (a name, or the service's geocode Lookup with its key)
+        key, now = key or city_key(city), self._clock()
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                if len(self._scores) >= self.max_keys:
+                    self._prune(now)
+                self._scores[key] = [1.0, now, city]
+                return
+            entry[0] = self._decayed(entry, now) + 1.0
+            entry[1] = now
+
+    def top(self, k: int, min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """The k hottest (city, score) pairs with score >= min_score, hottest first."""
+        now = self._clock()
+        with self._lock:
+            scored = [(entry[2], self._decayed(entry, now)) for entry in self._scores.values()]
+        scored = [item for item in scored if item[1] >= min_score]
+        scored.sort(key=lambda item: -item[1])
+        return scored[:k]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._scores)
+
+    def _decayed(self, entry: list, now: float) -> float:
+        return entry[0] * math.exp(-self.decay * (now - entry[1]))
+
+    def _prune(self, now: float) -> None:
+        # drop the coldest half, caller holds the lock
+        ranked = sorted(self._scores, key=lambda key: self._decayed(self._scores[key], now))
+        for key in ranked[:max(1, len(ranked) // 2)]:
+            del self._scores[key]
+
+
+class PrefetchPlan:
+    """Which hot cities to refresh each cycle and when, shared by the thread and asyncio schedulers."""
+
+    def __init__(self, hot: HotCities, top_k: int, min_score: float, interval_s: float, calls_per_min: float,
+                 wall_clock: Callable[[], float] = time.time):
+        self.hot = hot
+        self.top_k = top_k
+        self.min_score = min_score
+        self.interval_s = interval_s
+        # spacing between upstream calls so a cycle never exceeds calls_per_min
+        self.spacing_s = 60.0 / calls_per_min if calls_per_min > 0 else 0.0
+        self.max_per_cycle = int(interval_s / self.spacing_s) if self.spacing_s else top_k
+        self._wall_clock = wall_clock
+        self.cycles = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    def cities(self) -> List[str]:
+        return [city for city, _ in self.hot.top(min(self.top_k, self.max_per_cycle), self.min_score)]
+
+    def seconds_to_next_cycle(self) -> float:
+        # cycles start on wall-clock multiples of interval_s, in step with OWM's own update interval
+        now = self._wall_clock()
+        return self.interval_s - now % self.interval_s
+
+    def cache_ttl_s(self) -> float:
+        # refreshed entries must outlive the gap until the next cycle has reached them
+        return self.interval_s * 1.5
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self.hot),
+            "cycles": self.cycles,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "hot": self.hot.top(self.top_k, self.min_score),
+        }
+
+
+class Prefetcher:
+    """Thread-mode scheduler: a daemon thread running refresh(city) for the plan's cities every cycle."""
+
+    def __init__(self, plan: PrefetchPlan, refresh: Callable[[str], None]):
+        self.plan = plan
+        self.refresh = refresh
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def run_cycle(self) -> None:
+        self.plan.cycles += 1
+        for i, city in enumerate(self.plan.cities()):
+            if i and self._stop.wait(self.plan.spacing_s):
+                return
+            try:
+                self.refresh(city)
+                self.plan.refreshed += 1
+            except Exception as e:
+                self.plan.failed += 1
+                print(f"[prefetch] WARNING: refresh of {city!r} failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.plan.seconds_to_next_cycle()):
+            self.run_cycle()
+
+
+class AsyncPrefetcher:
+    """grpc.aio flavour of Prefetcher, an asyncio task awaiting refresh(city)."""
+
+    def __init__(self, plan: PrefetchPlan, refresh: Callable[[str], "asyncio.Future"]):
+        self.plan = plan
+        self.refresh = refresh
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run_cycle(self) -> None:
+        self.plan.cycles += 1
+        for i, city in enumerate(self.plan.cities()):
+            if i:
+                await asyncio.sleep(self.plan.spacing_s)
+            try:
+                await self.refresh(city)
+                self.plan.refreshed += 1
+            except Exception as e:
+                self.plan.failed += 1
+                print(f"[prefetch] WARNING: refresh of {city!r} failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.plan.seconds_to_next_cycle())
+            await self.run_cycle()
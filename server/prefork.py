@@ -0,0 +1,159 @@
+# SERVER_MODE=prefork: a supervisor process starts GRPC_WORKERS worker processes that all bind GRPC_PORT with
+# SO_REUSEPORT, so the kernel spreads incoming connections across them and each worker gets its own GIL, mongo
+# client and OWM session. SIGTERM/SIGINT stop the workers gracefully, SIGHUP replaces them one at a time
+# (the new worker is serving before the old one is stopped), and crashed workers are restarted with backoff.
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from .config import GRPC_PORT, GRPC_WORKERS, PREFORK_WORKER_MODE, METRICS_PORT, GRPC_SHUTDOWN_GRACE_S
+
+# spawn, not fork: grpc's core threads must never be inherited from the parent
+_ctx = multiprocessing.get_context("spawn")
+
+# a worker that dies sooner than this after starting is crash-looping, its restarts back off up to MAX_BACKOFF_S
+MIN_UPTIME_S = 10.0
+MAX_BACKOFF_S = 30.0
+READY_TIMEOUT_S = 30.0
+
+
+def worker_count(configured: int) -> int:
+    return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+def _worker(index: int, mode: str, ready) -> None:
+    from .weather_server import serve
+
+    _exit_with_parent()
+    # worker i serves /metrics on METRICS_PORT + i
+    metrics_port = METRICS_PORT + index if METRICS_PORT > 0 else 0
+    serve(mode, metrics_port=metrics_port, reuse_port=True, ready=ready)
+
+
+def _exit_with_parent() -> None:
+    # a SIGKILLed supervisor cannot stop its workers, so each worker stops itself once it is orphaned
+    parent = os.getppid()
+
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(1.0)
+        os.kill(os.getpid(), signal.SIGTERM)
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+class _Slot:
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        # the child unpickles its ready Event after start(), so the parent keeps a reference until it is replaced
+        self.ready = None
+        self.started_at = 0.0
+        self.backoff_s = 0.0
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    def __init__(self, workers: int, mode: str, target=_worker):
+        self.slots = [_Slot(i) for i in range(workers)]
+        self.mode = mode
+        self.target = target
+        self.restarts = 0
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+
+    def start(self) -> None:
+        for slot in self.slots:
+            self._spawn(slot)
+
+    def run(self) -> None:
+        """Supervises the workers until stop(), then shuts them down."""
+        while not self._stop.wait(0.5):
+            if self._reload.is_set():
+                self._reload.clear()
+                self.rolling_restart()
+            self.check()
+        self.shutdown()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def reload(self) -> None:
+        self._reload.set()
+
+    def pids(self) -> list:
+        return [slot.process.pid for slot in self.slots if slot.process is not None]
+
+    def check(self) -> None:
+        """Restarts workers that exited on their own."""
+        now = time.monotonic()
+        for slot in self.slots:
+            proc = slot.process
+            if proc is not None and proc.is_alive():
+                continue
+            if proc is not None:
+                uptime = now - slot.started_at
+                slot.backoff_s = 0.0 if uptime >= MIN_UPTIME_S else min(MAX_BACKOFF_S, max(1.0, slot.backoff_s * 2))
+                slot.restart_at = now + slot.backoff_s
+                slot.process = None
+                print(f"[prefork] WARNING: worker {slot.index} (pid {proc.pid}) exited with code {proc.exitcode}, "
+                      f"restarting in {slot.backoff_s:g}s")
+            if now >= slot.restart_at:
+                self.restarts += 1
+                self._spawn(slot)
+
+    def rolling_restart(self) -> None:
+        print(f"[prefork] restarting {len(self.slots)} workers one by one")
+        for slot in self.slots:
+            old = slot.process
+            if not self._spawn(slot, wait_ready=True):
+                print(f"[prefork] WARNING: replacement for worker {slot.index} not ready in {READY_TIMEOUT_S:g}s, "
+                      "keeping the old one")
+                continue
+            if old is not None:
+                _stop_process(old, GRPC_SHUTDOWN_GRACE_S + 5)
+
+    def shutdown(self) -> None:
+        procs = [slot.process for slot in self.slots if slot.process is not None]
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + GRPC_SHUTDOWN_GRACE_S + 5
+        for proc in procs:
+            _stop_process(proc, max(0.0, deadline - time.monotonic()))
+
+    def _spawn(self, slot: _Slot, wait_ready: bool = False) -> bool:
+        ready = _ctx.Event()
+        proc = _ctx.Process(target=self.target, args=(slot.index, self.mode, ready), name=f"weather-worker-{slot.index}")
+        proc.start()
+        if wait_ready and not ready.wait(READY_TIMEOUT_S):
+            _stop_process(proc, GRPC_SHUTDOWN_GRACE_S)
+            return False
+        slot.process, slot.ready, slot.started_at = proc, ready, time.monotonic()
+        return True
+
+
+def _stop_process(proc, timeout: float) -> None:
+    # SIGTERM lets the worker drain in-flight RPCs, SIGKILL if it is still there after timeout
+    if proc.is_alive():
+        proc.terminate()
+    proc.join(timeout)
+    if proc.is_alive():
+        print(f"[prefork] WARNING: worker pid {proc.pid} did not stop in {timeout:g}s, killing it")
+        proc.kill()
+        proc.join()
+
+
+def supervise(workers: int = GRPC_WORKERS, mode: str = PREFORK_WORKER_MODE) -> None:
+    if mode not in ("thread", "aio"):
+        raise ValueError(f"unknown PREFORK_WORKER_MODE {mode!r}, expected thread or aio")
+    supervisor = Supervisor(worker_count(workers), mode)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: supervisor.stop())
+    signal.signal(signal.SIGHUP, lambda *_: supervisor.reload())
+
+    print(f"[prefork] starting {len(supervisor.slots)} {mode} workers on port {GRPC_PORT} (pid {os.getpid()})")
+    supervisor.start()
+    supervisor.run()
+    print("[prefork] all workers stopped")
@@ -0,0 +1,150 @@
+# token-bucket limit on upstream OWM calls. the bucket lives in-process (one replica) or in a mongo
+# document updated atomically (all replicas share one calls-per-minute budget). interactive calls queue
+# up to max_wait_s for a token; background refreshes never queue and leave a reserve for interactive ones.
+import asyncio
+import threading
+import time
+
+from pymongo import ReturnDocument
+
+INTERACTIVE, BACKGROUND = "interactive", "background"
+
+
+class RateLimitedError(Exception):
+    """Raised when no upstream call token is available in time (mapped to RESOURCE_EXHAUSTED)."""
+
+
+class LocalBucket:
+    """In-process token bucket: `rate_per_min` tokens per minute, holding at most `burst`."""
+
+    def __init__(self, rate_per_min: float, burst: float, clock=time.monotonic):
+        self.rate_per_s = rate_per_min / 60.0
+        self.burst = burst
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = clock()
+
+    def take(self, reserve: float = 0.0) -> float:
+        """Takes a token if more than `reserve` would remain; returns 0, or seconds until one is available."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+            self._updated = now
+            if self._tokens >= 1 + reserve:
+                self._tokens -= 1
+                return 0.0
+            return (1 + reserve - self._tokens) / self.rate_per_s
+
+    async def take_async(self, reserve: float = 0.0) -> float:
+        return self.take(reserve)
+
+
+class MongoBucket:
+    """The same bucket as one document in `collection`, refilled and debited by a single
+    find_one_and_update, so any number of replicas draw from one budget. Replica clocks are
+    assumed to be NTP-synced; skew only shifts the refill by the skew.
+    """
+
+    def __init__(self, collection, rate_per_min: float, burst: float, name: str = "owm", clock=time.time):
+        self.collection = collection
+        self.name = name
+        self.rate_per_s = rate_per_min / 60.0
+        self.burst = burst
+        self._clock = clock
+
+    def take(self, reserve: float = 0.0) -> float:
+        doc = self.collection.find_one_and_update({"_id": self.name}, self._pipeline(reserve),
+                                                  upsert=True, return_document=ReturnDocument.AFTER)
+        return self._wait(doc, reserve)
+
+    async def take_async(self, reserve: float = 0.0) -> float:
+        # with an AsyncMongoClient collection (aio server)
+        doc = await self.collection.find_one_and_update({"_id": self.name}, self._pipeline(reserve),
+                                                        upsert=True, return_document=ReturnDocument.AFTER)
+        return self._wait(doc, reserve)
+
+    def _pipeline(self, reserve: float) -> list:
+        now = self._clock()
+        refilled = {"$min": [self.burst, {"$add": [
+            {"$ifNull": ["$tokens", self.burst]},
+            {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated", now]}]}]}, self.rate_per_s]},
+        ]}]}
+        enough = {"$gte": ["$tokens", 1 + reserve]}
+        return [
+            {"$set": {"tokens": refilled, "updated": {"$max": [now, {"$ifNull": ["$updated", now]}]}}},
+            # both fields read the refilled value, so `granted` says whether this call took the token
+            {"$set": {"granted": enough, "tokens": {"$cond": [enough, {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+        ]
+
+    def _wait(self, doc: dict, reserve: float) -> float:
+        if doc["granted"]:
+            return 0.0
+        return (1 + reserve - doc["tokens"]) / self.rate_per_s
+
+
+class RateLimiter:
+    def __init__(self, bucket, max_wait_s: float, background_reserve: float = 0.0):
+        self.bucket = bucket
+        self.max_wait_s = max_wait_s
+        # tokens background calls must leave in the bucket for interactive ones
+        self.background_reserve = background_reserve
+        self.granted = 0
+        self.waited = 0
+        self.shed = 0
+
+    def acquire(self, priority: str = INTERACTIVE) -> None:
+        """Blocks until a token is taken, or raises RateLimitedError."""
+        deadline = time.monotonic() + self._max_wait(priority)
+        waited = False
+        while True:
+            wait = self.bucket.take(self._reserve(priority))
+            if not wait:
+                return self._granted(waited)
+            self._check(deadline, wait, priority)
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self, priority: str = INTERACTIVE) -> None:
+        deadline = time.monotonic() + self._max_wait(priority)
+        waited = False
+        while True:
+            wait = await self.bucket.take_async(self._reserve(priority))
+            if not wait:
+                return self._granted(waited)
+            self._check(deadline, wait, priority)
+            waited = True
+            await asyncio.sleep(wait)
+
+    def try_acquire(self, priority: str = BACKGROUND) -> bool:
+        """A token only if one is available now (no queueing), e.g. for a retry of an admitted call."""
+        if self.bucket.take(self._reserve(priority)):
+            self.shed += 1
+            return False
+        self._granted(False)
+        return True
+
+    async def try_acquire_async(self, priority: str = BACKGROUND) -> bool:
+        if await self.bucket.take_async(self._reserve(priority)):
+            self.shed += 1
+            return False
+        self._granted(False)
+        return True
+
+    def stats(self) -> dict:
+        return {"granted": self.granted, "waited": self.waited, "shed": self.shed}
+
+    def _max_wait(self, priority: str) -> float:
+        return self.max_wait_s if priority == INTERACTIVE else 0.0
+
+    def _reserve(self, priority: str) -> float:
+        return 0.0 if priority == INTERACTIVE else self.background_reserve
+
+    def _granted(self, waited: bool) -> None:
+        self.granted += 1
+        self.waited += waited
+
+    def _check(self, deadline: float, wait: float, priority: str) -> None:
+        if time.monotonic() + wait > deadline:
+            self.shed += 1
+            raise RateLimitedError(f"OWM call budget exhausted ({priority})")
@@ -0,0 +1,114 @@
+# hourly/daily rollups of raw snapshots (ROLLUPS=1), kept current with one upsert per snapshot and resolution
+from typing import Dict, List
+
+from pymongo import ASCENDING, UpdateOne
+
+# resolution -> bucket width; finest first
+RESOLUTIONS = {"1h": 3_600_000, "1d": 86_400_000}
+ROLLUP_INDEX = [("city_key", ASCENDING), ("bucket_start_ms", ASCENDING)]
+ROLLUP_FIELDS = ("temperature_c", "humidity", "wind_speed")
+
+
+def rollup_collection(collection: str, resolution: str) -> str:
+    return f"{collection}_rollup_{resolution}"
+
+
+def bucket_start(timestamp_ms: int, bucket_ms: int) -> int:
+    return timestamp_ms - timestamp_ms % bucket_ms
+
+
+def _description_key(description: str) -> str:
+    # descriptions become field names under "descriptions", so no dots or leading $
+    return (description or "").replace(".", "_").lstrip("$") or "unknown"
+
+
+# _description_key as an aggregation expression, so backfilled buckets get the same keys as incremental ones
+DESCRIPTION_KEY_EXPR = {"$let": {
+    "vars": {"key": {"$ltrim": {
+        "input": {"$replaceAll": {"input": {"$ifNull": ["$description", ""]}, "find": ".", "replacement": "_"}},
+        "chars": {"$literal": "$"},
+    }}},
+    "in": {"$cond": [{"$eq": ["$$key", ""]}, "unknown", "$$key"]},
+}}
+
+
+def rollup_updates(docs: List[dict]) -> Dict[str, List[UpdateOne]]:
+    # per resolution, the upserts folding docs into their buckets (running min/max/sum + description counts)
+    updates = {resolution: [] for resolution in RESOLUTIONS}
+    for doc in docs:
+        inc = {"count": 1, f"descriptions.{_description_key(doc['description'])}": 1}
+        mins, maxs = {}, {}
+        for field in ROLLUP_FIELDS:
+            inc[f"{field}_sum"] = doc[field]
+            mins[f"{field}_min"] = doc[field]
+            maxs[f"{field}_max"] = doc[field]
+        for resolution, bucket_ms in RESOLUTIONS.items():
+            updates[resolution].append(UpdateOne(
+                {"city_key": doc["city_key"], "bucket_start_ms": bucket_start(doc["timestamp_ms"], bucket_ms)},
+                {"$set": {"city": doc["city"]}, "$inc": inc, "$min": mins, "$max": maxs},
+                upsert=True,
+            ))
+    return updates
+
+
+def rollup_query(city: str, from_ms: int, to_ms: int, resolution: str) -> dict:
+    # buckets overlapping [from_ms, to_ms)
+    return {"city_key": (city or "").strip().lower(),
+            "bucket_start_ms": {"$gte": bucket_start(from_ms, RESOLUTIONS[resolution]), "$lt": to_ms}}
+
+
+def rollup_point(doc: dict) -> dict:
+    # a rollup bucket as a snapshot-shaped doc: averages, dominant description, bucket start as timestamp
+    count = doc["count"]
+    descriptions = doc.get("descriptions") or {}
+    return {
+        "city": doc["city"],
+        "temperature_c": doc["temperature_c_sum"] / count,
+        "description": min(descriptions, key=lambda d: (-descriptions[d], d)) if descriptions else "",
+        "humidity": round(doc["humidity_sum"] / count),
+        "wind_speed": doc["wind_speed_sum"] / count,
+        "timestamp_ms": doc["bucket_start_ms"],
+    }
+
+
+def pick_resolution(raw_points: int, from_ms: int, to_ms: int, max_points: int) -> str:
+    # finest resolution whose point count fits max_points, the coarsest one if none does
+    if max_points <= 0 or raw_points <= max_points:
+        return "raw"
+    for resolution, bucket_ms in RESOLUTIONS.items():
+        if (to_ms - bucket_start(from_ms, bucket_ms) + bucket_ms - 1) // bucket_ms <= max_points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
+
+
+def backfill_pipeline(raw_query: dict, bucket_ms: int, target: str) -> List[dict]:
+    # rebuilds rollup docs for the matched raw snapshots and replaces them in target
+    bucket = {"$subtract": ["$timestamp_ms", {"$mod": ["$timestamp_ms", bucket_ms]}]}
+    return [
+        {"$match": raw_query},
+        {"$group": {
+            # grouped by key, not raw description: descriptions that share a key add up like $inc does
+            "_id": {"city_key": "$city_key", "bucket": bucket, "description": DESCRIPTION_KEY_EXPR},
+            "city": {"$last": "$city"},
+            "count": {"$sum": 1},
+            **{f"{f}_{op}": {f"${op}": f"${f}"} for f in ROLLUP_FIELDS for op in ("min", "max", "sum")},
+        }},
+        {"$group": {
+            "_id": {"city_key": "$_id.city_key", "bucket": "$_id.bucket"},
+            "city": {"$last": "$city"},
+            "count": {"$sum": "$count"},
+            "descriptions": {"$push": {"k": "$_id.description", "v": "$count"}},
+            **{f"{f}_{op}": {f"${op}": f"${f}_{op}"} for f in ROLLUP_FIELDS for op in ("min", "max", "sum")},
+        }},
+        {"$project": {
+            "_id": 0,
+            "city_key": "$_id.city_key",
+            "bucket_start_ms": "$_id.bucket",
+            "city": 1,
+            "count": 1,
+            "descriptions": {"$arrayToObject": "$descriptions"},
+            **{f"{f}_{op}": 1 for f in ROLLUP_FIELDS for op in ("min", "max", "sum")},
+        }},
+        {"$merge": {"into": target, "on": ["city_key", "bucket_start_ms"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
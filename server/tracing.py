@@ -0,0 +1,225 @@
+# opentelemetry tracing shared by the gateway and the gRPC server. the gateway injects the W3C
+# traceparent into gRPC metadata, the server interceptor picks it up, OWM/DAO calls become child spans.
+# with TRACE_EXPORTER=none no SDK is installed and every span is the API's no-op span.
+import inspect
+import sys
+
+import grpc
+from opentelemetry import context as otel_context, propagate, trace
+
+from .metrics import _method_name, _rebuild
+
+tracer = trace.get_tracer("weather")
+
+
+def setup(service_name: str, exporter: str, sample_ratio: float, file_path: str = "traces.jsonl"):
+    """Installs the SDK tracer provider for this process; returns it, or None when tracing is off."""
+    if exporter == "none" or sample_ratio <= 0:
+        return None
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    # ParentBased: the gateway's sampling decision carries over to the server
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_exporter(exporter, file_path)))
+    trace.set_tracer_provider(provider)
+    print(f"[tracing] {service_name}: exporter={exporter} sample_ratio={sample_ratio}")
+    return provider
+
+
+def _exporter(name: str, file_path: str):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if name == "console":
+        return ConsoleSpanExporter(out=sys.stdout)
+    if name == "file":
+        # one JSON document per span, appended
+        return ConsoleSpanExporter(out=open(file_path, "a"), formatter=lambda span: span.to_json(indent=None) + "\n")
+    if name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            raise RuntimeError("TRACE_EXPORTER=otlp needs the opentelemetry-exporter-otlp package")
+        # endpoint etc. come from the standard OTEL_EXPORTER_OTLP_* env vars
+        return OTLPSpanExporter()
+    raise ValueError(f"unknown TRACE_EXPORTER {name!r}, expected none, console, file or otlp")
+
+
+def inject_metadata(metadata: tuple) -> tuple:
+    # adds traceparent (and tracestate) of the current span to outgoing gRPC metadata
+    carrier = {}
+    propagate.inject(carrier)
+    return metadata + tuple(carrier.items())
+
+
+class Traced:
+    """Proxy that wraps every public method call of obj in a "<prefix>.<method>" span."""
+
+    def __init__(self, obj, prefix: str):
+        self._obj = obj
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        span_name = f"{self._prefix}.{name}"
+
+        def traced(*args, **kwargs):
+            if not trace.get_current_span().is_recording():
+                # unsampled request (or tracing off): skip span bookkeeping entirely
+                return attr(*args, **kwargs)
+            span = tracer.start_span(span_name)
+            try:
+                with trace.use_span(span, end_on_exit=False):
+                    result = attr(*args, **kwargs)
+            except BaseException as e:
+                _end(span, e)
+                raise
+            if inspect.isgenerator(result):
+                return _traced_gen(result, span)
+            if inspect.isasyncgen(result):
+                return _traced_agen(result, span)
+            if inspect.iscoroutine(result):
+                return _traced_coro(result, span)
+            span.end()
+            return result
+        self.__dict__[name] = traced
+        return traced
+
+
+def _end(span, error: BaseException = None) -> None:
+    if error is not None:
+        span.record_exception(error)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+    span.end()
+
+
+def _traced_gen(gen, span):
+    try:
+        yield from gen
+    except BaseException as e:
+        _end(span, e)
+        raise
+    _end(span)
+
+
+async def _traced_agen(agen, span):
+    try:
+        async for item in agen:
+            yield item
+    except BaseException as e:
+        _end(span, e)
+        raise
+    _end(span)
+
+
+async def _traced_coro(coro, span):
+    try:
+        with trace.use_span(span, end_on_exit=False):
+            result = await coro
+    except BaseException as e:
+        _end(span, e)
+        raise
+    _end(span)
+    return result
+
+
+def _server_span(handler_call_details):
+    parent = propagate.extract(dict(handler_call_details.invocation_metadata or []))
+    return tracer.start_span(f"WeatherService/{_method_name(handler_call_details)}",
+                             context=parent, kind=trace.SpanKind.SERVER)
+
+
+def _finish(span, context, error: BaseException = None) -> None:
+    code = context.code() if hasattr(context, "code") else None
+    if code is not None:
+        span.set_attribute("rpc.grpc.status_code", code.value[0] if isinstance(code, grpc.StatusCode) else code)
+        if code != grpc.StatusCode.OK:
+            span.set_status(trace.Status(trace.StatusCode.ERROR, code.name))
+    _end(span, None if code is not None else error)
+
+
+class TracingInterceptor(grpc.ServerInterceptor):
+    # continues the caller's trace from the traceparent metadata, one SERVER span per RPC
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        def unary_unary(request, context):
+            span = _server_span(handler_call_details)
+            token = otel_context.attach(trace.set_span_in_context(span))
+            error = None
+            try:
+                return handler.unary_unary(request, context)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                otel_context.detach(token)
+                _finish(span, context, error)
+
+        def unary_stream(request, context):
+            span = _server_span(handler_call_details)
+            ctx = trace.set_span_in_context(span)
+            error = None
+            try:
+                responses = handler.unary_stream(request, context)
+                while True:
+                    # the handler body runs inside next(), so each step gets the span as its context
+                    token = otel_context.attach(ctx)
+                    try:
+                        response = next(responses)
+                    except StopIteration:
+                        break
+                    finally:
+                        otel_context.detach(token)
+                    yield response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _finish(span, context, error)
+
+        return _rebuild(handler, unary_unary=unary_unary, unary_stream=unary_stream)
+
+
+class AioTracingInterceptor(grpc.aio.ServerInterceptor):
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        async def unary_unary(request, context):
+            span = _server_span(handler_call_details)
+            error = None
+            try:
+                with trace.use_span(span, end_on_exit=False):
+                    return await handler.unary_unary(request, context)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _finish(span, context, error)
+
+        async def unary_stream(request, context):
+            span = _server_span(handler_call_details)
+            error = None
+            try:
+                # each handler task runs in its own context copy, so attaching here is safe across awaits
+                with trace.use_span(span, end_on_exit=False):
+                    async for response in handler.unary_stream(request, context):
+                        yield response
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _finish(span, context, error)
+
+        return _rebuild(handler, unary_unary=unary_unary, unary_stream=unary_stream)
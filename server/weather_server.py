@@ -1,89 +1,391 @@
 # implement the service defined in weather.proto + starts the server
-import os, sys
+import os, sys, signal, threading, contextvars
 sys.path.append(os.path.join(os.path.dirname(__file__), "generated"))
 
 import grpc
 from concurrent import futures
 
-import requests
-
 from .auth import ApiKeyInterceptor
-from .owm_client import OpenWeatherMapClient
-from .config import GRPC_PORT
+from . import metrics, tracing
+from .owm_client import OpenWeatherMapClient, HTTP_ERRORS, is_upstream_failure
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .config import (
+    GRPC_PORT, GRPC_MAX_WORKERS, CACHE_TTL_S, CACHE_MAX_ENTRIES,
+    HISTORY_BATCH_SIZE, HISTORY_MAX_BATCH_SIZE,
+    BATCH_MAX_CITIES, BATCH_CONCURRENCY, SERVER_MODE, GRPC_SHUTDOWN_GRACE_S,
+    METRICS_PORT, METRICS_ADDR, TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_FILE,
+    OWM_BREAKER_FAILURES, OWM_BREAKER_RESET_S, OWM_BREAKER_HALF_OPEN_CALLS,
+    PREFETCH, PREFETCH_TOP_K, PREFETCH_INTERVAL_S, PREFETCH_MAX_CALLS_PER_MIN,
+    PREFETCH_HALF_LIFE_S, PREFETCH_MIN_SCORE, PREFETCH_MAX_TRACKED,
+    OWM_RATE_LIMIT_PER_MIN, OWM_RATE_LIMIT_BURST, OWM_RATE_LIMIT_BACKEND, OWM_RATE_LIMIT_MAX_WAIT_S,
+    OWM_RATE_LIMIT_BACKGROUND_RESERVE, RATE_LIMIT_COLLECTION, GEOCODE, GEOCODE_DIR,
+    GRPC_COMPRESSION, GRPC_KEEPALIVE_TIME_S, GRPC_KEEPALIVE_TIMEOUT_S, GRPC_KEEPALIVE_MIN_CLIENT_PING_S,
+    GRPC_MAX_MESSAGE_MB, GRPC_MAX_CONCURRENT_STREAMS,
+)
+from .cache import TTLCache
 from .dao import WeatherDAO
+from .geocode import GeoIndex, Lookup, StoredNames, canonical_city, make_lookup
+from .grpc_options import compression_options, keepalive_options, message_size_options
+from .prefetch import HotCities, PrefetchPlan, Prefetcher
+from .rate_limit import INTERACTIVE, BACKGROUND, LocalBucket, MongoBucket, RateLimiter, RateLimitedError
 
 import weather_pb2_grpc, weather_pb2 # type: ignore
 
 class WeatherService(weather_pb2_grpc.WeatherServiceServicer):
 
-    def __init__(self):
-        self.owm = OpenWeatherMapClient()
-        self.dao = WeatherDAO()
-
+    def __init__(self, owm=None, dao=None):
+        # owm/dao default to the real clients; benchmarks pass in-memory stand-ins
+        dao = dao or WeatherDAO()
+        # OWM call budget, None when OWM_RATE_LIMIT_PER_MIN is 0; the client charges its retries to it
+        self.limiter = _rate_limiter(getattr(dao, "db", None))
+        owm = owm or OpenWeatherMapClient(limiter=self.limiter)
+        self.owm = metrics.Timed(tracing.Traced(owm, "owm"), metrics.OWM_LATENCY)
+        self.dao = metrics.Timed(tracing.Traced(dao, "dao"), metrics.DAO_LATENCY)
+        self.cache = TTLCache(CACHE_TTL_S, CACHE_MAX_ENTRIES)
+        self.breaker = CircuitBreaker(OWM_BREAKER_FAILURES, OWM_BREAKER_RESET_S, OWM_BREAKER_HALF_OPEN_CALLS)
+        # shared by all batch calls, so the upstream fan-out is capped process-wide
+        self.batch_pool = futures.ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+        # request counts for the hot-city prefetcher, None when PREFETCH is off
+        self.prefetch = _prefetch_plan()
+        # city name -> OWM city id resolution, None when GEOCODE is off
+        self.geo = _geo_index()
+        # lookup key -> stored city name, so the stale fallback finds id and coordinate requests too
+        self.stored_names = StoredNames()
 
     def GetCurrentWeather(self, request, context):
-        city = (request.city or "").strip()
-        if not city:
-            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "City name is required.")
-        
         try:
-            raw = self.owm.get_current(city)
-            data = self.owm.parse(raw)
+            lookup = current_lookup(self.geo, request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        try:
+            data = self._fetch(lookup)
             saved = self.dao.save_snapshot(data)
-            return weather_pb2.GetCurrentWeatherResponse(
-                snapshot=weather_pb2.WeatherSnapshot(
-                    city=saved["city"],
-                    temperature_c=saved["temperature_c"],
-                    description=saved["description"],
-                    humidity=saved["humidity"],
-                    wind_speed=saved["wind_speed"],
-                    timestamp_ms=saved["timestamp_ms"],
-                )
-            )
-        except requests.HTTPError as http_err:
-            code = http_err.response.status_code
-            if code == 404:
-                context.abort(grpc.StatusCode.NOT_FOUND, "City not found")
-            elif code == 401:
-                context.abort(grpc.StatusCode.FAILED_PRECONDITION, "Bad/empty OWM_API_KEY")
-            else:
-                context.abort(grpc.StatusCode.UNAVAILABLE, f"Upstream error {code}")
+            return weather_pb2.GetCurrentWeatherResponse(snapshot=_snapshot(saved))
+        except Exception as e:
+            stale = self._stale(lookup, e)
+            if stale is not None:
+                return weather_pb2.GetCurrentWeatherResponse(snapshot=_snapshot(stale), stale=True)
+            context.abort(*_error_status(e))
+
+    def GetCurrentWeatherBatch(self, request, context):
+        cities = [(c or "").strip() for c in request.cities]
+        if not cities:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "At least one city is required.")
+        if len(cities) > BATCH_MAX_CITIES:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"At most {BATCH_MAX_CITIES} cities per batch.")
+
+        # one upstream fetch per distinct place, in parallel; aliases of one city share a fetch
+        lookups = [make_lookup(self.geo, city) if city else None for city in cities]
+        pending = {}
+        for lookup in lookups:
+            if lookup and lookup.key not in pending:
+                # copy_context: the pool thread's OWM span stays under this RPC's span
+                pending[lookup.key] = self.batch_pool.submit(contextvars.copy_context().run, self._fetch, lookup)
+
+        results, ok = [], {}
+        for city, lookup in zip(cities, lookups):
+            if not lookup:
+                results.append(weather_pb2.CityWeatherResult(
+                    city=city, status=grpc.StatusCode.INVALID_ARGUMENT.name, error="City name is required."))
+                continue
+            try:
+                data = pending[lookup.key].result()
+                ok.setdefault(lookup.key, (data, []))[1].append(len(results))
+                results.append(weather_pb2.CityWeatherResult(city=city, status=grpc.StatusCode.OK.name))
+            except Exception as e:
+                stale = self._stale(lookup, e)
+                if stale is not None:
+                    results.append(weather_pb2.CityWeatherResult(
+                        city=city, status=grpc.StatusCode.OK.name, snapshot=_snapshot(stale), stale=True))
+                    continue
+                code, details = _error_status(e)
+                results.append(weather_pb2.CityWeatherResult(city=city, status=code.name, error=details))
+
+        # a single insert_many for every successful city
+        try:
+            saved = self.dao.save_snapshots([data for data, _ in ok.values()])
         except Exception as e:
             context.abort(grpc.StatusCode.INTERNAL, str(e))
+        for (_, indexes), doc in zip(ok.values(), saved):
+            for i in indexes:
+                results[i].snapshot.CopyFrom(_snapshot(doc))
+        return weather_pb2.GetCurrentWeatherBatchResponse(results=results)
+
+    def _fetch(self, lookup: Lookup) -> dict:
+        if self.prefetch:
+            self.prefetch.hot.record(lookup, lookup.key)
+        raw = self.cache.get_or_load(lookup.key, lambda: self._get_upstream(lookup))
+        data = _parse(self.owm, raw, lookup)
+        self.stored_names.remember(lookup, data["city"])
+        return data
+
+    def _get_upstream(self, lookup: Lookup, priority: str = INTERACTIVE) -> dict:
+        # fails fast while the circuit is open, so worker threads are not parked on a dead upstream and no
+        # token is spent. the peek claims no half-open probe slot: a call then shed by the limiter must not
+        # hold one, so the token is taken before allow()
+        if self.breaker.is_open():
+            raise CircuitOpenError("OWM circuit open")
+        if self.limiter:
+            self.limiter.acquire(priority)
+        if not self.breaker.allow():
+            raise CircuitOpenError("OWM circuit open")
+        try:
+            raw = self.owm.get_current(lookup.city, **lookup.owm_params())
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return raw
+
+    def refresh(self, lookup: Lookup) -> None:
+        # prefetcher hook: a fresh OWM payload into the cache (kept until the next cycle) and the DAO
+        raw = self._get_upstream(lookup, BACKGROUND)
+        self.cache.put(lookup.key, raw, self.prefetch.cache_ttl_s())
+        data = _parse(self.owm, raw, lookup)
+        self.stored_names.remember(lookup, data["city"])
+        self.dao.save_snapshot(data)
+
+    def _stale(self, lookup: Lookup, e: Exception):
+        # latest stored snapshot when OWM is down, None for any other error or if nothing is stored
+        if not (isinstance(e, CircuitOpenError) or is_upstream_failure(e)):
+            return None
+        city = self.stored_names.label(lookup)
+        try:
+            return self.dao.latest_snapshot(city)
+        except Exception as dao_error:
+            print(f"[gRPC] WARNING: stale fallback for {city!r} failed: {dao_error}")
+            return None
 
     
     def GetWeatherHistory(self, request, context):
+        _, series, resolution = self._history(request, context)
+        return weather_pb2.GetWeatherHistoryResponse(
+            series = [_snapshot(doc) for doc in series],
+            resolution = resolution,
+        )
+
+    def GetWeatherHistoryColumns(self, request, context):
+        city, series, resolution = self._history(request, context)
+        return _columns(city, series, resolution)
+
+    def _history(self, request, context):
+        # (city, docs, resolution) of a GetWeatherHistoryRequest, raw or from rollups
+        city = self._validate_history(request, context)
+        if request.max_points < 0:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "max_points must be >= 0")
+        resolution = self.dao.history_resolution(city, request.from_ms, request.to_ms, request.max_points)
+        if resolution == "raw":
+            series = self.dao.fetch_series(city, request.from_ms, request.to_ms)
+        else:
+            series = self.dao.fetch_rollups(city, request.from_ms, request.to_ms, resolution)
+        return city, series, resolution
+
+    def StreamWeatherHistory(self, request, context):
+        city = self._validate_history(request, context)
+        batch_size = request.batch_size if request.batch_size > 0 else HISTORY_BATCH_SIZE
+        batch_size = min(batch_size, HISTORY_MAX_BATCH_SIZE)
+        for batch in self.dao.iter_series(city, request.from_ms, request.to_ms, batch_size):
+            yield weather_pb2.WeatherHistoryChunk(series=[_snapshot(doc) for doc in batch])
+
+    def GetWeatherAggregates(self, request, context):
+        city = self._validate_history(request, context)
+        bucket_ms = parse_bucket(request.bucket)
+        if bucket_ms is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid bucket, expected e.g. 5m, 1h, 1d")
+        buckets = self.dao.aggregate_series(city, request.from_ms, request.to_ms, bucket_ms)
+        return weather_pb2.GetWeatherAggregatesResponse(
+            bucket_ms=bucket_ms,
+            buckets=[weather_pb2.WeatherAggregate(**b) for b in buckets],
+        )
+
+    def close(self) -> None:
+        # flushes pending write-behind snapshots before the mongo client goes away
+        self.batch_pool.shutdown(wait=True)
+        self.dao.close()
+        self.owm.close()
+
+    def _validate_history(self, request, context) -> str:
         city = (request.city or "").strip()
         if not city:
             context.abort(grpc.StatusCode.INVALID_ARGUMENT, "City name is required.")
         if request.from_ms <= 0 or request.to_ms <= 0 or request.from_ms >= request.to_ms:
             context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid time range!")
-        series = self.dao.fetch_series(city, request.from_ms, request.to_ms)
-        return weather_pb2.GetWeatherHistoryResponse(
-            series = [
-                weather_pb2.WeatherSnapshot(
-                    city=doc["city"],
-                    temperature_c=doc["temperature_c"],
-                    description=doc["description"],
-                    humidity=doc["humidity"],
-                    wind_speed=doc["wind_speed"],
-                    timestamp_ms=doc["timestamp_ms"],
-                )
-                for doc in series
-            ]
-        )
+        # the name snapshots of an indexed city are stored under, whatever spelling was asked for
+        return canonical_city(self.geo, city)
 
-    
-def serve():
-    server = grpc.server(
-        futures.ThreadPoolExecutor(max_workers=10),
-        interceptors=[ApiKeyInterceptor()]
+
+def _prefetch_plan():
+    if not PREFETCH:
+        return None
+    hot = HotCities(PREFETCH_HALF_LIFE_S, PREFETCH_MAX_TRACKED)
+    return PrefetchPlan(hot, PREFETCH_TOP_K, PREFETCH_MIN_SCORE, PREFETCH_INTERVAL_S, PREFETCH_MAX_CALLS_PER_MIN)
+
+
+def _geo_index():
+    return GeoIndex(GEOCODE_DIR) if GEOCODE else None
+
+
+def current_lookup(index, request) -> Lookup:
+    """Lookup for a GetCurrentWeatherRequest, ValueError unless exactly one of city, city_id, coord is valid."""
+    city = (request.city or "").strip()
+    coord = request.coord if request.HasField("coord") else None
+    given = sum((bool(city), bool(request.city_id), coord is not None))
+    if given == 0:
+        raise ValueError("City name is required (or city_id / coord).")
+    if given > 1:
+        raise ValueError("Only one of city, city_id or coord may be set.")
+    if request.city_id < 0:
+        raise ValueError("city_id must be positive.")
+    if coord is not None and not (-90 <= coord.lat <= 90 and -180 <= coord.lon <= 180):
+        raise ValueError("coord out of range, expected lat in [-90, 90] and lon in [-180, 180].")
+    return make_lookup(index, city, request.city_id, coord)
+
+
+def _parse(owm, raw: dict, lookup: Lookup) -> dict:
+    # snapshots of an indexed city carry its canonical name, so history and the stale fallback find them
+    data = owm.parse(raw)
+    if lookup.name:
+        data["city"] = lookup.name
+    return data
+
+
+def _rate_limiter(db):
+    if OWM_RATE_LIMIT_PER_MIN <= 0:
+        return None
+    if OWM_RATE_LIMIT_BACKEND == "mongo":
+        bucket = MongoBucket(db[RATE_LIMIT_COLLECTION], OWM_RATE_LIMIT_PER_MIN, OWM_RATE_LIMIT_BURST)
+    elif OWM_RATE_LIMIT_BACKEND == "local":
+        bucket = LocalBucket(OWM_RATE_LIMIT_PER_MIN, OWM_RATE_LIMIT_BURST)
+    else:
+        raise ValueError(f"unknown OWM_RATE_LIMIT_BACKEND {OWM_RATE_LIMIT_BACKEND!r}, expected local or mongo")
+    return RateLimiter(bucket, OWM_RATE_LIMIT_MAX_WAIT_S, OWM_RATE_LIMIT_BACKGROUND_RESERVE)
+
+
+def _error_status(e: Exception):
+    # maps an upstream/internal failure to (grpc status, details)
+    if isinstance(e, HTTP_ERRORS):
+        code = e.response.status_code
+        if code == 404:
+            return grpc.StatusCode.NOT_FOUND, "City not found"
+        if code == 401:
+            return grpc.StatusCode.FAILED_PRECONDITION, "Bad/empty OWM_API_KEY"
+        return grpc.StatusCode.UNAVAILABLE, f"Upstream error {code}"
+    if isinstance(e, RateLimitedError):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED, str(e)
+    if isinstance(e, CircuitOpenError) or is_upstream_failure(e):
+        return grpc.StatusCode.UNAVAILABLE, f"Upstream unavailable: {e}"
+    return grpc.StatusCode.INTERNAL, str(e)
+
+
+BUCKET_UNITS_MS = {"s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+def parse_bucket(bucket: str):
+    # "5m" -> 300000, None if malformed
+    bucket = (bucket or "").strip().lower()
+    unit = BUCKET_UNITS_MS.get(bucket[-1:])
+    if unit is None or not bucket[:-1].isdigit() or int(bucket[:-1]) <= 0:
+        return None
+    return int(bucket[:-1]) * unit
+
+
+def _snapshot(doc: dict):
+    return weather_pb2.WeatherSnapshot(
+        city=doc["city"],
+        temperature_c=doc["temperature_c"],
+        description=doc["description"],
+        humidity=doc["humidity"],
+        wind_speed=doc["wind_speed"],
+        timestamp_ms=doc["timestamp_ms"],
+    )
+
+
+def _columns(city: str, docs: list, resolution: str):
+    # WeatherHistoryColumns of a series: delta-encoded timestamps, descriptions coded by first appearance
+    deltas, codes, description_code, prev = [], {}, [], 0
+    for doc in docs:
+        deltas.append(doc["timestamp_ms"] - prev)
+        prev = doc["timestamp_ms"]
+        description_code.append(codes.setdefault(doc["description"], len(codes)))
+    return weather_pb2.WeatherHistoryColumns(
+        city=docs[0]["city"] if docs else city,
+        resolution=resolution,
+        timestamp_delta_ms=deltas,
+        temperature_c=[doc["temperature_c"] for doc in docs],
+        humidity=[int(doc["humidity"]) for doc in docs],
+        wind_speed=[doc["wind_speed"] for doc in docs],
+        descriptions=list(codes),
+        description_code=description_code,
     )
-    weather_pb2_grpc.add_WeatherServiceServicer_to_server(WeatherService(), server)
+
+
+def _server_options(reuse_port: bool) -> list:
+    # grpc binds with SO_REUSEPORT by default on linux; prefork workers ask for it explicitly
+    options = [("grpc.so_reuseport", 1)] if reuse_port else []
+    options += compression_options(GRPC_COMPRESSION)
+    options += message_size_options(GRPC_MAX_MESSAGE_MB)
+    # clients (the gateway's GRPC_KEEPALIVE_TIME_S) may ping idle connections, at most every
+    # GRPC_KEEPALIVE_MIN_CLIENT_PING_S before getting GOAWAY, whether or not the server pings too
+    options += keepalive_options(GRPC_KEEPALIVE_TIME_S, GRPC_KEEPALIVE_TIMEOUT_S) or [
+        ("grpc.keepalive_permit_without_calls", 1),
+    ]
+    options.append(("grpc.http2.min_ping_interval_without_data_ms", int(GRPC_KEEPALIVE_MIN_CLIENT_PING_S * 1000)))
+    if GRPC_MAX_CONCURRENT_STREAMS > 0:
+        options.append(("grpc.max_concurrent_streams", GRPC_MAX_CONCURRENT_STREAMS))
+    return options
+
+
+def serve(mode: str = SERVER_MODE, metrics_port: int = METRICS_PORT, reuse_port: bool = False, ready=None,
+          service: WeatherService = None):
+    # ready: optional Event set once the server accepts calls (the prefork supervisor waits on it),
+    # service: a prebuilt WeatherService for thread mode (the load harness passes one on a non-mongo store)
+    if mode == "prefork":
+        from .prefork import supervise
+        supervise()
+        return
+    if mode == "aio":
+        import asyncio
+        from .aio_server import serve_aio
+        asyncio.run(serve_aio(metrics_port, reuse_port, ready))
+        return
+
+    provider = tracing.setup("weather-server", TRACE_EXPORTER, TRACE_SAMPLE_RATIO, TRACE_FILE)
+    executor = futures.ThreadPoolExecutor(max_workers=GRPC_MAX_WORKERS)
+    interceptors = [metrics.MetricsInterceptor(), ApiKeyInterceptor()]
+    if provider:
+        interceptors.insert(1, tracing.TracingInterceptor())
+    server = grpc.server(executor, interceptors=interceptors, options=_server_options(reuse_port))
+    service = service or WeatherService()
+    weather_pb2_grpc.add_WeatherServiceServicer_to_server(service, server)
+    metrics.watch_pool("grpc", executor)
+    metrics.watch_pool("batch", service.batch_pool)
+    metrics.watch_writer(getattr(service.dao, "writer", None))
+    metrics.start(service, metrics_port, METRICS_ADDR, reuse_port)
     server.add_insecure_port(f"[::]:{GRPC_PORT}")
-    print(f"[gRPC] WeatherService listening on port {GRPC_PORT}")
+    prefetcher = Prefetcher(service.prefetch, service.refresh) if service.prefetch else None
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    print(f"[gRPC] WeatherService listening on port {GRPC_PORT} (pid {os.getpid()})")
     server.start()
-    server.wait_for_termination()
+    if ready is not None:
+        ready.set()
+    if prefetcher:
+        prefetcher.start()
+        print(f"[gRPC] prefetching top {PREFETCH_TOP_K} cities every {PREFETCH_INTERVAL_S:g}s")
+    stop.wait()
+    print("[gRPC] shutting down")
+    if prefetcher:
+        prefetcher.close()
+    server.stop(GRPC_SHUTDOWN_GRACE_S).wait()
+    service.close()
+    if provider:
+        provider.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+# write-behind buffer for snapshots: callers enqueue, a background thread (or, for the grpc.aio server,
+# a task on its event loop) flushes with insert_many
+import asyncio
+import queue
+import threading
+import time
+from typing import List
+
+from pymongo.errors import PyMongoError
+
+
+class _FlushStats:
+    """Counters shared by both writers, read by stats() and the metrics collector."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.flushed_docs = 0
+        self.failed_docs = 0
+        self.sync_writes = 0
+        self.flush_ms_total = 0.0
+        self.flush_ms_max = 0.0
+        # set by metrics.watch_writer, called with each flush's duration in seconds
+        self.observe_flush = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "flushes": self.flushes,
+                "flushed_docs": self.flushed_docs,
+                "failed_docs": self.failed_docs,
+                "sync_writes": self.sync_writes,
+                "flush_ms_avg": (self.flush_ms_total / self.flushes) if self.flushes else 0.0,
+                "flush_ms_max": self.flush_ms_max,
+            }
+
+    def _record_flush(self, docs: int, failed: int, elapsed_ms: float) -> None:
+        with self._lock:
+            self.flushes += 1
+            self.flushed_docs += docs - failed
+            self.failed_docs += failed
+            self.flush_ms_total += elapsed_ms
+            self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+        if self.observe_flush is not None:
+            self.observe_flush(elapsed_ms / 1000)
+
+    def _record_sync_write(self) -> None:
+        with self._lock:
+            self.sync_writes += 1
+
+
+def _failed(e: PyMongoError, batch: List[dict]) -> int:
+    # ordered=False: the rest of the batch is still written
+    failed = len((getattr(e, "details", None) or {}).get("writeErrors", [])) or len(batch)
+    print(f"[dao] WARNING: write-behind flush lost {failed}/{len(batch)} snapshot(s): {e}")
+    return failed
+
+
+class WriteBehindWriter(_FlushStats):
+    def __init__(self, col, max_queue: int, flush_size: int, flush_interval_s: float, put_timeout_s: float):
+        super().__init__()
+        self.col = col
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        # submit() calls that saw _stop unset and have not finished their put yet; _run waits for them
+        self._submitting = 0
+        self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, doc: dict) -> None:
+        # backpressure: wait a little for room, then write inline so nothing is dropped
+        with self._lock:
+            queued = not self._stop.is_set()
+            if queued:
+                self._submitting += 1
+        if queued:
+            try:
+                self._queue.put(doc, timeout=self.put_timeout_s)
+                return
+            except queue.Full:
+                pass
+            finally:
+                with self._lock:
+                    self._submitting -= 1
+        self._record_sync_write()
+        self.col.insert_one(doc)
+
+    def close(self, timeout: float = 10.0) -> None:
+        # stop accepting, drain whatever is queued, then return
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._drained():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+
+    def _drained(self) -> bool:
+        # once stopped with no put in flight nothing more can be queued, so an empty queue stays empty
+        with self._lock:
+            if not self._stop.is_set() or self._submitting:
+                return False
+        return self._queue.empty()
+
+    def _next_batch(self) -> List[dict]:
+        # flush when flush_size docs are waiting or flush_interval_s after the first one arrived
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.flush_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set() and self._queue.empty():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[dict]) -> None:
+        t0 = time.perf_counter()
+        failed = 0
+        try:
+            self.col.insert_many(batch, ordered=False)
+        except PyMongoError as e:
+            failed = _failed(e, batch)
+        self._record_flush(len(batch), failed, (time.perf_counter() - t0) * 1000)
+
+
+class AsyncWriteBehindWriter(_FlushStats):
+    """asyncio twin of WriteBehindWriter for AsyncWeatherDAO; start() on the server's event loop."""
+
+    def __init__(self, col, max_queue: int, flush_size: int, flush_interval_s: float, put_timeout_s: float):
+        super().__init__()
+        self.col = col
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=max_queue)
+        self._closing = False
+        # submit() calls waiting for room that started before close(); _run waits for them
+        self._submitting = 0
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, doc: dict) -> None:
+        # same backpressure as the thread writer: a short wait for room, then an inline write
+        if not self._closing:
+            try:
+                self._queue.put_nowait(doc)
+                return
+            except asyncio.QueueFull:
+                pass
+            self._submitting += 1
+            try:
+                await asyncio.wait_for(self._queue.put(doc), self.put_timeout_s)
+                return
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._submitting -= 1
+        self._record_sync_write()
+        await self.col.insert_one(doc)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        # stop accepting, drain whatever is queued, then return
+        self._closing = True
+        if self._task is not None:
+            await asyncio.wait_for(self._task, timeout)
+
+    async def _run(self) -> None:
+        while not (self._closing and not self._submitting and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def _next_batch(self) -> List[dict]:
+        try:
+            batch = [await asyncio.wait_for(self._queue.get(), self.flush_interval_s)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.flush_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[dict]) -> None:
+        t0 = time.perf_counter()
+        failed = 0
+        try:
+            await self.col.insert_many(batch, ordered=False)
+        except PyMongoError as e:
+            failed = _failed(e, batch)
+        self._record_flush(len(batch), failed, (time.perf_counter() - t0) * 1000)
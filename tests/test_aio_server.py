@@ -0,0 +1,158 @@
+import asyncio
+
+import grpc
+import httpx
+import pytest
+
+from server.aio_server import AioWeatherService
+from server.auth import AioApiKeyInterceptor
+from server.cache import TTLCache
+from server.generated import weather_pb2
+
+class AbortExc(Exception):
+    def __init__(self, code, details):
+        self.code = code
+        self.details = details
+        super().__init__(f"{code.name}: {details}")
+
+class Ctx:
+    async def abort(self, code, details):
+        raise AbortExc(code, details)
+
+class FakeAsyncDAO:
+    def __init__(self): self.saved = []
+    async def save_snapshot(self, snap):
+        snap = {**snap, "timestamp_ms": 1234567890000}
+        self.saved.append(snap)
+        return snap
+    async def save_snapshots(self, snaps):
+        return [await self.save_snapshot(s) for s in snaps]
+    async def fetch_series(self, city, from_ms, to_ms):
+        return [{"city": city, "temperature_c": 10.0, "description": "ok", "humidity": 50, "wind_speed": 3.1, "timestamp_ms": from_ms + 1}]
+    async def iter_series(self, city, from_ms, to_ms, batch_size):
+        docs = await self.fetch_series(city, from_ms, to_ms) * 3
+        for i in range(0, len(docs), batch_size):
+            yield docs[i:i + batch_size]
+
+class FakeAsyncOWM:
+    def __init__(self): self.calls = []
+    async def get_current(self, city):
+        self.calls.append(city)
+        await asyncio.sleep(0.01)
+        if city == "NoWhere":
+            raise httpx.HTTPStatusError("404", request=httpx.Request("GET", "http://x"), response=httpx.Response(404))
+        return {"name": city, "main": {"temp": 12.3, "humidity": 60}, "weather": [{"description": "few clouds"}], "wind": {"speed": 4.2}}
+    @staticmethod
+    def parse(raw):
+        return {"city": raw["name"], "temperature_c": raw["main"]["temp"], "description": raw["weather"][0]["description"],
+                "humidity": raw["main"]["humidity"], "wind_speed": raw["wind"]["speed"]}
+
+def _service():
+    srv = AioWeatherService()
+    srv.dao = FakeAsyncDAO()
+    srv.owm = FakeAsyncOWM()
+    return srv
+
+def test_aio_current_weather_builds_snapshot():
+    srv = _service()
+    resp = asyncio.run(srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="London"), Ctx()))
+    assert resp.snapshot.city == "London"
+    assert resp.snapshot.timestamp_ms == 1234567890000
+
+def test_aio_current_weather_404_maps_to_not_found():
+    srv = _service()
+    with pytest.raises(AbortExc) as exc:
+        asyncio.run(srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="NoWhere"), Ctx()))
+    assert exc.value.code == grpc.StatusCode.NOT_FOUND
+
+def test_aio_concurrent_requests_share_one_upstream_call():
+    srv = _service()
+    async def run():
+        req = weather_pb2.GetCurrentWeatherRequest(city="Paris")
+        return await asyncio.gather(*(srv.GetCurrentWeather(req, Ctx()) for _ in range(10)))
+    responses = asyncio.run(run())
+    assert len(responses) == 10
+    assert srv.owm.calls == ["Paris"]
+
+def test_aio_batch_partial_failure():
+    srv = _service()
+    req = weather_pb2.GetCurrentWeatherBatchRequest(cities=["London", "NoWhere", "london"])
+    resp = asyncio.run(srv.GetCurrentWeatherBatch(req, Ctx()))
+    assert [r.status for r in resp.results] == ["OK", "NOT_FOUND", "OK"]
+    assert len(srv.dao.saved) == 1
+
+def test_aio_stream_history_batches():
+    srv = _service()
+    async def run():
+        req = weather_pb2.StreamWeatherHistoryRequest(city="Paris", from_ms=1_000, to_ms=2_000, batch_size=2)
+        return [c async for c in srv.StreamWeatherHistory(req, Ctx())]
+    chunks = asyncio.run(run())
+    assert [len(c.series) for c in chunks] == [2, 1]
+
+def test_aio_cache_load_error_reaches_all_waiters():
+    cache = TTLCache(ttl_s=60, max_entries=10)
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("down")
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load_async("x", boom) for _ in range(3)), return_exceptions=True)
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+def test_aio_cache_cancelled_leader_does_not_fail_followers():
+    cache = TTLCache(ttl_s=60, max_entries=10)
+    calls = []
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "payload"
+    async def run():
+        leader = asyncio.ensure_future(cache.get_or_load_async("x", slow))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(cache.get_or_load_async("x", slow)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader.cancelled(), results, cache.get("x")
+    assert asyncio.run(run()) == (True, ["payload", "payload"], "payload")
+    assert len(calls) == 1
+
+class _Details:
+    def __init__(self, metadata):
+        self.method = "/weather.v1.WeatherService/GetCurrentWeather"
+        self.invocation_metadata = metadata
+
+def test_aio_interceptor_denies_missing_key():
+    called = []
+    async def continuation(details):
+        called.append(details)
+    handler = asyncio.run(AioApiKeyInterceptor().intercept_service(continuation, _Details([])))
+    assert called == []
+    assert hasattr(handler, "unary_unary")
+
+def test_aio_serves_stale_snapshot_by_city_id_without_an_index():
+    from server.circuit_breaker import CircuitBreaker
+    srv = _service()
+    srv.geo = None
+    srv.cache = TTLCache(0, 10)
+    srv.breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=60)
+    async def latest_snapshot(city):
+        return srv.dao.saved[-1] if city == "Paris" else None
+    srv.dao.latest_snapshot = latest_snapshot
+    class IdOWM(FakeAsyncOWM):
+        down = False
+        async def get_current(self, city, **where):
+            if self.down:
+                raise httpx.ConnectError("refused")
+            return await super().get_current("Paris")
+    srv.owm = IdOWM()
+    request = weather_pb2.GetCurrentWeatherRequest(city_id=2988507)
+
+    async def run():
+        fresh = await srv.GetCurrentWeather(request, Ctx())
+        srv.owm.down = True
+        return fresh, [await srv.GetCurrentWeather(request, Ctx()) for _ in range(2)]
+    fresh, stale = asyncio.run(run())
+    assert fresh.snapshot.city == "Paris" and not fresh.stale
+    assert [(r.stale, r.snapshot.city) for r in stale] == [(True, "Paris"), (True, "Paris")]
+    assert srv.breaker.stats()["state"] == "open"
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from server.cache import TTLCache, city_key
+
+class FakeClock:
+    def __init__(self): self.now = 1000.0
+    def __call__(self): return self.now
+
+def test_city_key_normalizes():
+    assert city_key("  London ") == "london"
+    assert city_key(None) == ""
+
+def test_hit_and_miss_counters():
+    cache = TTLCache(ttl_s=60, max_entries=10)
+    calls = []
+    def load():
+        calls.append(1)
+        return {"name": "London"}
+    assert cache.get_or_load("london", load) == {"name": "London"}
+    assert cache.get_or_load("london", load) == {"name": "London"}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(ttl_s=10, max_entries=10, clock=clock)
+    cache.put("paris", "v1")
+    assert cache.get("paris") == "v1"
+    clock.now += 11
+    assert cache.get("paris") is None
+    assert cache.stats()["size"] == 0
+
+def test_lru_eviction_keeps_recently_used():
+    cache = TTLCache(ttl_s=60, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache(ttl_s=60, max_entries=10)
+    started = threading.Event()
+    calls = []
+    def slow_load():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "payload"
+
+    results = []
+    def worker():
+        results.append(cache.get_or_load("cluj", slow_load))
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert len(calls) == 1
+    assert results == ["payload"] * 8
+    assert cache.stats()["coalesced"] >= 1
+
+def test_load_errors_are_not_cached():
+    cache = TTLCache(ttl_s=60, max_entries=10)
+    def boom(): raise RuntimeError("upstream down")
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("x", boom)
+    assert cache.get_or_load("x", lambda: "ok") == "ok"
+
+def test_zero_ttl_disables_caching():
+    cache = TTLCache(ttl_s=0, max_entries=10)
+    calls = []
+    cache.get_or_load("x", lambda: calls.append(1) or "v")
+    cache.get_or_load("x", lambda: calls.append(1) or "v")
+    assert len(calls) == 2
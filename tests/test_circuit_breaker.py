@@ -0,0 +1,40 @@
+from server.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+class Clock:
+    def __init__(self): self.now = 0.0
+    def __call__(self): return self.now
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=10, clock=clock)
+    breaker.record_failure(); breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure(); breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1 and breaker.stats()["opened"] == 1
+
+def test_half_open_lets_limited_probes_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=10, half_open_max_calls=1, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+def test_failed_probe_reopens_for_another_timeout():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout_s=10, clock=clock)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now = 11
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    clock.now = 21
+    assert breaker.allow()
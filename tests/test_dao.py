@@ -2,6 +2,7 @@ import time
 import os
 import sys
 import importlib
+from types import SimpleNamespace
 
 os.environ["MONGO_URI"] = os.getenv("TEST_MONGO_URI", "mongodb://localhost:27017")
 os.environ["DB_NAME"] = "weatherdb_test"
@@ -12,7 +13,8 @@ sys.path.append(os.path.join(BASE_DIR, "server"))
 import server.dao as dao_module
 importlib.reload(dao_module)
 
-from server.dao import WeatherDAO
+from server.dao import LatestObservations, WeatherDAO, _plan_stages, _uses_index
+from server.migrate_timeseries import _timeseries_doc
 
 def test_save_and_fetch_snapshot():
     dao = WeatherDAO()
@@ -31,3 +33,157 @@ def test_save_and_fetch_snapshot():
     series = dao.fetch_series("London", t - 5_000, t + 5_000)
     assert len(series) >= 1
     assert any(p["timestamp_ms"] == t for p in series)
+
+def test_indexes_are_managed_declaratively():
+    dao = WeatherDAO()
+    dao.col.create_index([("city", 1), ("timestamp_ms", 1)])
+    dao.ensure_indexes()
+    names = set(dao.col.index_information())
+    assert "city_key_1_timestamp_ms_1" in names
+    assert "city_1_timestamp_ms_1" not in names
+
+def test_fetch_series_uses_index_scan():
+    dao = WeatherDAO()
+    assert dao.check_query_plan() is True
+
+def test_plan_stages_walks_nested_plans():
+    plan = {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+    assert _plan_stages(plan) == {"FETCH", "IXSCAN"}
+    assert _plan_stages({"stage": "COLLSCAN"}) == {"COLLSCAN"}
+
+def test_aggregate_series_buckets_in_mongo():
+    dao = WeatherDAO()
+    city = "AggTown"
+    dao.col.delete_many({"city_key": "aggtown"})
+    base = 1_700_000_000_000 - (1_700_000_000_000 % 3_600_000)
+    points = [(0, 10.0, "rain"), (60_000, 14.0, "rain"), (120_000, 12.0, "clear"), (3_600_000, 20.0, "clear")]
+    dao.col.insert_many([
+        {"city": city, "city_key": "aggtown", "temperature_c": t, "description": d,
+         "humidity": 50, "wind_speed": 2.0, "timestamp_ms": base + off}
+        for off, t, d in points
+    ])
+    buckets = dao.aggregate_series(city, base, base + 7_200_000, 3_600_000)
+    assert [b["bucket_start_ms"] for b in buckets] == [base, base + 3_600_000]
+    first = buckets[0]
+    assert first["count"] == 3
+    assert first["temperature_c"] == {"min": 10.0, "max": 14.0, "avg": 12.0}
+    assert first["description"] == "rain"
+
+def test_save_snapshots_inserts_batch_with_one_timestamp():
+    dao = WeatherDAO()
+    snaps = [
+        {"city": c, "temperature_c": 1.0, "description": "x", "humidity": 1, "wind_speed": 0.0}
+        for c in ("BatchA", "BatchB")
+    ]
+    saved = dao.save_snapshots(snaps)
+    assert [d["city_key"] for d in saved] == ["batcha", "batchb"]
+    assert saved[0]["timestamp_ms"] == saved[1]["timestamp_ms"]
+    assert dao.col.count_documents({"city_key": {"$in": ["batcha", "batchb"]}, "timestamp_ms": saved[0]["timestamp_ms"]}) == 2
+
+def _snap(city="DedupeCity", t=10.0, observed_ms=0):
+    return {"city": city, "temperature_c": t, "description": "clear sky", "humidity": 40,
+            "wind_speed": 1.0, "observed_ms": observed_ms}
+
+def test_latest_observations_uses_owm_dt_first():
+    latest = LatestObservations(window_ms=600_000)
+    first = {**_snap(observed_ms=1_000), "timestamp_ms": 0, "hits": 1}
+    assert latest.merge_or_put("x", _snap(observed_ms=1_000), 0, first) is None
+    merged = latest.merge_or_put("x", _snap(observed_ms=1_000), 5_000_000, {})
+    assert merged is first
+    assert first["hits"] == 2
+    assert latest.merge_or_put("x", _snap(observed_ms=2_000), 5_000_001, {"new": True}) is None
+
+def test_latest_observations_without_dt_uses_values_and_window():
+    latest = LatestObservations(window_ms=1_000)
+    first = {**_snap(), "timestamp_ms": 0, "hits": 1}
+    latest.merge_or_put("x", _snap(), 0, first)
+    assert latest.merge_or_put("x", _snap(), 500, {}) is first
+    second = {**_snap(t=11.0), "timestamp_ms": 600, "hits": 1}
+    assert latest.merge_or_put("x", _snap(t=11.0), 600, second) is None
+    # same values but outside the window count as a new observation
+    assert latest.merge_or_put("x", _snap(t=11.0), 5_000, {}) is None
+
+def test_dedupe_policy_skips_repeated_observation(monkeypatch):
+    monkeypatch.setattr(dao_module, "PERSIST_POLICY", "dedupe")
+    dao = WeatherDAO()
+    dao.col.delete_many({"city_key": "dedupecity"})
+    first = dao.save_snapshot(_snap(observed_ms=1_700_000_000_000))
+    again = dao.save_snapshot(_snap(observed_ms=1_700_000_000_000))
+    assert again["timestamp_ms"] == first["timestamp_ms"]
+    assert dao.col.count_documents({"city_key": "dedupecity"}) == 1
+    assert dao.col.find_one({"city_key": "dedupecity"})["hits"] == 2
+
+    dao.save_snapshot(_snap(t=12.0, observed_ms=1_700_000_600_000))
+    assert dao.col.count_documents({"city_key": "dedupecity"}) == 2
+
+class FakeDB:
+    def __init__(self, infos):
+        self.infos = infos
+        self.created, self.commands = [], []
+    def list_collections(self, filter):
+        return [i for i in self.infos if i["name"] == filter["name"]]
+    def create_collection(self, name, **opts):
+        self.created.append((name, opts))
+    def command(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+
+def test_timeseries_mode_creates_collection_with_ttl(monkeypatch):
+    monkeypatch.setattr(dao_module, "STORAGE_MODE", "timeseries")
+    monkeypatch.setattr(dao_module, "SNAPSHOT_TTL_S", 86_400)
+    db = FakeDB([])
+    assert WeatherDAO.ensure_collection(SimpleNamespace(db=db)) is True
+    name, opts = db.created[0]
+    assert opts["timeseries"] == {"timeField": "ts", "metaField": "city_key", "granularity": "minutes"}
+    assert opts["expireAfterSeconds"] == 86_400
+
+def test_timeseries_mode_updates_ttl_and_keeps_plain_collection(monkeypatch):
+    monkeypatch.setattr(dao_module, "STORAGE_MODE", "timeseries")
+    monkeypatch.setattr(dao_module, "SNAPSHOT_TTL_S", 3_600)
+    db = FakeDB([{"name": dao_module.COLLECTION, "type": "timeseries", "options": {"expireAfterSeconds": 60}}])
+    assert WeatherDAO.ensure_collection(SimpleNamespace(db=db)) is True
+    assert db.commands == [(("collMod", dao_module.COLLECTION), {"expireAfterSeconds": 3_600})]
+
+    plain = FakeDB([{"name": dao_module.COLLECTION, "type": "collection"}])
+    assert WeatherDAO.ensure_collection(SimpleNamespace(db=plain)) is False
+    assert plain.created == [] and plain.commands == []
+
+def test_timeseries_query_ranges_on_time_field():
+    q = WeatherDAO._series_query(" Paris ", 0, 60_000, timeseries=True)
+    assert q["city_key"] == "paris"
+    assert q["ts"]["$lt"].timestamp() == 60
+
+def test_uses_index_reads_timeseries_explain_shape():
+    plan = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}},
+                       {"$_internalUnpackBucket": {}}]}
+    assert _uses_index(plan) is True
+
+def test_migration_fills_time_field_for_old_docs():
+    doc = _timeseries_doc({"city": " Oslo", "timestamp_ms": 1_000, "temperature_c": 1.0})
+    assert doc["city_key"] == "oslo"
+    assert doc["ts"].timestamp() == 1
+
+def test_rollups_maintained_on_write_and_served_over_budget(monkeypatch):
+    monkeypatch.setattr(dao_module, "ROLLUPS", True)
+    dao = WeatherDAO()
+    for col in [dao.col, *dao.rollups.values()]:
+        col.delete_many({"city_key": "rolltown"})
+    for t in (10.0, 14.0):
+        dao.save_snapshot({"city": "RollTown", "temperature_c": t, "description": "clear sky", "humidity": 50, "wind_speed": 1.0})
+    hourly = dao.rollups["1h"].find_one({"city_key": "rolltown"})
+    assert hourly["count"] == 2
+    assert (hourly["temperature_c_min"], hourly["temperature_c_max"], hourly["temperature_c_sum"]) == (10.0, 14.0, 24.0)
+    assert hourly["descriptions"] == {"clear sky": 2}
+
+    now = int(time.time() * 1000)
+    assert dao.history_resolution("RollTown", now - 3_600_000, now + 1, 5) == "raw"
+    assert dao.history_resolution("RollTown", now - 3_600_000, now + 1, 1) == "1d"
+    points = dao.fetch_rollups("RollTown", now - 3_600_000, now + 1, "1d")
+    assert [p["temperature_c"] for p in points] == [12.0]
+
+def test_latest_snapshot_returns_newest_for_city():
+    dao = WeatherDAO()
+    dao.col.delete_many({"city_key": "stalecity"})
+    dao.col.insert_many([{"city": "StaleCity", "city_key": "stalecity", "timestamp_ms": ts, "temperature_c": ts / 1000}
+                         for ts in (1_000, 3_000, 2_000)])
+    assert dao.latest_snapshot(" stalecity ")["timestamp_ms"] == 3_000
+    assert dao.latest_snapshot("nowhere-city") is None
@@ -1,6 +1,8 @@
 from fastapi.testclient import TestClient
 from gateway.main import app
 import grpc
+import json
+from server.generated import weather_pb2
 
 # -- fake objects pt grpc -- 
 
@@ -14,12 +16,14 @@ class FakeSnapshot:
         self.timestamp_ms = ts
 
 class FakeCurrentResp:
-    def __init__(self, snapshot: FakeSnapshot):
+    def __init__(self, snapshot: FakeSnapshot, stale=False):
         self.snapshot = snapshot
+        self.stale = stale
 
 class FakeHistoryResp:
-    def __init__(self, series):
+    def __init__(self, series, resolution="raw"):
         self.series = series
+        self.resolution = resolution
 
 class DummyRpcError(grpc.RpcError):
     def __init__(self, code, details):
@@ -34,18 +38,49 @@ class FakeStub:
     def __init__(self, current_ok=True, history_ok=True):
         self.current_ok = current_ok
         self.history_ok = history_ok
-    def GetCurrentWeather(self, req, metadata=None, timeout=None):
+        self.history_calls = []
+    async def GetCurrentWeather(self, req, metadata=None, timeout=None):
         if not self.current_ok:
             raise DummyRpcError(grpc.StatusCode.NOT_FOUND, "City not found")
         return FakeCurrentResp(FakeSnapshot(city=req.city))
-    def GetWeatherHistory(self, req, metadata=None, timeout=None):
+    async def GetWeatherHistory(self, req, metadata=None, timeout=None):
         if not self.history_ok:
             raise DummyRpcError(grpc.StatusCode.INTERNAL, "db error")
+        # one point every 12h on fixed timestamps, so split/cached ranges return the same points
+        step = 12 * 3_600_000
+        first = req.from_ms + (-req.from_ms) % step
+        self.history_calls.append((req.from_ms, req.to_ms))
         return FakeHistoryResp([
-            FakeSnapshot(city=req.city, t=10.0, ts=req.from_ms + 1000),
-            FakeSnapshot(city=req.city, t=11.0, ts=req.to_ms - 1000),
+            FakeSnapshot(city=req.city, t=10.0 + i, ts=ts) for i, ts in enumerate(range(first, req.to_ms, step))
+        ], resolution="1h" if req.max_points else "raw")
+
+    async def StreamWeatherHistory(self, req, metadata=None, timeout=None):
+        # like a grpc.aio stream call: errors surface while iterating
+        if not self.history_ok:
+            raise DummyRpcError(grpc.StatusCode.INVALID_ARGUMENT, "bad range")
+        yield FakeHistoryResp([FakeSnapshot(city=req.city, ts=req.from_ms + i) for i in range(3)])
+        yield FakeHistoryResp([FakeSnapshot(city=req.city, ts=req.from_ms + 10)])
+
+    async def GetWeatherAggregates(self, req, metadata=None, timeout=None):
+        if req.bucket == "bad":
+            raise DummyRpcError(grpc.StatusCode.INVALID_ARGUMENT, "Invalid bucket")
+        stats = weather_pb2.AggregateStats(min=1.0, max=3.0, avg=2.0)
+        return weather_pb2.GetWeatherAggregatesResponse(bucket_ms=3_600_000, buckets=[
+            weather_pb2.WeatherAggregate(bucket_start_ms=req.from_ms, count=4, temperature_c=stats,
+                                         humidity=stats, wind_speed=stats, description="few clouds"),
         ])
 
+    async def GetCurrentWeatherBatch(self, req, metadata=None, timeout=None):
+        results = []
+        for city in req.cities:
+            if city == "NoWhere":
+                results.append(weather_pb2.CityWeatherResult(city=city, status="NOT_FOUND", error="City not found"))
+            else:
+                snap = weather_pb2.WeatherSnapshot(city=city, temperature_c=12.3, description="few clouds",
+                                                   humidity=60, wind_speed=3.1, timestamp_ms=1710000000000)
+                results.append(weather_pb2.CityWeatherResult(city=city, status="OK", snapshot=snap))
+        return weather_pb2.GetCurrentWeatherBatchResponse(results=results)
+
 # -- teste ---
 
 def test_gateway_current_ok():
@@ -58,6 +93,40 @@ def test_gateway_current_ok():
         assert "temperature_c" in data
         assert "timestamp_ms" in data
 
+def test_gateway_current_by_id_and_coordinates():
+    sent = []
+    class RecordingStub(FakeStub):
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            sent.append(req)
+            return FakeCurrentResp(FakeSnapshot(city="Paris"))
+    with TestClient(app) as client:
+        app.state.grpc_stub = RecordingStub()
+        assert client.get("/api/weather/current", params={"city_id": 2988507}).status_code == 200
+        assert client.get("/api/weather/current", params={"lat": 48.85, "lon": 2.35}).status_code == 200
+        assert client.get("/api/weather/current", params={"lat": 48.85}).status_code == 400
+        assert client.get("/api/weather/current", params={"lat": 95, "lon": 2.35}).status_code == 422
+    assert sent[0].city_id == 2988507 and not sent[0].HasField("coord")
+    assert (sent[1].coord.lat, sent[1].coord.lon) == (48.85, 2.35) and sent[1].city == ""
+    assert len(sent) == 2
+
+def test_gateway_history_columns_emits_arrays():
+    class ColumnsStub(FakeStub):
+        async def GetWeatherHistoryColumns(self, req, metadata=None, timeout=None):
+            assert req.max_points == 0
+            return weather_pb2.WeatherHistoryColumns(
+                city=req.city, resolution="raw", timestamp_delta_ms=[1_000, 600_000, 600_000],
+                temperature_c=[10.0, 11.5, 9.0], humidity=[50, 51, 52], wind_speed=[1.0, 2.0, 3.0],
+                descriptions=["rain", "clear"], description_code=[0, 1, 0])
+    with TestClient(app) as client:
+        app.state.grpc_stub = ColumnsStub()
+        r = client.get("/api/weather/history/columns", params={"city": "Paris", "from_ms": 1_000, "to_ms": 2_000_000})
+    assert r.status_code == 200, r.text
+    assert r.json() == {
+        "city": "Paris", "resolution": "raw", "timestamp_ms": [1_000, 601_000, 1_201_000],
+        "temperature_c": [10.0, 11.5, 9.0], "humidity": [50, 51, 52], "wind_speed": [1.0, 2.0, 3.0],
+        "descriptions": ["rain", "clear"], "description_code": [0, 1, 0],
+    }
+
 def test_gateway_current_not_found_maps_to_404():
     with TestClient(app) as client:
         app.state.grpc_stub = FakeStub(current_ok=False)
@@ -76,6 +145,26 @@ def test_gateway_history_defaults_last_24h_and_returns_points():
         assert len(series) == 2
         assert all(p["city"] == "London" for p in series)
 
+def test_gateway_history_serves_sealed_buckets_from_cache():
+    with TestClient(app) as client:
+        stub = app.state.grpc_stub = FakeStub(history_ok=True)
+        first = client.get("/api/weather/history", params={"city": "London"}).json()
+        calls = len(stub.history_calls)
+        again = client.get("/api/weather/history", params={"city": "London"}).json()
+        assert [p["timestamp_ms"] for p in again] == [p["timestamp_ms"] for p in first]
+        # only the open tail bucket goes back to grpc
+        assert len(stub.history_calls) == calls + 1
+        stats = client.get("/api/weather/history/cache").json()
+        assert stats["hits"] > 0 and stats["hit_ratio"] > 0
+
+def test_gateway_history_forwards_max_points_and_reports_resolution():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub(history_ok=True)
+        r = client.get("/api/weather/history", params={"city": "London", "max_points": 100})
+        assert r.status_code == 200, r.text
+        assert r.headers["X-History-Resolution"] == "1h"
+        assert client.get("/api/weather/history", params={"city": "London", "max_points": -1}).status_code == 422
+
 def test_gateway_history_invalid_range_400():
     with TestClient(app) as client:
         app.state.grpc_stub = FakeStub(history_ok=True)
@@ -83,9 +172,9 @@ def test_gateway_history_invalid_range_400():
         assert r.status_code == 400
 
 class FakeStubErr:
-    def GetCurrentWeather(self, req, metadata=None, timeout=None):
+    async def GetCurrentWeather(self, req, metadata=None, timeout=None):
         raise DummyRpcError(grpc.StatusCode.INTERNAL, "boom")
-    def GetWeatherHistory(self, req, metadata=None, timeout=None):
+    async def GetWeatherHistory(self, req, metadata=None, timeout=None):
         raise DummyRpcError(grpc.StatusCode.UNAVAILABLE, "downstream")
     
 def test_gateway_current_internal_maps_to_502():
@@ -95,3 +184,205 @@ def test_gateway_current_internal_maps_to_502():
         assert r.status_code == 502
         assert "INTERNAL" in r.json()["detail"]
 
+def test_gateway_history_stream_emits_ndjson():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub(history_ok=True)
+        r = client.get("/api/weather/history/stream", params={"city": "London", "from_ms": 1000, "to_ms": 5000})
+        assert r.status_code == 200, r.text
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert len(lines) == 4
+        assert [p["timestamp_ms"] for p in lines] == [1000, 1001, 1002, 1010]
+
+def test_gateway_history_stream_early_error_maps_status():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub(history_ok=False)
+        r = client.get("/api/weather/history/stream", params={"city": "London"})
+        assert r.status_code == 400
+
+def test_gateway_history_aggregates_ok():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub()
+        r = client.get("/api/weather/history/aggregates", params={"city": "London", "bucket": "1h", "from_ms": 3_600_000, "to_ms": 7_200_000})
+        assert r.status_code == 200, r.text
+        [b] = r.json()
+        assert b["bucket_start_ms"] == 3_600_000
+        assert b["count"] == 4
+        assert b["temperature_c"] == {"min": 1.0, "max": 3.0, "avg": 2.0}
+        assert b["description"] == "few clouds"
+
+def test_gateway_history_aggregates_bad_bucket_400():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub()
+        r = client.get("/api/weather/history/aggregates", params={"city": "London", "bucket": "bad"})
+        assert r.status_code == 400
+
+def test_gateway_current_batch_partial_failure():
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub()
+        r = client.get("/api/weather/current/batch", params=[("city", "London"), ("city", "NoWhere")])
+        assert r.status_code == 200, r.text
+        london, nowhere = r.json()
+        assert london["status"] == "OK"
+        assert london["snapshot"]["city"] == "London"
+        assert nowhere["status"] == "NOT_FOUND"
+        assert nowhere["snapshot"] is None
+
+def test_gateway_current_passes_stale_flag():
+    class StaleStub(FakeStub):
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            return FakeCurrentResp(FakeSnapshot(city=req.city), stale=True)
+    with TestClient(app) as client:
+        app.state.grpc_stub = StaleStub()
+        r = client.get("/api/weather/current", params={"city": "London"})
+        assert r.status_code == 200
+        assert r.json()["stale"] is True
+
+def test_gateway_fast_json_matches_response_model_bytes(monkeypatch):
+    # every endpoint's orjson body must be byte-identical to what the old response_model route emitted
+    # for the same payload: the object handed to _json is also returned from a response_model route
+    import gateway.main as gateway_main
+    from fastapi import FastAPI
+    from gateway.main import (CityWeatherResult, WeatherAggregatePoint, WeatherCurrentResponse,
+                              WeatherHistoryColumns, WeatherHistoryPoint)
+
+    payloads = []
+    encode = gateway_main._json
+    def recording_json(payload, *args, **kwargs):
+        payloads.append(payload)
+        return encode(payload, *args, **kwargs)
+    monkeypatch.setattr(gateway_main, "_json", recording_json)
+
+    def legacy_bytes(model, payload):
+        legacy = FastAPI()
+        @legacy.get("/x", response_model=model)
+        async def x():
+            return payload
+        return TestClient(legacy).get("/x").content
+
+    class OddStub(FakeStub):
+        # values whose text form could differ between encoders: non-ascii, long fractions, negatives, -0.0,
+        # small exponents, NaN and infinities (both encode them as null)
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            return FakeCurrentResp(FakeSnapshot(city="Iași", t=0.1 + 0.2, d="ploaie ușoară", h=0, w=-0.0))
+        async def GetWeatherHistory(self, req, metadata=None, timeout=None):
+            odd = [float("nan"), float("inf"), -float("inf"), 1e-7, 1.5e15, 123456789.123456789]
+            return FakeHistoryResp([FakeSnapshot(city="São Paulo", t=-3.25 + i / 3, w=odd[i % len(odd)] + i,
+                                                 ts=req.from_ms + i) for i in range(50)])
+        async def GetWeatherHistoryColumns(self, req, metadata=None, timeout=None):
+            return weather_pb2.WeatherHistoryColumns(
+                city="Zürich", resolution="1h", timestamp_delta_ms=[req.from_ms, 3_600_000, 1],
+                temperature_c=[-0.5, 1 / 3, float("nan")], humidity=[99, 100, 0], wind_speed=[12.75, 0.0, 1e-300],
+                descriptions=["céu limpo"], description_code=[0, 0, 0])
+
+    cases = [
+        ("/api/weather/current", {"city": "Iasi"}, WeatherCurrentResponse),
+        ("/api/weather/current/batch", [("city", "London"), ("city", "NoWhere")], list[CityWeatherResult]),
+        ("/api/weather/history", {"city": "x", "from_ms": 1_000, "to_ms": 2_000}, list[WeatherHistoryPoint]),
+        ("/api/weather/history", {"city": "x", "from_ms": 1_000, "to_ms": 2_000, "max_points": 5},
+         list[WeatherHistoryPoint]),
+        ("/api/weather/history/columns", {"city": "x", "from_ms": 1_000, "to_ms": 2_000}, WeatherHistoryColumns),
+        ("/api/weather/history/aggregates", {"city": "x", "from_ms": 3_600_000, "to_ms": 7_200_000},
+         list[WeatherAggregatePoint]),
+    ]
+    with TestClient(app) as client:
+        app.state.grpc_stub = OddStub()
+        for path, params, model in cases:
+            payloads.clear()
+            r = client.get(path, params=params)
+            assert r.status_code == 200, (path, r.text)
+            assert r.headers["content-type"] == "application/json"
+            assert len(payloads) == 1
+            assert r.content == legacy_bytes(model, payloads[0]), path
+
+    # the one known difference: exponent notation from 1e16 up (1e16 vs 1e+16), the values still agree
+    big = {"city": "x", "temperature_c": 1.5e16, "description": "d", "humidity": 1, "wind_speed": 1e300,
+           "timestamp_ms": 1}
+    fast, legacy = gateway_main._json([big]).body, legacy_bytes(list[WeatherHistoryPoint], [big])
+    assert fast != legacy and json.loads(fast) == json.loads(legacy)
+
+def test_gateway_current_etag_and_304_without_grpc():
+    import time
+    class CountingStub(FakeStub):
+        calls = 0
+        stale = False
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            self.calls += 1
+            return FakeCurrentResp(FakeSnapshot(city=req.city, ts=int(time.time() * 1000)), stale=self.stale)
+    with TestClient(app) as client:
+        stub = app.state.grpc_stub = CountingStub()
+        first = client.get("/api/weather/current", params={"city": "London"})
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"].startswith("max-age=")
+        assert 0 < int(first.headers["cache-control"].split("=")[1]) <= 300
+        assert "last-modified" in first.headers
+
+        again = client.get("/api/weather/current", params={"city": "London"}, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+        assert stub.calls == 1
+        # another city, or no validator, goes to the server
+        assert client.get("/api/weather/current", params={"city": "Paris"}, headers={"If-None-Match": etag}).status_code == 200
+        assert stub.calls == 2
+
+        stub.stale = True
+        stale = client.get("/api/weather/current", params={"city": "Rome"})
+        assert stale.headers["cache-control"] == "no-cache"
+        client.get("/api/weather/current", params={"city": "Rome"}, headers={"If-None-Match": stale.headers["etag"]})
+        assert stub.calls == 4
+        assert client.get("/api/http-cache").json()["not_modified_without_grpc"] == 1
+
+def test_gateway_history_cache_headers_for_sealed_and_open_ranges():
+    import time
+    from gateway.main import HISTORY_CACHE_TTL_S, HTTP_HISTORY_MAX_AGE_S
+    with TestClient(app) as client:
+        app.state.grpc_stub = FakeStub(history_ok=True)
+        sealed = client.get("/api/weather/history", params={"city": "London", "from_ms": 1_000, "to_ms": 200_000_000})
+        assert sealed.headers["cache-control"] == f"max-age={int(HISTORY_CACHE_TTL_S)}"
+        assert sealed.headers["x-history-resolution"] == "raw"
+        now_ms = int(time.time() * 1000)
+        open_range = client.get("/api/weather/history", params={"city": "London", "from_ms": now_ms - 86_400_000})
+        assert open_range.headers["cache-control"] == f"max-age={int(HTTP_HISTORY_MAX_AGE_S)}"
+        # the same body revalidates by date too
+        r = client.get("/api/weather/history", params={"city": "London", "from_ms": 1_000, "to_ms": 200_000_000},
+                       headers={"If-Modified-Since": sealed.headers["last-modified"]})
+        assert r.status_code == 304
+
+        # a fresh current snapshot for the city may have been stored: its history is asked from the server again
+        open_params = {"city": "London", "from_ms": now_ms - 86_400_000}
+        revalidate = {"If-None-Match": open_range.headers["etag"]}
+        assert client.get("/api/weather/history", params=open_params, headers=revalidate).status_code == 304
+        before = client.get("/api/http-cache").json()
+        client.get("/api/weather/current", params={"city": "London"})
+        assert client.get("/api/weather/history", params=open_params, headers=revalidate).status_code == 304
+        after = client.get("/api/http-cache").json()
+        assert after["revalidations"] == before["revalidations"] + 1
+        assert after["not_modified_without_grpc"] == before["not_modified_without_grpc"]
+
+def test_gateway_channel_options_follow_config(monkeypatch):
+    import gateway.main as gateway_main
+    assert ("grpc.default_compression_algorithm", int(grpc.Compression.Gzip)) not in gateway_main._channel_options()
+    monkeypatch.setattr(gateway_main, "GRPC_COMPRESSION", "gzip")
+    monkeypatch.setattr(gateway_main, "GRPC_KEEPALIVE_TIME_S", 30)
+    monkeypatch.setattr(gateway_main, "GRPC_MAX_MESSAGE_MB", -1)
+    options = dict(gateway_main._channel_options())
+    assert options["grpc.default_compression_algorithm"] == int(grpc.Compression.Gzip)
+    assert options["grpc.keepalive_time_ms"] == 30_000 and options["grpc.keepalive_permit_without_calls"] == 1
+    assert options["grpc.max_receive_message_length"] == -1
+
+def test_gateway_current_by_id_invalidates_history_of_resolved_city():
+    import time
+    class ResolvingStub(FakeStub):
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            # the server resolves the id (or coordinates) to the city name history is stored under
+            return FakeCurrentResp(FakeSnapshot(city="London", ts=int(time.time() * 1000)))
+    with TestClient(app) as client:
+        app.state.grpc_stub = ResolvingStub(history_ok=True)
+        params = {"city": "london", "from_ms": int(time.time() * 1000) - 86_400_000}
+        first = client.get("/api/weather/history", params=params)
+        revalidate = {"If-None-Match": first.headers["etag"]}
+        before = client.get("/api/http-cache").json()
+        client.get("/api/weather/current", params={"city_id": 2643743})
+        assert client.get("/api/weather/history", params=params, headers=revalidate).status_code == 304
+        after = client.get("/api/http-cache").json()
+        assert after["revalidations"] == before["revalidations"] + 1
+        assert after["not_modified_without_grpc"] == before["not_modified_without_grpc"]
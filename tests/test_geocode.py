@@ -0,0 +1,96 @@
+import os
+
+from server import build_geocode_index as builder
+from server.geocode import GeoIndex, Lookup, _SortedFile, canonical_city, make_lookup, normalize
+from server.generated import weather_pb2
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "server", "data")
+
+
+def _index(tmp_path, cities, aliases=None):
+    rows, alias_map = builder.build(cities, aliases or {})
+    builder.write(str(tmp_path), rows, alias_map)
+    return GeoIndex(str(tmp_path))
+
+
+def _city(city_id, name, country, lat=1.0, lon=2.0):
+    return {"id": city_id, "name": name, "country": country, "coord": {"lat": lat, "lon": lon}}
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert normalize("Cluj-Napoca") == "cluj napoca"
+    assert normalize("  cluj   napoca ") == "cluj napoca"
+    assert normalize("IAȘI") == "iasi"
+    assert normalize("São Paulo, BR") == "sao paulo br"
+    assert normalize(None) == ""
+
+
+def test_sorted_file_finds_first_last_and_missing_lines(tmp_path):
+    path = tmp_path / "ids.tsv"
+    path.write_bytes(b"".join(b"%d\tcity%d\n" % (i, i) for i in range(3, 3000, 7)))
+    f = _SortedFile(str(path), int)
+    assert f.find(3) == ["3", "city3"]
+    assert f.find(2999) == ["2999", "city2999"]
+    assert f.find(1501) == ["1501", "city1501"]
+    assert f.find(4) is None
+    assert f.find(1) is None and f.find(5000) is None
+    assert len(f) == len(range(3, 3000, 7))
+
+
+def test_empty_index_resolves_nothing(tmp_path):
+    index = _index(tmp_path, [])
+    assert len(index) == 0
+    assert index.resolve("London") is None
+    assert index.by_id(2643743) is None
+
+
+def test_aliases_spellings_and_country(tmp_path):
+    index = _index(tmp_path, [
+        _city(681290, "Cluj-Napoca", "RO"),
+        _city(2988507, "Paris", "FR"),
+        _city(4717560, "Paris", "US"),
+        _city(675810, "Iași", "RO"),
+    ], {"klausenburg": 681290})
+    for spelling in ("Cluj-Napoca", "cluj napoca ", "ClujNapoca", "Klausenburg", "cluj-napoca, ro"):
+        assert index.resolve(spelling).id == 681290, spelling
+    assert index.resolve("iasi").name == "Iași"
+    # the first city in the list owns a shared name, the country picks the other one
+    assert index.resolve("Paris").country == "FR"
+    assert index.resolve("Paris,US").id == 4717560
+    assert index.resolve("Nowhere") is None
+    assert index.by_id(4717560).lat == 1.0
+
+
+def test_explicit_alias_must_point_at_a_known_city(tmp_path):
+    try:
+        builder.build([_city(1, "A", "XX")], {"b": 2})
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "b" in str(e)
+
+
+def test_make_lookup_keys():
+    index = GeoIndex(DATA_DIR)
+    by_alias = make_lookup(index, "Klausenburg")
+    assert by_alias == Lookup("id:681290", city="Klausenburg", city_id=681290, name="Cluj-Napoca")
+    assert by_alias.owm_params() == {"city_id": 681290}
+    assert make_lookup(index, city_id=681290).key == by_alias.key
+    assert make_lookup(index, city_id=1).name == ""
+
+    coord = make_lookup(index, coord=weather_pb2.Coordinates(lat=-0.001, lon=23.6049))
+    assert coord.key == "coord:0.00,23.60"
+    assert coord.owm_params() == {"lat": 0.0, "lon": 23.6}
+
+    # unknown names, or no index at all, fall back to the plain city key
+    assert make_lookup(index, " Atlantis ").key == "atlantis"
+    assert make_lookup(None, "Cluj").key == "cluj"
+    assert canonical_city(index, "cluj") == "Cluj-Napoca"
+    assert canonical_city(None, "cluj") == "cluj"
+
+
+def test_bundled_index_is_built_from_bundled_sources(tmp_path):
+    rows, aliases = builder.build(builder.load_cities(os.path.join(DATA_DIR, "cities.json")),
+                                  builder.load_aliases(os.path.join(DATA_DIR, "aliases.tsv")))
+    builder.write(str(tmp_path), rows, aliases)
+    for name in ("cities.tsv", "city_aliases.tsv"):
+        assert (tmp_path / name).read_bytes() == open(os.path.join(DATA_DIR, name), "rb").read(), name
@@ -0,0 +1,57 @@
+from concurrent import futures
+
+import grpc
+import pytest
+
+from server import weather_server
+from server.grpc_options import compression, compression_options, keepalive_options, message_size_options
+from server.generated import weather_pb2, weather_pb2_grpc
+
+class Echo(weather_pb2_grpc.WeatherServiceServicer):
+    def GetWeatherHistory(self, request, context):
+        return weather_pb2.GetWeatherHistoryResponse(resolution="raw", series=[
+            weather_pb2.WeatherSnapshot(city=request.city, description="few clouds", timestamp_ms=i)
+            for i in range(2_000)
+        ])
+
+def test_compression_names_and_sizes():
+    assert compression(" GZIP ") == grpc.Compression.Gzip
+    assert compression_options("none") == []
+    assert compression_options("deflate") == [("grpc.default_compression_algorithm", int(grpc.Compression.Deflate))]
+    with pytest.raises(ValueError):
+        compression("brotli")
+    assert message_size_options(-1) == [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1)]
+    assert dict(message_size_options(16))["grpc.max_receive_message_length"] == 16 * 1024 * 1024
+    assert keepalive_options(0, 20) == []
+    assert dict(keepalive_options(30, 5))["grpc.keepalive_time_ms"] == 30_000
+
+def test_server_options_follow_config(monkeypatch):
+    monkeypatch.setattr(weather_server, "GRPC_COMPRESSION", "gzip")
+    monkeypatch.setattr(weather_server, "GRPC_KEEPALIVE_TIME_S", 60)
+    monkeypatch.setattr(weather_server, "GRPC_MAX_CONCURRENT_STREAMS", 200)
+    options = weather_server._server_options(True)
+    keys = [key for key, _ in options]
+    assert len(keys) == len(set(keys))
+    options = dict(options)
+    assert options["grpc.so_reuseport"] == 1
+    assert options["grpc.default_compression_algorithm"] == int(grpc.Compression.Gzip)
+    assert options["grpc.keepalive_time_ms"] == 60_000 and options["grpc.keepalive_permit_without_calls"] == 1
+    assert options["grpc.max_concurrent_streams"] == 200
+
+def test_compressed_server_and_small_message_cap(monkeypatch):
+    monkeypatch.setattr(weather_server, "GRPC_COMPRESSION", "gzip")
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1), options=weather_server._server_options(False))
+    weather_pb2_grpc.add_WeatherServiceServicer_to_server(Echo(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        request = weather_pb2.GetWeatherHistoryRequest(city="Cluj")
+        with grpc.insecure_channel(f"127.0.0.1:{port}", options=compression_options("deflate")) as channel:
+            assert len(weather_pb2_grpc.WeatherServiceStub(channel).GetWeatherHistory(request).series) == 2_000
+        # the response is larger than a 0.01 MB receive cap once decompressed
+        with grpc.insecure_channel(f"127.0.0.1:{port}", options=message_size_options(0.01)) as channel:
+            with pytest.raises(grpc.RpcError) as err:
+                weather_pb2_grpc.WeatherServiceStub(channel).GetWeatherHistory(request)
+            assert err.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    finally:
+        server.stop(0)
@@ -0,0 +1,67 @@
+import asyncio
+
+from gateway.history_cache import HistoryCache
+
+HOUR_MS = 3_600_000
+
+class Clock:
+    def __init__(self, now_s): self.now_s = now_s
+    def __call__(self): return self.now_s
+
+def _points(city, from_ms, to_ms, step=HOUR_MS // 2):
+    first = from_ms + (-from_ms) % step
+    return [{"city": city, "description": "clear", "timestamp_ms": ts} for ts in range(first, to_ms, step)]
+
+class Fetcher:
+    def __init__(self): self.calls = []
+    async def __call__(self, from_ms, to_ms):
+        self.calls.append((from_ms, to_ms))
+        return _points("Oslo", from_ms, to_ms)
+
+def _cache(clock, max_bytes=10**6):
+    return HistoryCache(HOUR_MS, ttl_s=3600, max_bytes=max_bytes, seal_grace_ms=0, clock=clock)
+
+def test_sealed_buckets_cached_and_tail_fetched_fresh():
+    clock = Clock(10 * 3600 + 1800)        # half way through hour 10
+    cache, fetch = _cache(clock), Fetcher()
+    from_ms, to_ms = 2 * HOUR_MS + 100, int(clock() * 1000)
+    first = asyncio.run(cache.get_range("Oslo", from_ms, to_ms, fetch))
+    # one fetch for the 8 sealed buckets (2h..10h), one for the open tail
+    assert fetch.calls == [(2 * HOUR_MS, 10 * HOUR_MS), (10 * HOUR_MS, to_ms)]
+    assert first == _points("Oslo", from_ms, to_ms)
+
+    fetch.calls.clear()
+    again = asyncio.run(cache.get_range(" oslo ", from_ms, to_ms, fetch))
+    assert again == first
+    assert fetch.calls == [(10 * HOUR_MS, to_ms)]
+    assert cache.stats()["hits"] == 8 and cache.stats()["misses"] == 8
+
+def test_missing_buckets_are_fetched_in_runs():
+    clock = Clock(10 * 3600)
+    cache, fetch = _cache(clock), Fetcher()
+    asyncio.run(cache.get_range("Oslo", 3 * HOUR_MS, 4 * HOUR_MS, fetch))
+    fetch.calls.clear()
+    asyncio.run(cache.get_range("Oslo", 1 * HOUR_MS, 6 * HOUR_MS, fetch))
+    assert fetch.calls == [(1 * HOUR_MS, 3 * HOUR_MS), (4 * HOUR_MS, 6 * HOUR_MS)]
+
+def test_byte_cap_evicts_least_recently_used():
+    clock = Clock(100 * 3600)
+    one_bucket = HistoryCache(HOUR_MS, 3600, 10**6, 0, clock)
+    asyncio.run(one_bucket.get_range("Oslo", 0, HOUR_MS, Fetcher()))
+    cap = one_bucket.stats()["bytes"] * 2
+    cache, fetch = _cache(clock, max_bytes=cap), Fetcher()
+    for h in range(3):
+        asyncio.run(cache.get_range("Oslo", h * HOUR_MS, (h + 1) * HOUR_MS, fetch))
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["bytes"] <= cap
+    fetch.calls.clear()
+    asyncio.run(cache.get_range("Oslo", 0, HOUR_MS, fetch))
+    assert fetch.calls == [(0, HOUR_MS)]
+
+def test_sealed_entries_expire_after_ttl():
+    clock = Clock(10 * 3600)
+    cache, fetch = _cache(clock), Fetcher()
+    asyncio.run(cache.get_range("Oslo", 0, HOUR_MS, fetch))
+    clock.now_s += 3601
+    asyncio.run(cache.get_range("Oslo", 0, HOUR_MS, fetch))
+    assert len(fetch.calls) == 2
@@ -0,0 +1,58 @@
+from email.utils import formatdate
+
+from gateway.http_cache import FreshnessMap, etag_of, not_modified
+
+class Clock:
+    def __init__(self, now_s): self.now_s = now_s
+    def __call__(self): return self.now_s
+
+def test_etag_follows_body():
+    assert etag_of(b'{"timestamp_ms":1}') == etag_of(b'{"timestamp_ms":1}')
+    assert etag_of(b'{"timestamp_ms":1}') != etag_of(b'{"timestamp_ms":2}')
+
+def test_not_modified_by_etag_and_date():
+    fresh = FreshnessMap(10, clock=Clock(1_000)).put("/x", b"body", last_modified_ms=900_500, max_age_s=60)
+    assert not_modified({"if-none-match": fresh.etag}, fresh)
+    assert not_modified({"if-none-match": f'"other", W/{fresh.etag}'}, fresh)
+    assert not_modified({"if-none-match": "*"}, fresh)
+    assert not not_modified({"if-none-match": '"other"'}, fresh)
+    # If-None-Match takes precedence over a matching date
+    assert not not_modified({"if-none-match": '"other"', "if-modified-since": formatdate(901, usegmt=True)}, fresh)
+    assert not_modified({"if-modified-since": formatdate(900, usegmt=True)}, fresh)
+    assert not not_modified({"if-modified-since": formatdate(899, usegmt=True)}, fresh)
+    assert not not_modified({"if-modified-since": "yesterday"}, fresh)
+
+def test_freshness_map_answers_until_expiry_and_evicts_lru():
+    clock = Clock(1_000)
+    freshness = FreshnessMap(2, clock=clock)
+    tag = freshness.put("/a", b"a", 0, max_age_s=60).etag
+    assert freshness.respond({}, "/a") is None
+    r = freshness.respond({"if-none-match": tag}, "/a")
+    assert r.status_code == 304 and r.headers["etag"] == tag and r.headers["cache-control"] == "max-age=60"
+    assert freshness.respond({"if-none-match": '"old"'}, "/a") is None
+
+    clock.now_s += 61
+    assert freshness.respond({"if-none-match": tag}, "/a") is None
+    assert freshness.stats()["not_modified_without_grpc"] == 1 and freshness.stats()["revalidations"] == 2
+
+    # zero max-age (stale data) is never remembered, the oldest URL makes room for new ones
+    freshness.put("/stale", b"s", 0, max_age_s=0)
+    for key in ("/b", "/c", "/d"):
+        freshness.put(key, key.encode(), 0, max_age_s=60)
+    assert freshness.fresh("/stale") is None and freshness.fresh("/b") is None
+    assert freshness.fresh("/d") is not None and freshness.stats()["entries"] == 2
+
+def test_freshness_map_drops_a_city_group():
+    freshness = FreshnessMap(10, clock=Clock(1_000))
+    for key, groups in (("/h?city=a", ["a"]), ("/c?city_id=1", ["", "a"]), ("/h?city=b", ["b"]),
+                        ("/h?city=alias", ["alias", "c"])):
+        freshness.put(key, key.encode(), 0, max_age_s=60, groups=groups)
+    freshness.invalidate("a")
+    freshness.invalidate("missing")
+    assert freshness.fresh("/h?city=a") is None and freshness.fresh("/c?city_id=1") is None
+    assert freshness.fresh("/h?city=b") is not None and freshness.stats()["entries"] == 2
+    # an entry asked for by one name and answered for another goes with either
+    freshness.invalidate("c")
+    assert freshness.fresh("/h?city=alias") is None
+    freshness.invalidate("alias")
+    assert freshness.stats()["entries"] == 1
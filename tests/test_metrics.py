@@ -0,0 +1,95 @@
+import asyncio
+
+import grpc
+from prometheus_client import Histogram, REGISTRY
+
+from server import metrics
+
+class Details:
+    def __init__(self, method): self.method = method
+
+class Ctx:
+    def __init__(self): self._code = None
+    def abort(self, code, details):
+        self._code = code
+        raise grpc.RpcError(details)
+    def code(self): return self._code
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_interceptor_counts_codes_and_latency():
+    def ok(request, context): return "pong"
+    def fail(request, context): context.abort(grpc.StatusCode.NOT_FOUND, "nope")
+    handlers = {"/weather.v1.WeatherService/MetricsOk": ok, "/weather.v1.WeatherService/MetricsFail": fail}
+    interceptor = metrics.MetricsInterceptor()
+    continuation = lambda d: grpc.unary_unary_rpc_method_handler(handlers[d.method])
+
+    handler = interceptor.intercept_service(continuation, Details("/weather.v1.WeatherService/MetricsOk"))
+    assert handler.unary_unary("ping", Ctx()) == "pong"
+    handler = interceptor.intercept_service(continuation, Details("/weather.v1.WeatherService/MetricsFail"))
+    try:
+        handler.unary_unary("ping", Ctx())
+    except grpc.RpcError:
+        pass
+
+    assert _sample("weather_grpc_handled_total", {"method": "MetricsOk", "code": "OK"}) == 1
+    assert _sample("weather_grpc_handled_total", {"method": "MetricsFail", "code": "NOT_FOUND"}) == 1
+    assert _sample("weather_grpc_handling_seconds_count", {"method": "MetricsOk"}) == 1
+
+def test_interceptor_times_streams_until_exhausted():
+    def stream(request, context): yield from range(3)
+    interceptor = metrics.MetricsInterceptor()
+    handler = interceptor.intercept_service(
+        lambda d: grpc.unary_stream_rpc_method_handler(stream), Details("/weather.v1.WeatherService/MetricsStream"))
+    responses = handler.unary_stream(None, Ctx())
+    assert _sample("weather_grpc_handled_total", {"method": "MetricsStream", "code": "OK"}) == 0
+    assert list(responses) == [0, 1, 2]
+    assert _sample("weather_grpc_handled_total", {"method": "MetricsStream", "code": "OK"}) == 1
+
+HIST = Histogram("weather_test_timed_seconds", "test", ["operation"])
+
+class Target:
+    value = 7
+    def plain(self): return 1
+    def gen(self): yield from (1, 2)
+    async def coro(self): return 3
+    async def agen(self):
+        yield 4
+
+def test_timed_proxy_covers_plain_generator_and_async_calls():
+    t = metrics.Timed(Target(), HIST)
+    assert t.value == 7
+    assert t.plain() == 1
+    assert list(t.gen()) == [1, 2]
+    assert asyncio.run(t.coro()) == 3
+
+    async def drain():
+        return [x async for x in t.agen()]
+    assert asyncio.run(drain()) == [4]
+    for op in ("plain", "gen", "coro", "agen"):
+        assert _sample("weather_test_timed_seconds_count", {"operation": op}) == 1
+
+def test_service_collector_exports_cache_and_writer_stats():
+    from types import SimpleNamespace
+    from server.cache import TTLCache
+    writer = SimpleNamespace(stats=lambda: {"queue_depth": 2, "flushes": 1, "flushed_docs": 5,
+                                            "failed_docs": 0, "sync_writes": 0})
+    service = SimpleNamespace(cache=TTLCache(60, 10), dao=SimpleNamespace(writer=writer))
+    service.cache.put("oslo", {})
+    names = {m.name: m.samples[0].value for m in metrics.ServiceCollector(service).collect()}
+    assert names["weather_cache_entries"] == 1
+    assert names["weather_write_behind_queue_depth"] == 2
+    assert names["weather_write_behind_flushed_docs"] == 5
+
+def test_watch_writer_observes_flush_latency():
+    from server.write_behind import WriteBehindWriter
+    class Col:
+        def insert_many(self, docs, ordered=True): pass
+    before = _sample("weather_write_behind_flush_seconds_count", {})
+    writer = WriteBehindWriter(Col(), max_queue=10, flush_size=1, flush_interval_s=0.01, put_timeout_s=0.01)
+    metrics.watch_writer(writer)
+    metrics.watch_writer(None)
+    writer.submit({"i": 1})
+    writer.close()
+    assert _sample("weather_write_behind_flush_seconds_count", {}) == before + 1
@@ -1,5 +1,7 @@
 import requests
-from server.owm_client import OpenWeatherMapClient
+
+import server.owm_client as owm_module
+from server.owm_client import OpenWeatherMapClient, RetryBudget
 
 def test_parse_response(monkeypatch):
     fake_json = {
@@ -14,3 +16,91 @@ def test_parse_response(monkeypatch):
     data = client.parse(fake_json)
     assert data["city"] == "London"
     assert data["temperature_c"] == 15
+
+class FakeResp:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+    def json(self): return self._payload
+    def close(self): pass
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            err = requests.HTTPError()
+            err.response = self
+            raise err
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = []
+    def get(self, url, params, timeout):
+        self.calls.append(timeout)
+        return FakeResp(self.statuses.pop(0), {"name": params["q"]})
+
+def _client(statuses, budget=None):
+    session = FakeSession(statuses)
+    client = OpenWeatherMapClient(session=session, budget=budget)
+    client._sleep = lambda s: None
+    return client, session
+
+def test_get_current_uses_session_with_timeouts(monkeypatch):
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    client, session = _client([200])
+    assert client.get_current("London") == {"name": "London"}
+    assert session.calls == [client.timeout]
+
+def test_get_current_retries_5xx_then_succeeds(monkeypatch):
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    client, session = _client([503, 429, 200])
+    client.max_retries = 2
+    assert client.get_current("Paris") == {"name": "Paris"}
+    assert len(session.calls) == 3
+
+def test_get_current_does_not_retry_404(monkeypatch):
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    client, session = _client([404, 200])
+    try:
+        client.get_current("Nowhere")
+        assert False, "expected HTTPError"
+    except requests.HTTPError as e:
+        assert e.response.status_code == 404
+    assert len(session.calls) == 1
+
+def test_retry_budget_caps_retries(monkeypatch):
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    budget = RetryBudget(ratio=0.0, min_per_s=0.0, capacity=1.0)
+    client, session = _client([500, 500, 500, 500, 500], budget=budget)
+    client.max_retries = 3
+    try:
+        client.get_current("X")
+    except requests.HTTPError:
+        pass
+    # one retry paid for by the budget, then the 500 is returned as is
+    assert len(session.calls) == 2
+    assert budget.try_spend() is False
+
+def test_parse_keeps_observation_time():
+    payload = {"name": "Cluj-Napoca", "dt": 1_700_000_000, "main": {"temp": 5, "humidity": 80},
+               "weather": [{"description": "mist"}]}
+    data = OpenWeatherMapClient.parse(payload)
+    assert data["observed_ms"] == 1_700_000_000_000
+    assert data["wind_speed"] == 0.0
+
+def test_is_upstream_failure_separates_outages_from_answers():
+    import httpx
+    from server.owm_client import is_upstream_failure
+    def http_error(code):
+        resp = requests.Response(); resp.status_code = code
+        return requests.HTTPError(response=resp)
+    assert is_upstream_failure(http_error(503))
+    assert is_upstream_failure(requests.Timeout())
+    assert is_upstream_failure(httpx.ConnectError("refused"))
+    assert not is_upstream_failure(http_error(404))
+    assert not is_upstream_failure(ValueError("bad json"))
+
+def test_get_current_by_id_and_coordinates(monkeypatch):
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    assert owm_module._params("Paris")["q"] == "Paris"
+    assert owm_module._params("", city_id=2988507) == {"id": 2988507, "appid": "k", "units": "metric"}
+    where = owm_module._params("", lat=48.85, lon=2.35)
+    assert (where["lat"], where["lon"]) == (48.85, 2.35) and "q" not in where
@@ -0,0 +1,76 @@
+import pytest
+
+from server.cache import TTLCache
+from server.prefetch import HotCities, PrefetchPlan, Prefetcher
+from server.weather_server import WeatherService
+from server.generated import weather_pb2
+from tests.test_weather_server import FakeDAO, FakeOWM, _Ctx
+
+class Clock:
+    def __init__(self, now=0.0): self.now = now
+    def __call__(self): return self.now
+
+def test_scores_decay_by_half_life_and_rank_hottest_first():
+    clock = Clock()
+    hot = HotCities(half_life_s=60, max_keys=100, clock=clock)
+    for _ in range(4):
+        hot.record("London")
+    hot.record(" london ")
+    hot.record("Paris")
+    clock.now = 60
+    hot.record("Paris")
+    top = hot.top(5)
+    assert [city for city, _ in top] == ["London", "Paris"]
+    assert top[0][1] == pytest.approx(2.5)
+    assert top[1][1] == pytest.approx(1.5)
+    assert hot.top(5, min_score=2) == [top[0]]
+
+def test_tracker_drops_coldest_keys_when_full():
+    clock = Clock()
+    hot = HotCities(half_life_s=60, max_keys=4, clock=clock)
+    for i, city in enumerate(["a", "b", "c", "d"]):
+        for _ in range(i + 1):
+            hot.record(city)
+    hot.record("e")
+    assert len(hot) == 3
+    assert {city for city, _ in hot.top(10)} == {"c", "d", "e"}
+
+def test_plan_caps_cycle_to_budget_and_aligns_to_interval():
+    hot = HotCities(half_life_s=60, max_keys=100, clock=Clock())
+    for city in "abcdefgh":
+        hot.record(city)
+    plan = PrefetchPlan(hot, top_k=20, min_score=0, interval_s=600, calls_per_min=0.5, wall_clock=Clock(600_150))
+    # 0.5 calls/min over a 10 minute cycle
+    assert plan.spacing_s == 120
+    assert len(plan.cities()) == 5
+    assert plan.seconds_to_next_cycle() == 450
+    assert plan.cache_ttl_s() > plan.interval_s
+
+def test_cycle_refreshes_hot_cities_and_counts_failures():
+    hot = HotCities(half_life_s=60, max_keys=100, clock=Clock())
+    for city in ["Oslo", "Oslo", "Rome", "Rome", "Lima"]:
+        hot.record(city)
+    refreshed = []
+    def refresh(city):
+        if city == "Rome":
+            raise RuntimeError("boom")
+        refreshed.append(city)
+    prefetcher = Prefetcher(PrefetchPlan(hot, top_k=5, min_score=2, interval_s=600, calls_per_min=0), refresh)
+    prefetcher.run_cycle()
+    assert refreshed == ["Oslo"]
+    stats = prefetcher.plan.stats()
+    assert (stats["cycles"], stats["refreshed"], stats["failed"]) == (1, 1, 1)
+
+def test_service_refresh_warms_cache_for_hot_city():
+    srv = WeatherService()
+    srv.dao, srv.owm = FakeDAO(), FakeOWM()
+    srv.cache = TTLCache(ttl_s=1, max_entries=10)
+    srv.prefetch = PrefetchPlan(HotCities(60, 100), top_k=5, min_score=0.5, interval_s=600, calls_per_min=0)
+    srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Berlin"), _Ctx())
+    assert [lookup.city for lookup in srv.prefetch.cities()] == ["Berlin"]
+
+    Prefetcher(srv.prefetch, srv.refresh).run_cycle()
+    assert srv.dao.saved[-1]["city"] == "Berlin"
+    # kept for the prefetch interval, not the 1s cache ttl
+    expires_at, _ = srv.cache._data["berlin"]
+    assert expires_at - srv.cache._clock() > 600
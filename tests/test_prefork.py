@@ -0,0 +1,110 @@
+import os
+import socket
+import time
+import urllib.request
+from concurrent import futures
+
+import grpc
+
+from server import prefork
+from server.prefork import Supervisor, worker_count
+from server.weather_server import _server_options
+
+# module-level so spawned workers can import them
+
+def _idle_worker(index, mode, ready):
+    ready.set()
+    time.sleep(60)
+
+def _crashing_worker(index, mode, ready):
+    ready.set()
+    raise SystemExit(3)
+
+class _NoStoreDAO:
+    writer = None
+
+def _real_worker(index, mode, ready):
+    # the real worker and serve() path, minus the mongo connection
+    from server import weather_server
+    weather_server.WeatherDAO = _NoStoreDAO
+    prefork._worker(index, mode, ready)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _scrape(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as resp:
+            return b"weather_grpc" in resp.read()
+    except OSError:
+        return False
+
+def _wait(predicate, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return predicate()
+
+def test_worker_count_defaults_to_cores():
+    assert worker_count(3) == 3
+    assert worker_count(0) == (os.cpu_count() or 1)
+
+def test_workers_can_share_a_port_with_reuseport():
+    port = _free_port()
+    servers = [grpc.server(futures.ThreadPoolExecutor(max_workers=1), options=_server_options(True)) for _ in range(2)]
+    try:
+        assert [s.add_insecure_port(f"127.0.0.1:{port}") for s in servers] == [port, port]
+    finally:
+        for s in servers:
+            s.stop(0)
+
+def test_rolling_restart_replaces_every_worker_and_shutdown_stops_them():
+    supervisor = Supervisor(2, "thread", target=_idle_worker)
+    supervisor.start()
+    try:
+        before = supervisor.pids()
+        assert len(before) == 2
+        supervisor.rolling_restart()
+        after = supervisor.pids()
+        assert len(after) == 2 and not set(before) & set(after)
+        assert all(slot.process.is_alive() for slot in supervisor.slots)
+    finally:
+        supervisor.shutdown()
+    assert not any(slot.process.is_alive() for slot in supervisor.slots)
+
+def test_crashed_worker_is_restarted_with_backoff(monkeypatch):
+    monkeypatch.setattr(prefork, "MAX_BACKOFF_S", 0.0)
+    supervisor = Supervisor(1, "thread", target=_crashing_worker)
+    supervisor.start()
+    try:
+        first = supervisor.pids()[0]
+        assert _wait(lambda: not supervisor.slots[0].process.is_alive())
+        supervisor.check()
+        assert supervisor.restarts == 1
+        assert supervisor.pids() and supervisor.pids()[0] != first
+        assert supervisor.slots[0].backoff_s == 0.0
+    finally:
+        supervisor.shutdown()
+
+def test_rolling_restart_of_real_workers_keeps_metrics_up(monkeypatch):
+    # old and new worker both bind METRICS_PORT + index while the replacement comes up
+    monkeypatch.setenv("GRPC_PORT", str(_free_port()))
+    metrics_port = _free_port()
+    monkeypatch.setenv("METRICS_PORT", str(metrics_port))
+    monkeypatch.setenv("METRICS_ADDR", "127.0.0.1")
+    monkeypatch.setenv("GRPC_SHUTDOWN_GRACE_S", "0")
+    monkeypatch.setattr(prefork, "READY_TIMEOUT_S", 15.0)
+    supervisor = Supervisor(1, "thread", target=_real_worker)
+    supervisor.start()
+    try:
+        assert _wait(lambda: _scrape(metrics_port))
+        old = supervisor.slots[0].process
+        supervisor.rolling_restart()
+        assert supervisor.slots[0].process is not old
+        assert not old.is_alive()
+        assert supervisor.slots[0].process.is_alive()
+        assert _wait(lambda: _scrape(metrics_port))
+    finally:
+        supervisor.shutdown()
@@ -0,0 +1,104 @@
+import pytest
+import grpc
+
+from server.rate_limit import INTERACTIVE, BACKGROUND, LocalBucket, MongoBucket, RateLimiter, RateLimitedError
+from server.dao import WeatherDAO
+from server.geocode import make_lookup
+from server.weather_server import WeatherService
+from server.generated import weather_pb2
+from tests.test_weather_server import FakeDAO, FakeOWM
+from tests.test_weather_server_errors import AbortExc, Ctx
+
+class Clock:
+    def __init__(self, now=0.0): self.now = now
+    def __call__(self): return self.now
+
+def test_local_bucket_spends_burst_then_refills_at_rate():
+    clock = Clock()
+    bucket = LocalBucket(rate_per_min=60, burst=2, clock=clock)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == pytest.approx(1.0)
+    clock.now = 1.0
+    assert bucket.take() == 0
+    # idle time refills up to burst, not beyond
+    clock.now = 100.0
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() > 0
+
+def test_background_calls_leave_the_reserve_for_interactive_ones():
+    bucket = LocalBucket(rate_per_min=60, burst=3, clock=Clock())
+    assert bucket.take(reserve=1) == 0
+    assert bucket.take(reserve=1) == 0
+    assert bucket.take(reserve=1) == pytest.approx(1.0)
+    assert bucket.take() == 0
+
+def test_mongo_bucket_is_shared_by_replicas():
+    col = WeatherDAO().db.rate_limits_test
+    col.delete_many({})
+    clock = Clock(1_000.0)
+    replica_a = MongoBucket(col, rate_per_min=60, burst=2, clock=clock)
+    replica_b = MongoBucket(col, rate_per_min=60, burst=2, clock=clock)
+    assert replica_a.take() == 0
+    assert replica_b.take() == 0
+    assert replica_a.take() == pytest.approx(1.0)
+    clock.now += 1
+    assert replica_b.take() == 0
+    assert col.count_documents({}) == 1
+
+def test_interactive_queues_briefly_background_is_shed():
+    clock = Clock()
+    limiter = RateLimiter(LocalBucket(rate_per_min=6000, burst=1, clock=clock), max_wait_s=0.5)
+    limiter.acquire(INTERACTIVE)
+    with pytest.raises(RateLimitedError):
+        limiter.acquire(BACKGROUND)
+    # the fake clock never refills, so the interactive caller gives up after its queueing budget
+    limiter.max_wait_s = 0.02
+    with pytest.raises(RateLimitedError):
+        limiter.acquire(INTERACTIVE)
+    clock.now = 1.0
+    limiter.acquire(INTERACTIVE)
+    assert limiter.stats() == {"granted": 2, "waited": 0, "shed": 2}
+
+def test_shed_call_maps_to_resource_exhausted():
+    srv = WeatherService()
+    srv.dao, srv.owm = FakeDAO(), FakeOWM()
+    srv.limiter = RateLimiter(LocalBucket(rate_per_min=1, burst=1, clock=Clock()), max_wait_s=0)
+    srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Oslo"), Ctx())
+    with pytest.raises(AbortExc) as exc:
+        srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Rome"), Ctx())
+    assert exc.value.code == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+def test_open_circuit_fails_fast_without_spending_a_token():
+    from server.circuit_breaker import CircuitBreaker, CircuitOpenError
+    srv = WeatherService()
+    srv.dao, srv.owm = FakeDAO(), FakeOWM()
+    srv.limiter = RateLimiter(LocalBucket(rate_per_min=60, burst=5, clock=Clock()), max_wait_s=0)
+    srv.breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=60, clock=Clock())
+    srv.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        srv._get_upstream(make_lookup(None, "Oslo"))
+    assert srv.limiter.stats()["granted"] == 0 and srv.breaker.stats()["rejected"] == 1
+
+def test_owm_retries_are_charged_to_the_limiter(monkeypatch):
+    import server.owm_client as owm_module
+    from server.owm_client import OpenWeatherMapClient
+    from tests.test_owm_client import FakeSession
+    monkeypatch.setattr(owm_module, "OWM_API_KEY", "k")
+    limiter = RateLimiter(LocalBucket(rate_per_min=60, burst=10, clock=Clock()), max_wait_s=0)
+    session = FakeSession([503, 429, 200])
+    client = OpenWeatherMapClient(session=session, limiter=limiter)
+    client._sleep, client.max_retries = (lambda s: None), 2
+    # the caller pays for the first attempt, the client for each retry
+    limiter.acquire(INTERACTIVE)
+    assert client.get_current("Paris") == {"name": "Paris"}
+    assert len(session.calls) == 3 and limiter.stats()["granted"] == 3
+
+    # no token left for a retry: the upstream error is returned instead of calling again
+    empty = RateLimiter(LocalBucket(rate_per_min=60, burst=1, clock=Clock()), max_wait_s=0)
+    empty.acquire(INTERACTIVE)
+    session = FakeSession([503, 200])
+    client = OpenWeatherMapClient(session=session, limiter=empty)
+    client._sleep = lambda s: None
+    with pytest.raises(Exception):
+        client.get_current("Paris")
+    assert len(session.calls) == 1 and empty.stats() == {"granted": 1, "waited": 0, "shed": 1}
@@ -0,0 +1,63 @@
+from server.rollups import RESOLUTIONS, pick_resolution, rollup_point, rollup_query, rollup_updates
+from server.backfill_rollups import raw_query
+
+HOUR_MS = RESOLUTIONS["1h"]
+DAY_MS = RESOLUTIONS["1d"]
+
+def _doc(ts, t=10.0, d="light rain"):
+    return {"city": "Oslo", "city_key": "oslo", "temperature_c": t, "description": d,
+            "humidity": 80, "wind_speed": 2.0, "timestamp_ms": ts}
+
+def test_rollup_updates_upsert_one_bucket_per_resolution():
+    updates = rollup_updates([_doc(DAY_MS + HOUR_MS + 5, d="a.b")])
+    assert set(updates) == set(RESOLUTIONS)
+    hourly = updates["1h"][0]._doc
+    assert updates["1h"][0]._filter == {"city_key": "oslo", "bucket_start_ms": DAY_MS + HOUR_MS}
+    assert updates["1d"][0]._filter["bucket_start_ms"] == DAY_MS
+    assert hourly["$inc"] == {"count": 1, "descriptions.a_b": 1, "temperature_c_sum": 10.0,
+                              "humidity_sum": 80, "wind_speed_sum": 2.0}
+    assert hourly["$min"]["temperature_c_min"] == 10.0 and hourly["$max"]["temperature_c_max"] == 10.0
+    assert updates["1h"][0]._upsert is True
+
+def test_rollup_point_averages_and_picks_dominant_description():
+    doc = {"city": "Oslo", "bucket_start_ms": HOUR_MS, "count": 4, "temperature_c_sum": 42.0,
+           "humidity_sum": 301, "wind_speed_sum": 8.0, "descriptions": {"rain": 1, "snow": 3}}
+    assert rollup_point(doc) == {"city": "Oslo", "temperature_c": 10.5, "description": "snow",
+                                 "humidity": 75, "wind_speed": 2.0, "timestamp_ms": HOUR_MS}
+
+def test_rollup_query_includes_bucket_containing_from():
+    q = rollup_query(" Oslo ", HOUR_MS + 10, 3 * HOUR_MS, "1h")
+    assert q == {"city_key": "oslo", "bucket_start_ms": {"$gte": HOUR_MS, "$lt": 3 * HOUR_MS}}
+
+def test_pick_resolution_finest_that_fits_budget():
+    week = 7 * DAY_MS
+    assert pick_resolution(100, 0, week, 0) == "raw"
+    assert pick_resolution(100, 0, week, 500) == "raw"
+    assert pick_resolution(1_000, 0, week, 500) == "1h"       # 168 hourly points
+    assert pick_resolution(1_000, 0, week, 100) == "1d"       # 7 daily points
+    assert pick_resolution(10**6, 0, 1000 * DAY_MS, 10) == "1d"
+
+def test_backfill_query_widens_to_whole_days():
+    q = raw_query("Oslo", DAY_MS + 5, 2 * DAY_MS + 5)
+    assert q == {"city_key": "oslo", "timestamp_ms": {"$gte": DAY_MS, "$lt": 3 * DAY_MS}}
+    assert raw_query() == {}
+
+def test_backfill_matches_incremental_rollups():
+    from server.dao import WeatherDAO
+    from server.rollups import backfill_pipeline, rollup_collection
+    db = WeatherDAO().db
+    raw, incremental = db.rollup_raw_test, db.rollup_incremental_test
+    backfilled = rollup_collection("rollup_raw_test", "1h")
+    for col in (raw, incremental, db[backfilled]):
+        col.delete_many({})
+    docs = [_doc(HOUR_MS + i, t=float(i), d=d)
+            for i, d in enumerate(["a.b", "a_b", "$rain", "rain", "", None, "$", "light rain"])]
+    raw.insert_many([dict(d) for d in docs])
+    incremental.bulk_write(rollup_updates(docs)["1h"])
+    raw.aggregate(backfill_pipeline({"city_key": "oslo"}, HOUR_MS, backfilled))
+
+    def bucket(col):
+        return col.find_one({"city_key": "oslo", "bucket_start_ms": HOUR_MS}, {"_id": 0})
+    expected = bucket(incremental)
+    assert expected["descriptions"] == {"a_b": 2, "rain": 2, "unknown": 3, "light rain": 1}
+    assert bucket(db[backfilled]) == expected
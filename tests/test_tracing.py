@@ -0,0 +1,100 @@
+import asyncio
+
+import grpc
+from fastapi.testclient import TestClient
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from server import tracing
+
+EXPORTER = InMemorySpanExporter()
+PROVIDER = TracerProvider()
+PROVIDER.add_span_processor(SimpleSpanProcessor(EXPORTER))
+trace.set_tracer_provider(PROVIDER)
+
+class Details:
+    def __init__(self, method, metadata=()):
+        self.method = method
+        self.invocation_metadata = metadata
+
+class Ctx:
+    def __init__(self): self._code = None
+    def abort(self, code, details):
+        self._code = code
+        raise grpc.RpcError(details)
+    def code(self): return self._code
+
+class FakeOWM:
+    def get_current(self, city): return {"name": city}
+    async def get_current_async(self, city): return {"name": city}
+    def boom(self): raise ValueError("bad payload")
+
+def _spans():
+    return {s.name: s for s in EXPORTER.get_finished_spans()}
+
+def test_traced_proxy_only_records_inside_a_sampled_span():
+    EXPORTER.clear()
+    owm = tracing.Traced(FakeOWM(), "owm")
+    owm.get_current("Oslo")
+    assert EXPORTER.get_finished_spans() == ()
+
+    with tracing.tracer.start_as_current_span("rpc"):
+        owm.get_current("Oslo")
+        asyncio.run(owm.get_current_async("Oslo"))
+        try:
+            owm.boom()
+        except ValueError:
+            pass
+    spans = _spans()
+    rpc = spans["rpc"].context.span_id
+    assert spans["owm.get_current"].parent.span_id == rpc
+    assert spans["owm.get_current_async"].parent.span_id == rpc
+    assert spans["owm.boom"].status.status_code == trace.StatusCode.ERROR
+
+def test_server_interceptor_continues_the_callers_trace():
+    EXPORTER.clear()
+    with tracing.tracer.start_as_current_span("gateway") as parent:
+        metadata = tracing.inject_metadata((("x-api-key", "k"),))
+    assert metadata[0] == ("x-api-key", "k")
+    assert any(k == "traceparent" for k, _ in metadata)
+
+    dao = tracing.Traced(FakeOWM(), "dao")
+    def handler(request, context):
+        dao.get_current("Oslo")
+        context.abort(grpc.StatusCode.NOT_FOUND, "nope")
+    intercepted = tracing.TracingInterceptor().intercept_service(
+        lambda d: grpc.unary_unary_rpc_method_handler(handler),
+        Details("/weather.v1.WeatherService/GetCurrentWeather", metadata),
+    )
+    try:
+        intercepted.unary_unary(None, Ctx())
+    except grpc.RpcError:
+        pass
+    spans = _spans()
+    server = spans["WeatherService/GetCurrentWeather"]
+    assert server.context.trace_id == parent.get_span_context().trace_id
+    assert server.parent.span_id == parent.get_span_context().span_id
+    assert server.status.status_code == trace.StatusCode.ERROR
+    assert spans["dao.get_current"].parent.span_id == server.context.span_id
+
+def test_gateway_sends_traceparent_to_grpc():
+    from gateway.main import app
+    from server.generated import weather_pb2
+
+    seen = {}
+    class Stub:
+        async def GetCurrentWeather(self, req, metadata=None, timeout=None):
+            seen.update(dict(metadata))
+            return weather_pb2.GetCurrentWeatherResponse(snapshot=weather_pb2.WeatherSnapshot(city=req.city))
+
+    with TestClient(app) as client:
+        app.state.grpc_stub = Stub()
+        app.state.tracer_provider = PROVIDER
+        EXPORTER.clear()
+        assert client.get("/api/weather/current", params={"city": "Oslo"}).status_code == 200
+        app.state.tracer_provider = None
+    trace_ids = {format(s.context.trace_id, "032x") for s in EXPORTER.get_finished_spans()
+                 if s.name == "GET /api/weather/current" and s.parent is None}
+    assert seen["traceparent"].split("-")[1] in trace_ids
@@ -1,5 +1,5 @@
 import grpc
-from server.weather_server import WeatherService
+from server.weather_server import WeatherService, parse_bucket
 from server.generated import weather_pb2
 
 class FakeDAO:
@@ -8,12 +8,35 @@ class FakeDAO:
         snap = {**snap, "timestamp_ms": snap.get("timestamp_ms", 1234567890000)}
         self.saved.append(snap)
         return snap
+    def save_snapshots(self, snaps):
+        return [self.save_snapshot(s) for s in snaps]
     def fetch_series(self, city, from_ms, to_ms):
         return [
             {"city": city, "temperature_c": 10.0, "description": "ok", "humidity": 50, "wind_speed": 3.1, "timestamp_ms": from_ms+1},
             {"city": city, "temperature_c": 11.0, "description": "ok", "humidity": 51, "wind_speed": 3.0, "timestamp_ms": to_ms-1},
         ]
 
+    def history_resolution(self, city, from_ms, to_ms, max_points):
+        return "1d" if max_points else "raw"
+
+    def fetch_rollups(self, city, from_ms, to_ms, resolution):
+        return [{"city": city, "temperature_c": 10.5, "description": "ok", "humidity": 50, "wind_speed": 3.0, "timestamp_ms": 0}]
+
+    def iter_series(self, city, from_ms, to_ms, batch_size):
+        docs = [
+            {"city": city, "temperature_c": 10.0, "description": "ok", "humidity": 50, "wind_speed": 3.1, "timestamp_ms": from_ms + i}
+            for i in range(5)
+        ]
+        for i in range(0, len(docs), batch_size):
+            yield docs[i:i + batch_size]
+
+    def aggregate_series(self, city, from_ms, to_ms, bucket_ms):
+        stats = {"min": 1.0, "max": 3.0, "avg": 2.0}
+        return [
+            {"bucket_start_ms": from_ms, "count": 3, "temperature_c": stats, "humidity": stats,
+             "wind_speed": stats, "description": "ok"},
+        ]
+
 class FakeOWM:
     def get_current(self, city):
         return {
@@ -54,3 +77,203 @@ def test_service_get_history_maps_points():
     resp = srv.GetWeatherHistory(req, _Ctx())
     assert len(resp.series) == 2
     assert all(pt.city == "Paris" for pt in resp.series)
+
+def test_service_get_history_uses_rollups_over_point_budget():
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    raw = srv.GetWeatherHistory(weather_pb2.GetWeatherHistoryRequest(city="Paris", from_ms=1_000, to_ms=2_000), _Ctx())
+    assert raw.resolution == "raw"
+    req = weather_pb2.GetWeatherHistoryRequest(city="Paris", from_ms=1_000, to_ms=2_000, max_points=1)
+    resp = srv.GetWeatherHistory(req, _Ctx())
+    assert resp.resolution == "1d"
+    assert [pt.temperature_c for pt in resp.series] == [10.5]
+
+def test_service_current_weather_served_from_cache():
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    calls = []
+    class CountingOWM(FakeOWM):
+        def get_current(self, city):
+            calls.append(city)
+            return super().get_current(city)
+    srv.owm = CountingOWM()
+    srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="London"), _Ctx())
+    srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city=" london "), _Ctx())
+    assert calls == ["London"]
+    assert srv.cache.stats()["hits"] == 1
+
+def test_service_stream_history_yields_batches():
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    req = weather_pb2.StreamWeatherHistoryRequest(city="Paris", from_ms=1_000, to_ms=2_000, batch_size=2)
+    chunks = list(srv.StreamWeatherHistory(req, _Ctx()))
+    assert [len(c.series) for c in chunks] == [2, 2, 1]
+    assert chunks[-1].series[0].timestamp_ms == 1_004
+
+def test_parse_bucket():
+    assert parse_bucket("5m") == 300_000
+    assert parse_bucket("1h") == 3_600_000
+    assert parse_bucket(" 1D ") == 86_400_000
+    assert parse_bucket("0h") is None
+    assert parse_bucket("h") is None
+    assert parse_bucket("5w") is None
+
+def test_service_get_aggregates_maps_buckets():
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    req = weather_pb2.GetWeatherAggregatesRequest(city="Paris", from_ms=3_600_000, to_ms=7_200_000, bucket="1h")
+    resp = srv.GetWeatherAggregates(req, _Ctx())
+    assert resp.bucket_ms == 3_600_000
+    [b] = resp.buckets
+    assert b.count == 3
+    assert b.temperature_c.avg == 2.0
+    assert b.description == "ok"
+
+def test_service_batch_returns_per_city_results():
+    import requests
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    class PartialOWM(FakeOWM):
+        def get_current(self, city):
+            if city == "NoWhere":
+                resp = requests.Response(); resp.status_code = 404
+                raise requests.HTTPError(response=resp)
+            return super().get_current(city)
+    srv.owm = PartialOWM()
+    req = weather_pb2.GetCurrentWeatherBatchRequest(cities=["London", "NoWhere", "Paris", "london", " "])
+    resp = srv.GetCurrentWeatherBatch(req, _Ctx())
+    statuses = [r.status for r in resp.results]
+    assert statuses == ["OK", "NOT_FOUND", "OK", "OK", "INVALID_ARGUMENT"]
+    assert resp.results[2].snapshot.city == "Paris"
+    assert resp.results[3].snapshot.city == "London"
+    # London is fetched and persisted once, in a single batch write
+    assert [s["city"] for s in srv.dao.saved] == ["London", "Paris"]
+
+def test_service_serves_stale_snapshot_while_owm_is_down():
+    import requests
+    from server.cache import TTLCache
+    from server.circuit_breaker import CircuitBreaker
+    srv = WeatherService()
+    srv.cache = TTLCache(0, 10)
+    srv.breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=60)
+    stored = {"city": "Paris", "temperature_c": 9.0, "description": "old", "humidity": 70, "wind_speed": 1.0,
+              "timestamp_ms": 1_000}
+    srv.dao = FakeDAO()
+    srv.dao.latest_snapshot = lambda city: stored if city == "Paris" else None
+    class DownOWM(FakeOWM):
+        def __init__(self): self.calls = 0
+        def get_current(self, city):
+            self.calls += 1
+            raise requests.ConnectionError("refused")
+    srv.owm = DownOWM()
+
+    for _ in range(2):
+        resp = srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Paris"), _Ctx())
+        assert resp.stale and resp.snapshot.description == "old"
+    # circuit is open now: served from the DAO without touching OWM
+    resp = srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Paris"), _Ctx())
+    assert resp.stale and srv.owm.calls == 2
+
+    batch = srv.GetCurrentWeatherBatch(weather_pb2.GetCurrentWeatherBatchRequest(cities=["Paris", "Rome"]), _Ctx())
+    assert [(r.status, r.stale) for r in batch.results] == [("OK", True), ("UNAVAILABLE", False)]
+    try:
+        srv.GetCurrentWeather(weather_pb2.GetCurrentWeatherRequest(city="Rome"), _Ctx())
+        assert False, "expected abort"
+    except grpc.RpcError:
+        pass
+
+def test_service_serves_stale_snapshot_by_city_id_without_an_index():
+    import requests
+    from server.cache import TTLCache
+    from server.circuit_breaker import CircuitBreaker
+    srv = WeatherService()
+    srv.geo = None
+    srv.cache = TTLCache(0, 10)
+    srv.breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=60)
+    srv.dao = FakeDAO()
+    srv.dao.latest_snapshot = lambda city: srv.dao.saved[-1] if city == "Paris" else None
+    class IdOWM(FakeOWM):
+        down = False
+        def get_current(self, city, **where):
+            if self.down:
+                raise requests.ConnectionError("refused")
+            assert where == {"city_id": 2988507}
+            return super().get_current("Paris")
+    srv.owm = IdOWM()
+    request = weather_pb2.GetCurrentWeatherRequest(city_id=2988507)
+    assert srv.GetCurrentWeather(request, _Ctx()).snapshot.city == "Paris"
+
+    # the first failure opens the circuit, the second call fails fast; both fall back to the stored Paris snapshot
+    srv.owm.down = True
+    for _ in range(2):
+        resp = srv.GetCurrentWeather(request, _Ctx())
+        assert resp.stale and resp.snapshot.city == "Paris"
+    assert srv.breaker.stats()["state"] == "open"
+
+def test_service_current_weather_by_id_coordinates_and_alias():
+    from server.geocode import GeoIndex
+    from tests.test_geocode import DATA_DIR
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    srv.geo = GeoIndex(DATA_DIR)
+    calls = []
+    class LookupOWM(FakeOWM):
+        def get_current(self, city, **where):
+            calls.append(where)
+            return super().get_current(city or "Somewhere")
+    srv.owm = LookupOWM()
+
+    for req in (weather_pb2.GetCurrentWeatherRequest(city="Klausenburg"),
+                weather_pb2.GetCurrentWeatherRequest(city="cluj napoca"),
+                weather_pb2.GetCurrentWeatherRequest(city_id=681290)):
+        assert srv.GetCurrentWeather(req, _Ctx()).snapshot.city == "Cluj-Napoca"
+    # every spelling and the id share one upstream call and one cache entry
+    assert calls == [{"city_id": 681290}]
+
+    req = weather_pb2.GetCurrentWeatherRequest(coord=weather_pb2.Coordinates(lat=46.77, lon=23.6))
+    srv.GetCurrentWeather(req, _Ctx())
+    assert calls[-1] == {"lat": 46.77, "lon": 23.6}
+
+    batch = srv.GetCurrentWeatherBatch(weather_pb2.GetCurrentWeatherBatchRequest(cities=["Cluj", "Paris"]), _Ctx())
+    assert [r.snapshot.city for r in batch.results] == ["Cluj-Napoca", "Paris"]
+    assert calls[-1] == {"city_id": 2988507}
+
+def test_service_current_weather_rejects_ambiguous_or_bad_lookups():
+    srv = WeatherService()
+    srv.dao, srv.owm = FakeDAO(), FakeOWM()
+    bad = [
+        weather_pb2.GetCurrentWeatherRequest(),
+        weather_pb2.GetCurrentWeatherRequest(city="Paris", city_id=2988507),
+        weather_pb2.GetCurrentWeatherRequest(city_id=-1),
+        weather_pb2.GetCurrentWeatherRequest(coord=weather_pb2.Coordinates(lat=91, lon=0)),
+    ]
+    class _AbortCtx:
+        def abort(self, code, details):
+            assert code == grpc.StatusCode.INVALID_ARGUMENT
+            raise grpc.RpcError(details)
+    for req in bad:
+        try:
+            srv.GetCurrentWeather(req, _AbortCtx())
+            assert False, f"expected abort for {req}"
+        except grpc.RpcError:
+            pass
+
+def test_service_history_columns_match_rows():
+    import itertools
+    srv = WeatherService()
+    srv.dao = FakeDAO()
+    descriptions = ["rain", "clear", "rain"]
+    srv.dao.fetch_series = lambda city, from_ms, to_ms: [
+        {"city": "Paris", "temperature_c": 10.0 + i, "description": d, "humidity": 50 + i, "wind_speed": 1.5,
+         "timestamp_ms": from_ms + 600_000 * i} for i, d in enumerate(descriptions)]
+    req = weather_pb2.GetWeatherHistoryRequest(city="Paris", from_ms=1_000, to_ms=2_000_000)
+    rows = srv.GetWeatherHistory(req, _Ctx())
+    cols = srv.GetWeatherHistoryColumns(req, _Ctx())
+    assert (cols.city, cols.resolution) == ("Paris", "raw")
+    assert list(cols.timestamp_delta_ms) == [1_000, 600_000, 600_000]
+    assert list(itertools.accumulate(cols.timestamp_delta_ms)) == [p.timestamp_ms for p in rows.series]
+    assert list(cols.descriptions) == ["rain", "clear"] and list(cols.description_code) == [0, 1, 0]
+    assert [cols.descriptions[c] for c in cols.description_code] == [p.description for p in rows.series]
+    assert list(cols.temperature_c) == [p.temperature_c for p in rows.series]
+    assert list(cols.humidity) == [50, 51, 52]
+    assert cols.ByteSize() < rows.ByteSize()
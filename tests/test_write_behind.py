@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+from server.write_behind import AsyncWriteBehindWriter, WriteBehindWriter
+
+class FakeCollection:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.single = []
+        self.lock = threading.Lock()
+    def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append(list(docs))
+    def insert_one(self, doc):
+        with self.lock:
+            self.single.append(doc)
+
+def _writer(col, **kw):
+    opts = dict(max_queue=100, flush_size=10, flush_interval_s=0.05, put_timeout_s=0.01)
+    opts.update(kw)
+    return WriteBehindWriter(col, **opts)
+
+def test_flushes_when_batch_is_full():
+    col = FakeCollection()
+    w = _writer(col, flush_size=5, flush_interval_s=5)
+    for i in range(5):
+        w.submit({"i": i})
+    deadline = time.time() + 2
+    while not col.batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert [len(b) for b in col.batches] == [5]
+    w.close()
+
+def test_flushes_after_interval():
+    col = FakeCollection()
+    w = _writer(col, flush_size=100, flush_interval_s=0.05)
+    w.submit({"i": 1})
+    time.sleep(0.3)
+    assert col.batches == [[{"i": 1}]]
+    w.close()
+
+def test_close_drains_queue():
+    col = FakeCollection()
+    w = _writer(col, flush_size=1000, flush_interval_s=10)
+    for i in range(20):
+        w.submit({"i": i})
+    w.close()
+    assert sum(len(b) for b in col.batches) == 20
+    assert w.stats()["queue_depth"] == 0
+    assert w.stats()["flushed_docs"] == 20
+
+def test_full_queue_falls_back_to_inline_write():
+    col = FakeCollection(delay=0.5)
+    w = _writer(col, max_queue=1, flush_size=1, flush_interval_s=0.01)
+    for i in range(5):
+        w.submit({"i": i})
+    assert w.stats()["sync_writes"] >= 1
+    assert len(col.single) == w.stats()["sync_writes"]
+    w.close()
+
+def test_failed_flush_is_counted():
+    class FailingCollection(FakeCollection):
+        def insert_many(self, docs, ordered=True):
+            raise BulkWriteError({"writeErrors": [{"index": 0}], "nInserted": len(docs) - 1})
+    w = _writer(FailingCollection(), flush_size=3, flush_interval_s=0.01)
+    for i in range(3):
+        w.submit({"i": i})
+    w.close()
+    stats = w.stats()
+    assert stats["failed_docs"] == 1
+    assert stats["flushed_docs"] == 2
+
+def test_submit_racing_close_is_still_flushed():
+    col = FakeCollection()
+    w = _writer(col, flush_interval_s=0.01)
+    put = w._queue.put
+    def slow_put(doc, timeout=None):
+        # submit() has passed the stop check but its put has not landed yet
+        time.sleep(0.2)
+        put(doc, timeout=timeout)
+    w._queue.put = slow_put
+    submitter = threading.Thread(target=w.submit, args=({"i": 1},))
+    submitter.start()
+    time.sleep(0.05)
+    w.close()
+    submitter.join()
+    assert col.batches == [[{"i": 1}]] and not col.single
+    assert w.stats()["queue_depth"] == 0
+
+def test_flush_latency_is_observed():
+    seconds = []
+    w = _writer(FakeCollection(), flush_size=1)
+    w.observe_flush = seconds.append
+    w.submit({"i": 1})
+    w.close()
+    assert len(seconds) == 1 and seconds[0] >= 0
+
+class AsyncFakeCollection(FakeCollection):
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        await asyncio.sleep(self.delay)
+        self.batches.append(list(docs))
+    async def insert_one(self, doc):
+        self.single.append(doc)
+
+def _async_writer(col, **kw):
+    opts = dict(max_queue=100, flush_size=10, flush_interval_s=0.05, put_timeout_s=0.01)
+    opts.update(kw)
+    w = AsyncWriteBehindWriter(col, **opts)
+    w.start()
+    return w
+
+def test_async_flushes_when_batch_is_full():
+    async def run():
+        col = AsyncFakeCollection()
+        w = _async_writer(col, flush_size=5, flush_interval_s=5)
+        for i in range(5):
+            await w.submit({"i": i})
+        for _ in range(100):
+            if col.batches:
+                break
+            await asyncio.sleep(0.01)
+        batches = [len(b) for b in col.batches]
+        await w.close()
+        return batches
+    assert asyncio.run(run()) == [5]
+
+def test_async_flushes_after_interval():
+    async def run():
+        col = AsyncFakeCollection()
+        w = _async_writer(col, flush_size=100, flush_interval_s=0.05)
+        await w.submit({"i": 1})
+        await asyncio.sleep(0.3)
+        batches = list(col.batches)
+        await w.close()
+        return batches
+    assert asyncio.run(run()) == [[{"i": 1}]]
+
+def test_async_close_drains_queue():
+    async def run():
+        col = AsyncFakeCollection()
+        w = _async_writer(col, flush_size=1000, flush_interval_s=0.05)
+        for i in range(20):
+            await w.submit({"i": i})
+        await w.close()
+        return col, w.stats()
+    col, stats = asyncio.run(run())
+    assert sum(len(b) for b in col.batches) == 20
+    assert stats["queue_depth"] == 0
+    assert stats["flushed_docs"] == 20
+
+def test_async_full_queue_falls_back_to_inline_write():
+    async def run():
+        col = AsyncFakeCollection(delay=0.5)
+        w = _async_writer(col, max_queue=1, flush_size=1, flush_interval_s=0.01)
+        for i in range(5):
+            await w.submit({"i": i})
+        stats = w.stats()
+        await w.close()
+        return col, stats
+    col, stats = asyncio.run(run())
+    assert stats["sync_writes"] >= 1
+    assert len(col.single) == stats["sync_writes"]
+
+def test_async_submit_racing_close_is_still_flushed():
+    async def run():
+        col = AsyncFakeCollection()
+        w = _async_writer(col, flush_interval_s=0.01, put_timeout_s=1.0)
+        put_nowait = w._queue.put_nowait
+        def full(doc):
+            raise asyncio.QueueFull
+        async def slow_put(doc):
+            await asyncio.sleep(0.2)
+            put_nowait(doc)
+        w._queue.put_nowait, w._queue.put = full, slow_put
+        submitter = asyncio.ensure_future(w.submit({"i": 1}))
+        await asyncio.sleep(0.05)
+        await w.close()
+        await submitter
+        return col, w.stats()
+    col, stats = asyncio.run(run())
+    assert col.batches == [[{"i": 1}]] and not col.single
+    assert stats["queue_depth"] == 0
@@ -14,11 +14,11 @@ export default function App() {
   const [loadingSeries, setLoadingSeries] = useState(false);
   const [error, setError] = useState(null);
 
-  async function loadHistoryAuto24h(c) {
+  async function loadHistoryAuto24h(c, revalidate = false) {
     try {
       setLoadingSeries(true);
       // setError(null);
-      const s = await fetchHistory(c);
+      const s = await fetchHistory(c, undefined, undefined, revalidate);
       setSeries(s);
     } catch (e) {
       setNow(null);
@@ -58,7 +58,7 @@ export default function App() {
       setSeries([]);
       return;
     }
-    await loadHistoryAuto24h(c);
+    await loadHistoryAuto24h(c, true);
   }
 
   useEffect(() => { loadHistoryAuto24h(city); }, []);
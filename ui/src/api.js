@@ -15,11 +15,13 @@ export async function fetchCurrent(city) {
     return parseOrThrow(res);
 }
 
-export async function fetchHistory(city, fromMs, toMs) {
+// revalidate: skip the browser's fresh copy and ask the gateway (If-None-Match), e.g. right after
+// fetchCurrent may have stored a new snapshot
+export async function fetchHistory(city, fromMs, toMs, revalidate = false) {
     const url = new URL(`/api/weather/history`, window.location.origin);
     url.searchParams.append('city', city);
     if (fromMs) url.searchParams.set('from_ms', String(fromMs));
     if (toMs) url.searchParams.set('to_ms', String(toMs));
-    const res = await fetch(url.toString());
+    const res = await fetch(url.toString(), revalidate ? { cache: 'no-cache' } : undefined);
     return parseOrThrow(res);
 }
\ No newline at end of file